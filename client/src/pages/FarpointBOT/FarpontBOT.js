@@ -1,7 +1,10 @@
 import React, { useState } from "react";
 import FarpointSidebar from "../../components/FarpointSidebar/FarpointSidebar";
+import readEventStream from "../../utils/readEventStream";
 import "./FarpointBOT.css";
 
+const BOT_ERROR_MESSAGE = "Sorry, something went wrong while answering. Please try again.";
+
 const FarpointBOT = () => {
   const [messages, setMessages] = useState([]);
   const [inputText, setInputText] = useState("");
@@ -35,7 +38,7 @@ const FarpointBOT = () => {
 
     try {
       // Send API request to backend
-      const response = await fetch(`${apiUrl}/farpointbot/bot_response`, {
+      const response = await fetch(`${apiUrl}/farpointbot/bot_response/stream`, {
         method: "POST",
         headers: {
           Authorization: `Bearer ${token}`,
@@ -48,17 +51,59 @@ const FarpointBOT = () => {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      // Get the response data
-      const responseData = await response.json();
+      // Add the bot's reply with the first token and grow it as the rest arrives
+      let started = false;
+      const setBotText = (update) =>
+        setMessages((prevMessages) => {
+          const last = prevMessages[prevMessages.length - 1];
+          return [
+            ...prevMessages.slice(0, -1),
+            { sender: "Chaplin", text: update(last.text) },
+          ];
+        });
 
-      // Assuming responseData contains a field 'bot_response' with the bot's reply
-      setMessages((prevMessages) => [
-        ...prevMessages,
-        { sender: "Chaplin", text: responseData.bot_response },
-      ]);
+      await readEventStream(response, (event, data) => {
+        if (event === "token") {
+          if (!started) {
+            started = true;
+            setIsLoading(false);
+            setMessages((prevMessages) => [
+              ...prevMessages,
+              { sender: "Chaplin", text: data.token },
+            ]);
+          } else {
+            setBotText((text) => text + data.token);
+          }
+        } else if (event === "done") {
+          if (started) {
+            setBotText(() => data.bot_response);
+          } else {
+            setMessages((prevMessages) => [
+              ...prevMessages,
+              { sender: "Chaplin", text: data.bot_response },
+            ]);
+          }
+        } else if (event === "error") {
+          console.error("Error from bot:", data.error);
+          // Keep what was streamed so far and say that the answer is incomplete
+          if (started) {
+            setBotText((text) => `${text} ${BOT_ERROR_MESSAGE}`);
+          } else {
+            started = true;
+            setMessages((prevMessages) => [
+              ...prevMessages,
+              { sender: "Chaplin", text: BOT_ERROR_MESSAGE },
+            ]);
+          }
+        }
+      });
       setIsLoading(false);
     } catch (error) {
       console.error("Error sending message to bot:", error);
+      setMessages((prevMessages) => [
+        ...prevMessages,
+        { sender: "Chaplin", text: BOT_ERROR_MESSAGE },
+      ]);
       setIsLoading(false); // Stop loading in case of error
     }
 
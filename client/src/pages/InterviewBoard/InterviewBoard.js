@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import FarpointSidebar from "../../components/FarpointSidebar/FarpointSidebar";
+import readEventStream from "../../utils/readEventStream";
 
 import "./InterviewBoard.css";
 
@@ -13,6 +14,8 @@ const InterviewBoard = () => {
   const mediaRecorderRef = useRef(null);
   const generateKeyNotesIntervalRef = useRef(null);
   const generateQuestionsIntervalRef = useRef(null);
+  const flushTranscriptionsIntervalRef = useRef(null);
+  const pendingTranscriptionsRef = useRef([]);
   const [keyNotes, setKeyNotes] = useState([]);
   const [questions, setQuestions] = useState([]);
   const [isModalOpen, setIsModalOpen] = useState(true);
@@ -29,6 +32,9 @@ const InterviewBoard = () => {
   const apiUrl = process.env.REACT_APP_API_URL;
   const tranURL = process.env.REACT_APP_TRANSCRIPT_URL;
   const [isLoading, setIsLoading] = useState(false);
+  const TRANSCRIPTION_BATCH_SIZE = 20;
+  const TRANSCRIPTION_BATCH_MAX_SIZE = 500; // Largest batch /interview/update_batch accepts
+  const TRANSCRIPTION_FLUSH_INTERVAL_MS = 5000;
 
   const Modal = ({ isOpen, setIsModalOpen, onDetailsSubmit }) => {
     const [companyDetails, setCompanyDetails] = useState("");
@@ -365,6 +371,11 @@ const InterviewBoard = () => {
           console.error("Error parsing received data:", error);
         }
       };
+      // Start the interval for flushing buffered transcription segments
+      flushTranscriptionsIntervalRef.current = setInterval(() => {
+        flushTranscriptions();
+      }, TRANSCRIPTION_FLUSH_INTERVAL_MS);
+
       // Start the interval for generateKeyNotes
       generateKeyNotesIntervalRef.current = setInterval(() => {
         generateKeyNotes();
@@ -390,10 +401,11 @@ const InterviewBoard = () => {
       }
       clearInterval(generateKeyNotesIntervalRef.current);
       clearInterval(generateQuestionsIntervalRef.current);
+      clearInterval(flushTranscriptionsIntervalRef.current);
     };
   };
 
-  // Function to update interview data
+  // Function to buffer a transcription segment until the next batch flush
   const updateInterviewData = async ({
     start,
     duration,
@@ -402,45 +414,79 @@ const InterviewBoard = () => {
     speaker,
     channel,
   }) => {
+    pendingTranscriptionsRef.current.push({
+      start,
+      duration,
+      transcript,
+      confidence,
+      speaker,
+      channel,
+    });
+
+    if (pendingTranscriptionsRef.current.length >= TRANSCRIPTION_BATCH_SIZE) {
+      await flushTranscriptions();
+    }
+  };
+
+  // Function to send the buffered transcription segments, in requests of at most
+  // TRANSCRIPTION_BATCH_MAX_SIZE segments
+  const flushTranscriptions = async () => {
     const interviewId = sessionStorage.getItem("interviewId");
     if (!interviewId) {
       console.error("No interview ID found. Cannot update interview data.");
       return;
     }
 
-    const updateData = {
-      _id: interviewId,
-      transcription: {
-        start, // Use the start time from the argument
-        duration, // Use the duration from the argument
-        transcript, // Use the transcript from the argument
-        confidence, // Use the confidence value from the argument
-        speaker, // Use the speaker value from the argument
-        channel, // Use the channel value from the argument
-      },
-    };
+    while (pendingTranscriptionsRef.current.length > 0) {
+      const transcriptions = pendingTranscriptionsRef.current.slice(
+        0,
+        TRANSCRIPTION_BATCH_MAX_SIZE
+      );
+      pendingTranscriptionsRef.current = pendingTranscriptionsRef.current.slice(
+        transcriptions.length
+      );
 
-    try {
-      const response = await fetch(`${apiUrl}/interview/update`, {
-        method: "POST",
-        headers: {
-          Authorization: `Bearer ${token}`,
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify(updateData),
-      });
+      const updateData = {
+        _id: interviewId,
+        transcriptions,
+      };
 
-      if (!response.ok) {
-        if (response.status === 422) {
-          // Navigate to login page only if response status is 422
-          navigate("/login");
+      try {
+        const response = await fetch(`${apiUrl}/interview/update_batch`, {
+          method: "POST",
+          headers: {
+            Authorization: `Bearer ${token}`,
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify(updateData),
+        });
+
+        if (!response.ok) {
+          if (response.status === 422) {
+            // Navigate to login page only if response status is 422
+            navigate("/login");
+            return;
+          }
+          if (response.status >= 400 && response.status < 500) {
+            // The server rejected the batch itself, sending it again would fail the same way
+            console.error(
+              `Dropping ${transcriptions.length} transcription segments, status: ${response.status}`
+            );
+            continue;
+          }
+          throw new Error(`HTTP error! status: ${response.status}`);
         }
-        throw new Error(`HTTP error! status: ${response.status}`);
+        const responseJson = await response.json();
+        // console.log("Update request response:", responseJson);
+      } catch (error) {
+        console.error("Error during update request:", error);
+        // Put the segments back so they are retried with the next flush
+        pendingTranscriptionsRef.current = [
+          ...transcriptions,
+          ...pendingTranscriptionsRef.current,
+        ];
+        return;
       }
-      const responseJson = await response.json();
-      // console.log("Update request response:", responseJson);
-    } catch (error) {
-      console.error("Error during update request:", error);
     }
   };
 
@@ -471,6 +517,13 @@ const InterviewBoard = () => {
       generateQuestionsIntervalRef.current = null;
     }
 
+    // Clear the interval for flushing transcriptions and send what is left
+    if (flushTranscriptionsIntervalRef.current) {
+      clearInterval(flushTranscriptionsIntervalRef.current);
+      flushTranscriptionsIntervalRef.current = null;
+    }
+    await flushTranscriptions();
+
     // Additional cleanup (if needed)
     // ...
 
@@ -523,8 +576,11 @@ const InterviewBoard = () => {
       _id: interviewId,
     };
 
+    // Make sure the latest segments are stored before generating keynotes
+    await flushTranscriptions();
+
     try {
-      const response = await fetch(`${apiUrl}/interview/get_notes`, {
+      const response = await fetch(`${apiUrl}/interview/get_notes/stream`, {
         method: "POST",
         headers: {
           Authorization: `Bearer ${token}`,
@@ -543,20 +599,40 @@ const InterviewBoard = () => {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const keyNotesResponseJson = await response.json();
-
-      // Check if keyNotesResponseJson contains a 'keynotes' string
-      if (
-        typeof keyNotesResponseJson.keynotes === "string" &&
-        keyNotesResponseJson.keynotes.trim() !== ""
-      ) {
-        setKeyNotes((prevKeyNotes) => [
-          keyNotesResponseJson.keynotes, // Add new keynote at the beginning
-          ...prevKeyNotes, // Existing keynotes pushed down
-        ]);
-      } else {
-        console.error("Error: 'keynotes' is not a string in the response");
-      }
+      // Show the keynote as it is generated, at the top of the list
+      let started = false;
+      await readEventStream(response, (event, data) => {
+        // Decide outside the state updaters, which React may run later
+        const first = !started;
+        if (event === "token") {
+          started = true;
+          setKeyNotes((prevKeyNotes) =>
+            first
+              ? [data.token, ...prevKeyNotes]
+              : [prevKeyNotes[0] + data.token, ...prevKeyNotes.slice(1)]
+          );
+        } else if (event === "done") {
+          // Replace the streamed text with the stored, cleaned keynote
+          if (
+            typeof data.keynotes === "string" &&
+            data.keynotes.trim() !== ""
+          ) {
+            setKeyNotes((prevKeyNotes) =>
+              first
+                ? [data.keynotes, ...prevKeyNotes]
+                : [data.keynotes, ...prevKeyNotes.slice(1)]
+            );
+          } else {
+            console.error("Error: 'keynotes' is not a string in the response");
+          }
+        } else if (event === "error") {
+          if (started) {
+            setKeyNotes((prevKeyNotes) => prevKeyNotes.slice(1));
+            started = false;
+          }
+          console.error("Error during keynotes generation:", data.error);
+        }
+      });
     } catch (error) {
       console.error("Error during keynotes request:", error);
     }
@@ -571,6 +647,9 @@ const InterviewBoard = () => {
 
     const requestData = { _id: interviewId };
 
+    // Make sure the latest segments are stored before generating questions
+    await flushTranscriptions();
+
     try {
       const response = await fetch(`${apiUrl}/interview/get_questions`, {
         method: "POST",
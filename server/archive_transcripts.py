@@ -0,0 +1,19 @@
+import argparse
+
+from src import config as C
+from src import db_utils as DU
+
+# Moves the transcripts of finished interviews to the archive partition of interviewTranscription.
+# Meant to run periodically, e.g. from cron: python archive_transcripts.py --older-than-days 7
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive the transcripts of finished interviews.")
+    parser.add_argument("--older-than-days", type=int, default=C.TRANSCRIPT_ARCHIVE_AFTER_DAYS,
+                        help="Only archive interviews finished at least this many days ago.")
+    parser.add_argument("--batch-size", type=int, default=C.TRANSCRIPT_ARCHIVE_BATCH_SIZE,
+                        help="Interviews moved per transaction.")
+    args = parser.parse_args()
+
+    archived = DU.archive_finished_transcripts(args.older_than_days, args.batch_size)
+    print(f"Archived {archived} transcript rows.")
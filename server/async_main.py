@@ -0,0 +1,287 @@
+import asyncio
+import functools
+import json
+import os
+
+from aiohttp import web
+from aiohttp_wsgi import WSGIHandler
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError
+
+from src import async_db_utils as ADU
+from src import async_llm
+from src import completion_cache
+from src import config as C
+from src import rag
+from src import semantic_cache
+from main import app, bot_cache_status, bot_response_events, collect_metrics
+
+# Async entry point of the backend. The live-interview routes are served by async
+# handlers on asyncpg and the async OpenAI client, so a single process keeps serving
+# other interviews while one waits on I/O. Every other route is forwarded to the
+# Flask app in main.py, so the API contract is the same as when running main.py alone.
+
+
+def jwt_required(handler):
+    """
+    Async counterpart of flask_jwt_extended.jwt_required(), verifying the same access tokens.
+    """
+    @functools.wraps(handler)
+    async def wrapper(request):
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return web.json_response({"msg": "Missing Authorization Header"}, status=401)
+
+        try:
+            with app.app_context():
+                decoded = decode_token(auth_header[len('Bearer '):])
+        except ExpiredSignatureError:
+            return web.json_response({"msg": "Token has expired"}, status=401)
+        except Exception as ex:
+            return web.json_response({"msg": str(ex)}, status=422)
+
+        if decoded.get('type') != 'access':
+            return web.json_response({"msg": "Only non-refresh tokens are allowed"}, status=422)
+
+        request['jwt_identity'] = decoded['sub']
+        return await handler(request)
+    return wrapper
+
+
+def add_cors_headers(request, response):
+    # Responses forwarded from Flask already carry the Flask-CORS headers
+    origin = request.headers.get('Origin')
+    if origin and 'Access-Control-Allow-Origin' not in response.headers:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Vary'] = 'Origin'
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    response = await handler(request)
+    # Streamed responses set their headers before sending them, see sse_response
+    if not response.prepared:
+        add_cors_headers(request, response)
+    return response
+
+
+# Producers of streamed responses, kept referenced until they finish
+_stream_tasks = set()
+
+
+async def sse_response(request, events, result_key):
+    """
+    Async counterpart of main.sse_response. The events are consumed by a separate task, so the
+    result is still stored when the browser disconnects before the end of the stream.
+    """
+    queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for event, data in events:
+                if event == "token":
+                    queue.put_nowait(("token", {"token": data}))
+                elif event == "done":
+                    queue.put_nowait(("done", {result_key: data}))
+                else:
+                    queue.put_nowait((event, data))
+        except Exception as ex:
+            queue.put_nowait(("error", {"error": str(ex)}))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})
+    add_cors_headers(request, response)
+    await response.prepare(request)
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            event, data = item
+            await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        await response.write_eof()
+    except ConnectionResetError:
+        # The browser went away; the producer task carries on and stores the result
+        pass
+    return response
+
+
+async def iterate_in_executor(iterator):
+    # Drive a blocking iterator from the event loop, one item per executor call
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        item = await loop.run_in_executor(None, next, iterator, done)
+        if item is done:
+            break
+        yield item
+
+
+@jwt_required
+async def update_data(request):
+    try:
+        data = await request.json()
+        insert_id = await ADU.add_transcription_to_table(data)
+        return web.json_response({"message": "Transcription added successfully", "transcript_id": insert_id}, status=201)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while adding transcript", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def update_data_batch(request):
+    try:
+        data = await request.json()
+        insert_ids = await ADU.add_transcriptions_batch_to_table(data)
+        return web.json_response({"message": "Transcriptions added successfully", "transcript_ids": insert_ids}, status=201)
+    except ValueError as ex:
+        return web.json_response({"message": "Invalid transcription batch", "error": str(ex)}, status=400)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while adding transcripts", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def get_key_notes(request):
+    try:
+        data = await request.json()
+        result = await async_llm.generate_key_notes(data)
+        return web.json_response({"message": "Keynotes generated Successfully", "keynotes": result}, status=200)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while generating keynotes", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def get_questions_from_trans(request):
+    try:
+        data = await request.json()
+        with completion_cache.tracking() as cache_status:
+            result = await async_llm.generate_questions(data)
+        return web.json_response({"message": "Generated Questions Succesfully", "questions": result,
+                                  "cache": cache_status}, status=200)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while generating questions", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def stream_key_notes(request):
+    try:
+        data = await request.json()
+        events = await async_llm.stream_key_notes(data)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while generating keynotes", "error": str(ex)}, status=500)
+    return await sse_response(request, events, "keynotes")
+
+
+@jwt_required
+async def stream_questions_from_trans(request):
+    try:
+        data = await request.json()
+        events = await async_llm.stream_questions(data)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while generating questions", "error": str(ex)}, status=500)
+    return await sse_response(request, events, "questions")
+
+
+@jwt_required
+async def get_interview_details(request):
+    try:
+        details = await ADU.get_interview_details(request.match_info['meeting_id'])
+        mapped_details = {
+            "attendees": details['name'],
+            "date": details["date"],
+            "interviewType": details["interview_description"],
+            "companyName": details["nameofclient"],
+            "meeting_summary" : details["latest_meeting_summary"]
+        }
+        return web.json_response({"message": "Interview details fetched successfully", "interviewDetails": mapped_details}, status=200)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while fetching interview details", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def get_interview_questions(request):
+    try:
+        questions = await ADU.get_all_questions(request.match_info['meeting_id'])
+        return web.json_response({"message": "Interview Questions fetched successfully", "questions": questions}, status=200)
+    except Exception as ex:
+        return web.json_response({"message": "Error occurred while fetching interview questions", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def get_metrics(request):
+    try:
+        metrics = collect_metrics()
+        metrics["async_db_pool"] = ADU.pool_stats()
+        return web.json_response({"message": "Metrics retrieved successfully", "metrics": metrics}, status=200)
+    except Exception as ex:
+        return web.json_response({"message": "Error retrieving metrics", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def generating_bot_response(request):
+    try:
+        data = await request.json()
+        # llama_index is synchronous; keep it off the event loop
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, semantic_cache.answer, data['user_input'], C.BOT_RESPONSE_CACHE_TTL, data.get('filters'))
+        return web.json_response({"message": "Generated Bot Response Succesfully", "bot_response": result["answer"],
+                                  "sources": result["sources"], "cache": bot_cache_status(result)}, status=200)
+    except ValueError as ex:
+        return web.json_response({"message": "Invalid filters", "error": str(ex)}, status=400)
+    except Exception as ex:
+        return web.json_response({"message": "Error generating response from FarpointBOT", "error": str(ex)}, status=500)
+
+
+@jwt_required
+async def stream_bot_response(request):
+    try:
+        data = await request.json()
+        filters = data.get('filters')
+        rag.build_filters(filters)
+        events = iterate_in_executor(bot_response_events(data['user_input'], filters))
+    except ValueError as ex:
+        return web.json_response({"message": "Invalid filters", "error": str(ex)}, status=400)
+    except Exception as ex:
+        return web.json_response({"message": "Error generating response from FarpointBOT", "error": str(ex)}, status=500)
+    return await sse_response(request, events, "bot_response")
+
+
+async def on_startup(aio_app):
+    await ADU.init_pool()
+
+
+async def on_cleanup(aio_app):
+    await ADU.close_pool()
+
+
+def create_app():
+    aio_app = web.Application(middlewares=[cors_middleware])
+    aio_app.on_startup.append(on_startup)
+    aio_app.on_cleanup.append(on_cleanup)
+
+    aio_app.router.add_get('/metrics', get_metrics)
+    aio_app.router.add_post('/interview/update', update_data)
+    aio_app.router.add_post('/interview/update_batch', update_data_batch)
+    aio_app.router.add_post('/interview/get_notes', get_key_notes)
+    aio_app.router.add_post('/interview/get_questions', get_questions_from_trans)
+    aio_app.router.add_get('/interview/get_interview_details/{meeting_id}', get_interview_details)
+    aio_app.router.add_get('/interview/get_interview_questions/{meeting_id}', get_interview_questions)
+    aio_app.router.add_post('/farpointbot/bot_response', generating_bot_response)
+    aio_app.router.add_post('/interview/get_notes/stream', stream_key_notes)
+    aio_app.router.add_post('/interview/get_questions/stream', stream_questions_from_trans)
+    aio_app.router.add_post('/farpointbot/bot_response/stream', stream_bot_response)
+
+    # Everything else, including CORS preflight requests, is handled by the Flask app
+    wsgi = WSGIHandler(app)
+    aio_app.router.add_route('*', '/{path_info:.*}', wsgi.handle_request)
+    return aio_app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
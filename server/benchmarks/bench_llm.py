@@ -0,0 +1,250 @@
+"""
+Benchmark of the LLM paths (keynotes, questions, meeting summary, RAG queries) against the
+local OpenAI stand-in, so our own overhead (database, prompt building, dedupe, rate limiting)
+can be measured without live OpenAI. Reports p50/p95/p99 latency and throughput per scenario.
+
+Usage (from server/, with the POSTGRES_* variables of the backend set):
+    python -m benchmarks.bench_llm --start-stub --stub-latency-ms 300 \
+        --scenarios keynotes questions summary --concurrency 8 --requests 80
+
+Synthetic interviews are created for the run, one per worker, and deleted afterwards
+unless --keep-data is given. The RAG scenario queries POSTGRES_VECTOR_TABLE as the bot does.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SCENARIOS = ["keynotes", "questions", "questions_stream", "summary", "rag"]
+
+RAG_QUERIES = ["What workflows did the client describe?", "Which steps take the longest?",
+               "Who approves purchase orders?", "What tools does the team use today?"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LLM paths against a local OpenAI stand-in.")
+    parser.add_argument("--scenarios", nargs="+", default=["keynotes", "questions", "summary"], choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent callers per scenario.")
+    parser.add_argument("--requests", type=int, default=40, help="Calls per scenario.")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls per scenario before measuring.")
+    parser.add_argument("--utterances", type=int, default=200, help="Transcript rows of each synthetic interview.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8700/v1", help="OpenAI-compatible endpoint.")
+    parser.add_argument("--start-stub", action="store_true", help="Start benchmarks.stub_openai for the run.")
+    parser.add_argument("--stub-latency-ms", type=float, default=200)
+    parser.add_argument("--stub-jitter-ms", type=float, default=50)
+    parser.add_argument("--stub-token-delay-ms", type=float, default=10)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--use-cache", action="store_true", help="Keep the completion cache enabled.")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="Keep the configured OpenAI rate limits instead of lifting them for the stub.")
+    parser.add_argument("--keep-data", action="store_true", help="Do not delete the synthetic interviews.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    # Must run before src is imported: the OpenAI clients and src.config read these at import time
+    os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ["OPENAI_API_BASE"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    if not args.use_cache:
+        for name in ("QUESTIONS_CACHE_TTL", "BOT_RESPONSE_CACHE_TTL", "CLIENT_DETAILS_CACHE_TTL"):
+            os.environ[name] = "0"
+    if not args.rate_limits:
+        # The stub has no quota; with the account limits the limiter, not our code, sets the pace
+        os.environ["OPENAI_REQUESTS_PER_MINUTE"] = str(10 ** 7)
+        os.environ["OPENAI_TOKENS_PER_MINUTE"] = str(10 ** 10)
+
+
+def start_stub(args):
+    port = args.base_url.rsplit(":", 1)[1].split("/")[0]
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.stub_openai", "--port", port,
+        "--latency-ms", str(args.stub_latency_ms), "--jitter-ms", str(args.stub_jitter_ms),
+        "--token-delay-ms", str(args.stub_token_delay_ms), "--error-rate", str(args.stub_error_rate),
+        "--retry-after", "0.2",
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.5)
+    return process
+
+
+def utterance(i):
+    return {"start": float(i * 6), "duration": 5.5, "speaker": i % 2,
+            "transcript": f"Speaker {i % 2}: step {i} of the order workflow, the approval goes to the plant "
+                          f"manager and usually takes about {i % 5 + 1} days before production starts."}
+
+
+def create_interviews(DU, count, utterances):
+    interview_ids = []
+    for n in range(count):
+        interview_id = DU.insert_data_to_postgres({
+            "name": f"Benchmark {n}", "title": "Operations Manager", "company_name": "Benchmark Co",
+            "job_description": "Runs order intake and production planning",
+            "interview_description": "Head of department interview",
+        })
+        rows = [utterance(i) for i in range(utterances)]
+        for start in range(0, len(rows), 500):
+            DU.add_transcriptions_batch_to_table({"_id": interview_id, "transcriptions": rows[start:start + 500]})
+        interview_ids.append(interview_id)
+    return interview_ids
+
+
+def delete_interviews(db_pool, interview_ids):
+    conn = db_pool.get_db_connection()
+    cur = conn.cursor()
+    try:
+        for table in ("interviewQuestions", "interviewKeynotes", "interviewTranscription", "transcriptSummary"):
+            cur.execute(f"DELETE FROM {table} WHERE interview_id = ANY(%s)", (interview_ids,))
+        cur.execute("DELETE FROM interviewBoard WHERE id = ANY(%s)", (interview_ids,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def make_calls(DU, llm, rag):
+    '''
+    Returns:
+        dict: Scenario -> (prepare, call). prepare(interview_id, i) runs untimed before call(interview_id, i),
+        whose return value may carry a time to first token.
+    '''
+    counters = {"utterance": 100000}
+    lock = threading.Lock()
+
+    def add_utterance(interview_id, i):
+        # Keynotes only cover transcript added since the previous call
+        with lock:
+            counters["utterance"] += 1
+            n = counters["utterance"]
+        DU.add_transcription_to_table({"_id": interview_id, "transcription": utterance(n)})
+
+    def stream_questions(interview_id, i):
+        started = time.perf_counter()
+        first_token = None
+        for event, _ in llm.stream_questions({"_id": interview_id}):
+            if event == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+        return first_token
+
+    return {
+        "keynotes": (add_utterance, lambda interview_id, i: llm.generate_key_notes({"_id": interview_id})),
+        "questions": (None, lambda interview_id, i: llm.generate_questions({"_id": interview_id})),
+        "questions_stream": (None, stream_questions),
+        "summary": (None, lambda interview_id, i: llm.get_meeting_summary(
+            {"_id": interview_id}, DU.generatetranscript_given_id(interview_id))),
+        "rag": (None, lambda interview_id, i: rag.query_response(RAG_QUERIES[i % len(RAG_QUERIES)])),
+    }
+
+
+def run_scenario(prepare, call, interview_ids, concurrency, requests, warmup):
+    '''
+    Returns:
+        dict: Latencies (seconds), times to first token, errors and wall time of the measured calls.
+    '''
+    latencies, first_tokens, errors = [], [], []
+    lock = threading.Lock()
+
+    def one(i, measured=True):
+        interview_id = interview_ids[i % len(interview_ids)]
+        if prepare is not None:
+            prepare(interview_id, i)
+        started = time.perf_counter()
+        try:
+            result = call(interview_id, i)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        elapsed = time.perf_counter() - started
+        if measured:
+            with lock:
+                latencies.append(elapsed)
+                if isinstance(result, float):
+                    first_tokens.append(result)
+
+    for i in range(warmup):
+        one(i, measured=False)
+    errors.clear()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    return {"latencies": latencies, "first_tokens": first_tokens, "errors": errors, "wall": wall}
+
+
+def summarize(name, result, concurrency):
+    latencies = np.array(result["latencies"]) * 1000
+    summary = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": len(result["errors"]),
+        "throughput_rps": round(len(latencies) / result["wall"], 2) if result["wall"] else 0.0,
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.update({"p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+                        "mean_ms": round(latencies.mean(), 1), "max_ms": round(latencies.max(), 1)})
+    if result["first_tokens"]:
+        summary["ttft_p50_ms"] = round(float(np.percentile(np.array(result["first_tokens"]) * 1000, 50)), 1)
+    if result["errors"]:
+        summary["first_error"] = result["errors"][0]
+    return summary
+
+
+def print_table(summaries):
+    columns = ["scenario", "concurrency", "ok", "errors", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "max_ms",
+               "throughput_rps", "ttft_p50_ms"]
+    widths = {c: max(len(c), *(len(str(s.get(c, "-"))) for s in summaries)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for s in summaries:
+        print("  ".join(str(s.get(c, "-")).rjust(widths[c]) for c in columns))
+    for s in summaries:
+        if "first_error" in s:
+            print(f"{s['scenario']}: {s['errors']} errors, first: {s['first_error']}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    stub = start_stub(args) if args.start_stub else None
+
+    from src import db_utils as DU
+    from src import db_pool
+    from src import get_from_llm as llm
+    from src import openai_client
+    from src import rag
+
+    interview_ids = []
+    try:
+        interview_ids = create_interviews(DU, args.concurrency, args.utterances)
+        calls = make_calls(DU, llm, rag)
+        summaries = []
+        for name in args.scenarios:
+            prepare, call = calls[name]
+            result = run_scenario(prepare, call, interview_ids, args.concurrency, args.requests, args.warmup)
+            summaries.append(summarize(name, result, args.concurrency))
+
+        print_table(summaries)
+        limiter = openai_client.stats()
+        print(f"rate limiter: retries={limiter['retries']} rate_limited={limiter['rate_limited']} "
+              f"wait={json.dumps(limiter['wait_seconds'])}")
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump({"args": vars(args), "results": summaries, "rate_limiter": limiter}, file, indent=4)
+    finally:
+        if interview_ids and not args.keep_data:
+            delete_interviews(db_pool, interview_ids)
+        if stub is not None:
+            stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
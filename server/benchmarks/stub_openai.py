@@ -0,0 +1,179 @@
+"""
+Local stand-in for the OpenAI chat completions and embeddings APIs, for benchmarks and
+offline development. Responses are deterministic for a given request and shaped after the
+prompts of src/prompts/prompts.json, so the whole keynotes/questions/summary path runs on it.
+
+Usage (from server/):
+    python -m benchmarks.stub_openai --port 8700 --latency-ms 300 --jitter-ms 100 \
+        --token-delay-ms 15 --error-rate 0.05 --error-status 429
+
+Then point the backend at it:
+    OPENAI_BASE_URL=http://127.0.0.1:8700/v1 OPENAI_API_BASE=http://127.0.0.1:8700/v1 python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+
+import numpy as np
+from aiohttp import web
+
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def pick(seed, options):
+    return options[int(seed[:8], 16) % len(options)]
+
+
+TOPICS = ["order intake", "quality checks", "invoice approval", "production planning", "supplier onboarding",
+          "customer support", "inventory counts", "shipping labels", "sales forecasting", "month-end close"]
+
+
+def chat_content(messages):
+    '''
+    Returns:
+        str: A deterministic reply in the shape the prompt asks for.
+    '''
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    seed = digest(messages)
+    topic = pick(seed, TOPICS)
+
+    if "review the below provided transcript" in user:
+        # Answered questions: a verdict for every '<id>: <question>' line
+        verdicts = []
+        for question_id, question in re.findall(r"^(\d+): (.+)$", user, re.MULTILINE):
+            answered = int(digest([seed, question_id])[:2], 16) % 3 == 0
+            verdicts.append({"id": question_id, "question": question, "is_answered": answered,
+                             "answer": f"Covered while discussing {topic}." if answered else ""})
+        return json.dumps(verdicts, indent=4)
+    if "recommending the top 5 unique questions" in user:
+        questions = {str(i + 1): f"How long does the {pick(digest([seed, i]), TOPICS)} step take today, "
+                                 f"and who signs it off? ({seed[i * 4:i * 4 + 4]})" for i in range(5)}
+        return "```json\n" + json.dumps(questions, indent=4) + "\n```"
+    if "key points discussed" in user:
+        return (f"key points discussed: The team walked through {topic}, the tools used at each step "
+                f"and where hand-offs slow things down.")
+    if "minutes of the meeting" in user:
+        return (f"Attendees: interviewer and client.\nPurpose: map the {topic} workflow.\n"
+                f"Discussion: current steps, timings and pain points.\nAction items: share sample documents.")
+    if "running summary" in user:
+        return f"The meeting so far covered {topic} and its approval steps, with timings per step."
+    return f"This is a stand-in answer about {topic}."
+
+
+def embedding(text, dimensions):
+    # Unit vector seeded by the text, so identical texts get identical embeddings
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+def count_tokens(text):
+    return len(text) // 4 + 1
+
+
+class Stub:
+
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.stats = {"chat": 0, "stream": 0, "embeddings": 0, "errors_injected": 0}
+
+    async def delay(self):
+        jitter = self.random.uniform(-self.args.jitter_ms, self.args.jitter_ms)
+        await asyncio.sleep(max(0.0, self.args.latency_ms + jitter) / 1000)
+
+    def injected_error(self):
+        if self.random.random() >= self.args.error_rate:
+            return None
+        self.stats["errors_injected"] += 1
+        status = self.args.error_status
+        headers = {"retry-after": str(self.args.retry_after)} if status == 429 else {}
+        kind = "rate_limit_exceeded" if status == 429 else "server_error"
+        return web.json_response({"error": {"message": f"Injected {status}", "type": kind, "code": kind}},
+                                 status=status, headers=headers)
+
+    async def chat(self, request):
+        body = await request.json()
+        error = self.injected_error()
+        if error is not None:
+            return error
+        await self.delay()
+
+        content = chat_content(body["messages"])
+        prompt_tokens = sum(count_tokens(m.get("content") or "") for m in body["messages"])
+        created = int(time.time())
+        if not body.get("stream"):
+            self.stats["chat"] += 1
+            return web.json_response({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(content),
+                          "total_tokens": prompt_tokens + count_tokens(content)},
+            })
+
+        self.stats["stream"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for piece in re.findall(r"\S+\s*|\s+", content):
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.args.token_delay_ms / 1000)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request):
+        body = await request.json()
+        error = self.injected_error()
+        if error is not None:
+            return error
+        await self.delay()
+
+        inputs = [body["input"]] if isinstance(body["input"], str) else body["input"]
+        self.stats["embeddings"] += 1
+        tokens = sum(count_tokens(text) for text in inputs)
+        return web.json_response({
+            "object": "list", "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": embedding(text, self.args.dimensions)}
+                     for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    async def get_stats(self, request):
+        return web.json_response(self.stats)
+
+
+def create_app(args):
+    stub = Stub(args)
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.router.add_post("/v1/chat/completions", stub.chat)
+    app.router.add_post("/v1/embeddings", stub.embeddings)
+    app.router.add_get("/stats", stub.get_stats)
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Delay before each response.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform +/- jitter added to the delay.")
+    parser.add_argument("--token-delay-ms", type=float, default=10, help="Delay between streamed chunks.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing.")
+    parser.add_argument("--error-status", type=int, default=429, choices=[429, 500, 503])
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of injected 429s, seconds.")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency and error injection.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(create_app(args), host=args.host, port=args.port)
@@ -1,5 +1,5 @@
 import requests
-from flask import Flask, request, jsonify, redirect, session, url_for
+from flask import Flask, request, jsonify, redirect, session, url_for, Response, stream_with_context
 from flask import session
 from flask_cors import CORS
 from flask_jwt_extended import create_access_token, JWTManager, jwt_required, get_jwt_identity, create_refresh_token
@@ -7,6 +7,7 @@ from datetime import timedelta
 import json
 from dotenv import load_dotenv
 import os
+import threading
 
 import datetime
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -15,6 +16,15 @@ from google.oauth2.credentials import Credentials
 
 from src import config as C
 from src import db_utils as DU
+from src import db_pool
+from src import cache
+from src import embedding_cache
+from src import prompt_registry as prompts
+from src import prompt_capture
+from src import completion_cache
+from src import semantic_cache
+from src import company_briefs
+from src import openai_client
 from src import utils as U
 from src import get_from_llm as llm
 from src import create_tables
@@ -39,6 +49,10 @@ GOOGLE_CLIENT_ID = os.environ['GOOGLE_CLIENT_ID']
 GOOGLE_SECRET_KEY = os.environ['GOOGLE_SECRET_KEY']
 app.secret_key = os.environ['AUTH_SECRET_KEY']
 
+if C.RAG_WARM_UP:
+    # Build the shared RAG index in the background so the first bot query does not pay for it
+    threading.Thread(target=rag.warm_up, name="rag-warm-up", daemon=True).start()
+
 # # This OAuth 2.0 access scope allows for read-only access to the user's calendar
 # SCOPES = ['openid',
 #           'https://www.googleapis.com/auth/calendar.readonly',
@@ -53,6 +67,56 @@ def hello_world():
     return "Hello, FarpointOI Backend!!"
 
 
+def collect_metrics():
+    """
+    Counters of the pools and caches of this process. async_main.py adds its asyncpg pool,
+    which only exists there.
+    """
+    return {
+        "db_pool": db_pool.pool_stats(),
+        "caches": cache.cache_stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "prompt_capture": prompt_capture.stats(),
+        "completion_cache": completion_cache.stats(),
+        "openai": openai_client.stats(),
+        "rag": rag.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "company_briefs": company_briefs.stats(),
+    }
+
+
+@app.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    try:
+        metrics = collect_metrics()
+        return jsonify({"message": "Metrics retrieved successfully", "metrics": metrics}), 200
+    except Exception as ex:
+        return jsonify({"message": "Error retrieving metrics", "error": str(ex)}), 500
+
+
+@app.route('/embedding_cache/invalidate', methods=['POST'])
+@jwt_required()
+def invalidate_embedding_cache():
+    # Body may name a model to drop only its embeddings, e.g. after switching EMBEDDING_MODEL
+    try:
+        data = request.get_json(silent=True) or {}
+        deleted = embedding_cache.invalidate_all(data.get('model'))
+        return jsonify({"message": "Embedding cache invalidated", "deleted": deleted}), 200
+    except Exception as ex:
+        return jsonify({"message": "Error invalidating the embedding cache", "error": str(ex)}), 500
+
+
+@app.route('/bot_cache/invalidate', methods=['POST'])
+@jwt_required()
+def invalidate_bot_cache():
+    try:
+        deleted = semantic_cache.invalidate_all()
+        return jsonify({"message": "Bot answer cache invalidated", "deleted": deleted}), 200
+    except Exception as ex:
+        return jsonify({"message": "Error invalidating the bot answer cache", "error": str(ex)}), 500
+
+
 
 @app.route('/google_login', methods=['POST'])
 def login():
@@ -110,6 +174,8 @@ def start_interview():
     try:
         data = request.json
         insert_id = DU.insert_data_to_postgres(data=data, table_name='interviewboard')
+        # Have the company brief ready by the time the interview screen asks for it
+        company_briefs.prefetch(data.get('company_name'))
         return jsonify({"message": "Data added successfully", "_id": insert_id}), 201
     except Exception as ex:
         return jsonify({"message": "Error occurred while adding data", "error": str(ex)}), 500
@@ -121,21 +187,13 @@ def get_company_details():
     try:
         company_name = request.json['company']
 
-        # Open and read the JSON file
-        with open(C.PROMPTS_JSON_PATH, 'r') as file:
-            data = json.load(file)
-
-        # Access and modify the content of 'get_client_details'
-        if 'get_client_details' in data:
-            # Replace {companyname} with the actual company name
-            prompt_with_company = data['get_client_details'].replace("{companyname}", company_name)
-            
-            # Use the updated prompt
-            res = rag.query_index(prompt_with_company)
-            return jsonify({"message": "Company details retrieved successfully", "details": str(res)}), 200
-        else:
-            return jsonify({"message": "'get_client_details' key not found"}), 404
+        # Stored brief of the company, generated from the 'get_client_details' template on a miss
+        res, status = company_briefs.get_brief(company_name)
+        return jsonify({"message": "Company details retrieved successfully", "details": res,
+                        "cache": {"client_details": status}}), 200
 
+    except company_briefs.MissingPromptError:
+        return jsonify({"message": "'get_client_details' key not found"}), 404
     except FileNotFoundError:
         return jsonify({"message": "File not found"}), 404
     except json.JSONDecodeError:
@@ -149,7 +207,10 @@ def finish_interview():
     try:
         data = request.json
         interview_id = DU.get_summary_and_finish_interview(data=data, table_name='interviewboard')
-        index = vectorize.to_vectorize_interview(data['_id'])
+        interview_details = DU.get_interview_details(data['_id'])
+        # The summary is embedded by llama_index; count it against the shared limits, behind live work
+        openai_client.reserve(openai_client.BACKGROUND, U.count_tokens(interview_details.get('meeting_summary') or ''))
+        index = vectorize.to_vectorize_interview(data['_id'], interview_details)
         return jsonify({"message": "Interview finished & vectorized successfully", "_id": interview_id}), 201
     except Exception as ex:
         return jsonify({"message": "Error in finishing & vectorizing interview", "error": str(ex)}), 500
@@ -164,6 +225,19 @@ def update_data():
         return jsonify({"message": "Transcription added successfully", "transcript_id": insert_id}), 201
     except Exception as ex:
         return jsonify({"message": "Error occurred while adding transcript", "error": str(ex)}), 500
+
+
+@app.route('/interview/update_batch', methods=['POST'])
+@jwt_required()
+def update_data_batch():
+    try:
+        data = request.json
+        insert_ids = DU.add_transcriptions_batch_to_table(data)
+        return jsonify({"message": "Transcriptions added successfully", "transcript_ids": insert_ids}), 201
+    except ValueError as ex:
+        return jsonify({"message": "Invalid transcription batch", "error": str(ex)}), 400
+    except Exception as ex:
+        return jsonify({"message": "Error occurred while adding transcripts", "error": str(ex)}), 500
     
     
 @app.route('/interview/get_notes', methods=['POST'])
@@ -176,6 +250,45 @@ def get_key_notes():
     except Exception as ex:
         return jsonify({"message": "Error occurred while generating keynotes", "error": str(ex)}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events, result_key):
+    """
+    Send ("token", text) / ("done", result) events as Server-Sent Events: a 'token' event per piece
+    of the LLM output, then a 'done' event carrying the stored result under result_key.
+    Any other (event, dict) pair is sent as is. An error after the stream has started is sent
+    as an 'error' event.
+    """
+    def generate():
+        try:
+            for event, data in events:
+                if event == "token":
+                    yield sse_event("token", {"token": data})
+                elif event == "done":
+                    yield sse_event("done", {result_key: data})
+                else:
+                    yield sse_event(event, data)
+        except Exception as ex:
+            yield sse_event("error", {"error": str(ex)})
+        finally:
+            events.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/interview/get_notes/stream', methods=['POST'])
+@jwt_required()
+def stream_key_notes():
+    try:
+        events = llm.stream_key_notes(request.json)
+        return sse_response(events, "keynotes")
+    except Exception as ex:
+        return jsonify({"message": "Error occurred while generating keynotes", "error": str(ex)}), 500
+
+
 @app.route('/interview/get_interview_details/<meeting_id>', methods=['GET'])
 @jwt_required()
 def get_interview_details(meeting_id):
@@ -242,6 +355,16 @@ def add_interview_questions(meeting_id):
         return jsonify({"message": "Error occurred while adding interview question", "error": str(ex)}), 500
     
 
+@app.route('/interview/similar_questions/<meeting_id>/<question_id>', methods=['GET'])
+@jwt_required()
+def get_similar_interview_questions(meeting_id, question_id):
+    try:
+        questions = DU.get_similar_questions(meeting_id, question_id)
+        return jsonify({"message": "Similar questions fetched successfully", "questions": questions}), 200
+    except Exception as ex:
+        return jsonify({"message": "Error occurred while fetching similar questions", "error": str(ex)}), 500
+
+
 @app.route('/interview/dislike_question/<meeting_id>/<question_id>', methods=['PATCH'])
 @jwt_required()
 def dislike_interview_question(meeting_id, question_id):
@@ -268,24 +391,70 @@ def retrieving_prev_interviews():
 def get_questions_from_trans():
     try:
         data = request.json
-        result = llm.generate_questions(data)
-        return jsonify({"message": "Generated Questions Succesfully", "questions": result}), 200
+        with completion_cache.tracking() as cache_status:
+            result = llm.generate_questions(data)
+        return jsonify({"message": "Generated Questions Succesfully", "questions": result, "cache": cache_status}), 200
     except Exception as ex:
         return jsonify({"message": "Error occurred while generating questions", "error": str(ex)}), 500
     
 
+@app.route('/interview/get_questions/stream', methods=['POST'])
+@jwt_required()
+def stream_questions_from_trans():
+    try:
+        events = llm.stream_questions(request.json)
+        return sse_response(events, "questions")
+    except Exception as ex:
+        return jsonify({"message": "Error occurred while generating questions", "error": str(ex)}), 500
+
+
 @app.route('/farpointbot/bot_response', methods=['POST'])
 @jwt_required()
 def generating_bot_response():
     try:
         data = request.json
-        result = rag.query_response(data['user_input'])
+        # Optional 'filters' (interview_id, company, file_path, file_type, date_from, date_to)
+        # restrict retrieval to a slice of the corpus
+        result = semantic_cache.answer(data['user_input'], C.BOT_RESPONSE_CACHE_TTL, data.get('filters'))
         # result = 'Response From Bot'
-        return jsonify({"message": "Generated Bot Response Succesfully", "bot_response": str(result)}), 200
+        return jsonify({"message": "Generated Bot Response Succesfully", "bot_response": result["answer"],
+                        "sources": result["sources"], "cache": bot_cache_status(result)}), 200
+    except ValueError as ex:
+        return jsonify({"message": "Invalid filters", "error": str(ex)}), 400
     except Exception as ex:
         return jsonify({"message": "Error generating response from FarpointBOT", "error": str(ex)}), 500
     
 
+def bot_cache_status(result):
+    # Same shape as the completion cache statuses of the other routes
+    return {"bot_response": result["cache"]} if result["cache"] else {}
+
+
+def bot_response_events(user_input, filters=None):
+    parts = []
+    for event, data in semantic_cache.stream_answer(user_input, C.BOT_RESPONSE_CACHE_TTL, filters):
+        if event == "token":
+            parts.append(data)
+            yield "token", data
+        else:
+            yield "sources", {"sources": data}
+    yield "done", "".join(parts)
+
+
+@app.route('/farpointbot/bot_response/stream', methods=['POST'])
+@jwt_required()
+def stream_bot_response():
+    try:
+        filters = request.json.get('filters')
+        rag.build_filters(filters)  # Invalid filters fail the request rather than the stream
+        events = bot_response_events(request.json['user_input'], filters)
+        return sse_response(events, "bot_response")
+    except ValueError as ex:
+        return jsonify({"message": "Invalid filters", "error": str(ex)}), 400
+    except Exception as ex:
+        return jsonify({"message": "Error generating response from FarpointBOT", "error": str(ex)}), 500
+
+
 @app.route('/board/get_calendar_events', methods=['GET'])
 @jwt_required()
 def get_calendar_events():
@@ -0,0 +1,369 @@
+import asyncpg
+from pgvector.asyncpg import register_vector
+from dotenv import load_dotenv
+import os
+
+from src import config as C
+from src import utils as U
+from src import db_utils as DU
+from src import dedupe
+
+load_dotenv() # Load the environment variables from the .env file
+logger = U.get_logger()
+
+# asyncpg pool owned by the event loop of the async server; see init_pool / close_pool
+_pool = None
+
+
+async def _init_connection(conn):
+    await register_vector(conn)
+
+
+async def init_pool():
+    '''
+    Create the asyncpg connection pool. Must be awaited on the event loop that serves requests.
+    '''
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=os.getenv('POSTGRES_HOST'),
+            database=os.getenv('POSTGRES_DB'),
+            user=os.getenv('POSTGRES_USER'),
+            password=os.getenv('POSTGRES_PASSWORD'),
+            port=os.getenv('POSTGRES_PORT'),
+            min_size=1,
+            max_size=C.POSTGRES_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=C.POSTGRES_POOL_MAX_IDLE,
+            timeout=C.POSTGRES_CONNECT_TIMEOUT,
+            init=_init_connection,
+        )
+        logger.info(f"asyncpg connection pool created (max_size={C.POSTGRES_POOL_MAX_SIZE})")
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_pool():
+    if _pool is None:
+        raise RuntimeError("The asyncpg pool is not initialised; await init_pool() first.")
+    return _pool
+
+
+def pool_stats():
+    '''
+    Returns:
+        dict: Size and usage of the asyncpg pool, empty before it is created.
+    '''
+    if _pool is None:
+        return {}
+    return {
+        "max_size": _pool.get_max_size(),
+        "size": _pool.get_size(),
+        "idle": _pool.get_idle_size(),
+        "in_use": _pool.get_size() - _pool.get_idle_size(),
+    }
+
+
+## Transcripts
+
+async def _insert_transcription_rows(conn, interview_id, transcriptions):
+    # Same lock as db_utils._insert_transcription_rows, see generate_latest_transcript_given_id
+    await conn.execute("SELECT 1 FROM interviewBoard WHERE id = $1 FOR KEY SHARE", interview_id)
+
+    rows = [DU._transcription_row(transcription_data, interview_id) for transcription_data in transcriptions]
+    inserted = await conn.fetch("""
+        INSERT INTO interviewTranscription
+        (start, duration, transcript, confidence, speaker, channel, interview_id)
+        SELECT t.start, t.duration, t.transcript, t.confidence, t.speaker, t.channel, $7
+        FROM unnest($1::numeric[], $2::numeric[], $3::text[], $4::numeric[], $5::integer[], $6::integer[])
+             WITH ORDINALITY AS t(start, duration, transcript, confidence, speaker, channel, ord)
+        ORDER BY t.ord
+        RETURNING id
+    """, [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows],
+        [row[3] for row in rows], [row[4] for row in rows], [row[5] for row in rows], interview_id)
+    return [row["id"] for row in inserted]
+
+
+async def add_transcription_to_table(data):
+    """
+    Async equivalent of db_utils.add_transcription_to_table.
+    Returns:
+        int: ID of the inserted record.
+    """
+    interview_id = data.get("_id", None)
+    if not interview_id:
+        raise ValueError("Input data must contain an '_id' field.")
+
+    try:
+        async with get_pool().acquire() as conn:
+            async with conn.transaction():
+                insert_ids = await _insert_transcription_rows(conn, int(interview_id), [data.get("transcription", {})])
+        return insert_ids[0]
+    except Exception as e:
+        logger.error(f"An error occurred in async add_transcription_to_table: {e}", exc_info=True)
+        raise e
+
+
+async def add_transcriptions_batch_to_table(data):
+    """
+    Async equivalent of db_utils.add_transcriptions_batch_to_table.
+    Returns:
+        list: IDs of the inserted records, in the order the segments were sent.
+    """
+    interview_id = data.get("_id", None)
+    transcriptions = data.get("transcriptions", [])
+
+    if not interview_id:
+        raise ValueError("Input data must contain an '_id' field.")
+    if not isinstance(transcriptions, list):
+        raise ValueError("'transcriptions' must be a list of transcription segments.")
+    if len(transcriptions) > C.TRANSCRIPTION_BATCH_MAX_SIZE:
+        raise ValueError(f"A batch can contain at most {C.TRANSCRIPTION_BATCH_MAX_SIZE} transcription segments.")
+    if not transcriptions:
+        return []
+
+    try:
+        async with get_pool().acquire() as conn:
+            async with conn.transaction():
+                return await _insert_transcription_rows(conn, int(interview_id), transcriptions)
+    except Exception as e:
+        logger.error(f"An error occurred in async add_transcriptions_batch_to_table: {e}", exc_info=True)
+        raise e
+
+
+async def read_transcript(interview_id, last_seconds=None, conn=None):
+    """
+    Async equivalent of db_utils.read_transcript (whole meeting or its last N seconds).
+    Returns:
+        str: The utterances joined by newlines, empty when there are none.
+    """
+    query = """
+        SELECT COALESCE(string_agg(NULLIF(transcript, ''), E'\\n' ORDER BY id), '')
+        FROM interviewTranscription
+        WHERE interview_id = $1
+          AND ($2::numeric IS NULL OR start >= (
+                SELECT MAX(start) FROM interviewTranscription WHERE interview_id = $1
+              ) - $2::numeric)
+    """
+    if conn is not None:
+        return await conn.fetchval(query, int(interview_id), last_seconds)
+    async with get_pool().acquire() as conn:
+        return await conn.fetchval(query, int(interview_id), last_seconds)
+
+
+async def generatetranscript_given_id(interview_id, last_seconds=None):
+    try:
+        return await read_transcript(interview_id, last_seconds=last_seconds)
+    except Exception as e:
+        logger.error(f"An error occurred in async generatetranscript_given_id: {e}", exc_info=True)
+        return ""
+
+
+async def generate_latest_transcript_given_id(interview_id):
+    """
+    Async equivalent of db_utils.generate_latest_transcript_given_id.
+    Returns:
+        tuple: The transcripts after the notes cursor concatenated, and the ID of the last one.
+    """
+    try:
+        async with get_pool().acquire() as conn:
+            async with conn.transaction():
+                notes_cursor = await conn.fetchval(
+                    "SELECT notes_transcript_cursor FROM interviewBoard WHERE id = $1 FOR UPDATE", int(interview_id))
+                if notes_cursor is None:
+                    return "", None
+
+                transcripts = await conn.fetch("""
+                    SELECT id, transcript FROM interviewTranscription
+                    WHERE interview_id = $1 AND id > $2
+                    ORDER BY id
+                """, int(interview_id), notes_cursor)
+
+        return "\n".join([row["transcript"] for row in transcripts]), (transcripts[-1]["id"] if transcripts else None)
+
+    except Exception as e:
+        logger.error(f"An error occurred in async generate_latest_transcript_given_id: {e}", exc_info=True)
+        return "", None
+
+
+## Interview details
+
+async def _fetch_interview_details(_id):
+    try:
+        async with get_pool().acquire() as conn:
+            result = await conn.fetchrow(DU.INTERVIEW_DETAILS_QUERY + "WHERE id = $1", int(_id))
+        if result:
+            return DU.interview_details_from_row(result)
+        logger.info("No details found for the given interview ID.")
+        return {}
+    except Exception as e:
+        logger.error(f"An error occurred in async _fetch_interview_details: {e}", exc_info=True)
+        return {}
+
+
+async def get_interview_details(_id):
+    """
+    Async equivalent of db_utils.get_interview_details, sharing its cache.
+    Returns:
+        dict: Interview details in JSON format, including the meeting summary.
+    """
+    key = str(_id)
+    details = DU.interview_details_cache.get(key)
+    if details is None:
+        details = await _fetch_interview_details(_id)
+        if details:
+            DU.interview_details_cache.set(key, details)
+    return dict(details)
+
+
+## Embedding cache
+
+async def fetch_cached_embeddings(digests, model):
+    """
+    Persisted tier of embedding_cache.aget_or_compute.
+    Returns:
+        dict: text hash -> embedding, for the hashes that were found.
+    """
+    async with get_pool().acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT text_hash, embedding FROM embeddingCache
+            WHERE model = $1 AND text_hash = ANY($2::text[])
+        """, model, list(digests))
+    return {row["text_hash"]: row["embedding"].tolist() for row in rows}
+
+
+async def store_cached_embeddings(embeddings_by_hash, model):
+    async with get_pool().acquire() as conn:
+        await conn.executemany("""
+            INSERT INTO embeddingCache (model, text_hash, embedding)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (model, text_hash) DO NOTHING
+        """, [(model, digest, embedding) for digest, embedding in embeddings_by_hash.items()])
+
+
+## Keynotes and questions
+
+async def write_key_notes_to_postgres(interview_id, keynotes, embedding_vector, last_transcript_id=None):
+    try:
+        async with get_pool().acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    INSERT INTO interviewKeynotes (interview_id, keynotes, embedding_vector)
+                    VALUES ($1, $2, $3)
+                """, int(interview_id), keynotes, embedding_vector)
+
+                # See db_utils.write_key_notes_to_postgres
+                if last_transcript_id is not None:
+                    await conn.execute("""
+                        UPDATE interviewBoard SET notes_transcript_cursor = GREATEST(notes_transcript_cursor, $1)
+                        WHERE id = $2
+                    """, last_transcript_id, int(interview_id))
+        logger.info("Keynotes and their embedding vector successfully written to the database.")
+    except Exception as e:
+        logger.error(f"An error occurred in async write_key_notes_to_postgres: {e}", exc_info=True)
+
+
+async def get_all_questions(interview_id, conn=None):
+    """
+    Async equivalent of db_utils.get_all_questions.
+    Returns:
+        list: A list of dictionaries, each containing question details.
+    """
+    query = """
+        SELECT id, question, answered, answer, valid
+        FROM interviewQuestions
+        WHERE interview_id = $1
+        ORDER BY answered, id DESC
+    """
+    try:
+        if conn is not None:
+            rows = await conn.fetch(query, int(interview_id))
+        else:
+            async with get_pool().acquire() as conn:
+                rows = await conn.fetch(query, int(interview_id))
+        return [DU.question_from_row(row) for row in rows]
+    except Exception as e:
+        logger.error(f"An error occurred in async get_all_questions: {e}", exc_info=True)
+        return []
+
+
+async def load_question_matrix(conn, interview_id):
+    """
+    Async equivalent of db_utils.load_question_matrix.
+    Returns:
+        np.ndarray: Normalised embeddings of the stored questions of the interview.
+    """
+    question_matrix = dedupe.get_question_matrix(interview_id)
+    rows = await conn.fetch("""
+        SELECT id, embedding_vector FROM interviewQuestions
+        WHERE interview_id = $1 AND id > $2 AND embedding_vector IS NOT NULL
+        ORDER BY id
+    """, int(interview_id), question_matrix.last_id)
+    question_matrix.extend([row["id"] for row in rows], [row["embedding_vector"] for row in rows])
+    return question_matrix.matrix
+
+
+async def write_unique_questions(conn, interview_id, questions_with_embeddings):
+    """
+    Insert the questions that are not near-duplicates of a stored question of the interview
+    or of another question of the batch, see db_utils.write_unique_questions.
+    Args:
+        conn: asyncpg connection, inside a transaction.
+        interview_id (int): The ID of the interview.
+        questions_with_embeddings (list): (question, embedding) pairs.
+    Returns:
+        int: Number of questions inserted.
+    """
+    if not questions_with_embeddings:
+        return 0
+    candidates = dedupe.normalize_rows([embedding for _, embedding in questions_with_embeddings])
+    # Same lock as db_utils.lock_question_writers, held until the transaction ends
+    await conn.execute("SELECT 1 FROM interviewBoard WHERE id = $1 FOR NO KEY UPDATE", int(interview_id))
+    keep = dedupe.select_unique(await load_question_matrix(conn, interview_id), candidates)
+
+    unique_questions = [(int(interview_id), question, embedding)
+                        for (question, embedding), is_unique in zip(questions_with_embeddings, keep) if is_unique]
+    await conn.executemany("""
+        INSERT INTO interviewQuestions (interview_id, question, embedding_vector)
+        VALUES ($1, $2, $3)
+    """, unique_questions)
+    return len(unique_questions)
+
+
+async def update_answered_questions(conn, answered_questions):
+    """
+    Async equivalent of db_utils.update_answered_questions.
+    Returns:
+        int: Number of rows actually modified.
+    """
+    if not answered_questions:
+        return 0
+    try:
+        status = await conn.execute("""
+            UPDATE interviewQuestions AS q
+            SET answered = v.answered, answer = v.answer
+            FROM unnest($1::integer[], $2::boolean[], $3::text[]) AS v(id, answered, answer)
+            WHERE q.id = v.id
+              AND (q.answered IS DISTINCT FROM v.answered OR q.answer IS DISTINCT FROM v.answer)
+        """, [int(q["id"]) for q in answered_questions],
+            [_as_bool(q["is_answered"]) for q in answered_questions],
+            [q["answer"] for q in answered_questions])
+        # Command status looks like "UPDATE <count>"
+        updated = int(status.split()[-1])
+        logger.info(f"{updated} questions successfully updated in the database.")
+        return updated
+    except Exception as e:
+        logger.error(f"An error occurred in async update_answered_questions: {e}", exc_info=True)
+        return 0
+
+
+def _as_bool(value):
+    # The LLM sometimes answers "true"/"false" as strings
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 't', 'yes', '1')
+    return bool(value)
@@ -0,0 +1,215 @@
+import asyncio
+
+from src import utils as U
+from src import config as C
+from src import embedding_cache
+from src import prompt_capture
+from src import completion_cache
+from src import context_builder
+from src import question_pipeline
+from src import openai_client
+from src import get_from_llm as llm
+from src import async_db_utils as ADU
+
+logger = U.get_logger()
+
+# Async counterparts of the get_from_llm helpers used on the live-interview path.
+# Prompts are built by the same functions as the sync path, only the I/O differs.
+
+
+async def request_embeddings(texts, model=C.EMBEDDING_MODEL):
+    # Chunks are sent concurrently, see get_from_llm.chunk_embedding_inputs
+    responses = await asyncio.gather(*[openai_client.aembeddings(input=chunk, model=model)
+                                       for chunk in llm.chunk_embedding_inputs(texts, model)])
+    return [item.embedding for response in responses
+            for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def get_embeddings(texts, model=C.EMBEDDING_MODEL):
+    if not texts:
+        return []
+    return await embedding_cache.aget_or_compute(texts, lambda missing: request_embeddings(missing, model),
+                                                 ADU.fetch_cached_embeddings, ADU.store_cached_embeddings, model)
+
+
+async def get_embedding(text, model=C.EMBEDDING_MODEL):
+    return (await get_embeddings([text], model))[0]
+
+
+async def create_completion(messages, model=C.OPENAI_MODEL, cache_name=None, cache_ttl=None,
+                            priority=openai_client.LIVE, **params):
+    # Async equivalent of get_from_llm.create_completion, sharing its completion cache
+    async def compute():
+        completion = await openai_client.achat_completion(priority, model=model, messages=messages, **params)
+        return completion.choices[0].message.content
+
+    if not cache_ttl:
+        return await compute()
+    key = completion_cache.fingerprint(model, messages, params)
+    return await completion_cache.aget_or_compute(cache_name or "completion", key, compute, cache_ttl, model)
+
+
+async def _prepare_key_notes(request):
+    # Generate transcript and interview details
+    transcript, last_transcript_id = await ADU.generate_latest_transcript_given_id(request["_id"])
+
+    if not transcript:
+        raise Exception("No new transcript found")
+
+    interview_details = await ADU.get_interview_details(request["_id"])
+    return llm.build_key_notes_messages(request["_id"], interview_details, transcript), last_transcript_id
+
+
+async def generate_key_notes(request):
+    messages, last_transcript_id = await _prepare_key_notes(request)
+
+    completion = await openai_client.achat_completion(
+        model=C.OPENAI_MODEL,
+        messages=messages
+    )
+
+    return await store_key_notes(request["_id"], messages, completion.choices[0].message.content, last_transcript_id)
+
+
+async def store_key_notes(interview_id, messages, content, last_transcript_id=None):
+    keynotes = llm.clean_key_notes(content)
+    prompt_capture.capture('keynotes', messages, keynotes)
+
+    # Write keynotes and their embedding to the PostgreSQL database
+    try:
+        embedding_vector = await get_embedding(keynotes)
+        await ADU.write_key_notes_to_postgres(interview_id, keynotes, embedding_vector, last_transcript_id)
+    except Exception as e:
+        logger.error(f"An error occurred while storing keynotes: {e}", exc_info=True)
+
+    return keynotes
+
+
+async def _prepare_questions(request):
+    # Async counterpart of question_pipeline.start: the shared inputs are loaded once and
+    # answered questions are detected in a task while the new questions are generated
+    interview_id = request["_id"]
+    interview_details, questions = await asyncio.gather(
+        ADU.get_interview_details(interview_id),
+        ADU.get_all_questions(interview_id),
+    )
+    # The context builder may call the LLM to extend the rolling summary; run it off the event loop
+    transcript = await asyncio.to_thread(context_builder.build_transcript_context, interview_id, interview_details)
+
+    answers = asyncio.create_task(detect_answers(interview_id, interview_details, transcript,
+                                                 question_pipeline.unanswered_of(questions)))
+    messages = llm.build_questions_messages(interview_id, interview_details, transcript)
+    return question_pipeline.QuestionRun(interview_id, interview_details, transcript, messages, answers, questions)
+
+
+async def generate_questions(request):
+    run = await _prepare_questions(request)
+
+    content = await create_completion(run.messages, cache_name="questions", cache_ttl=C.QUESTIONS_CACHE_TTL)
+
+    return await store_questions(run, content)
+
+
+async def store_questions(run, content):
+    questions = llm.strip_code_fences(content)
+    prompt_capture.capture('questions', run.messages, questions)
+    questions_json = llm.parse_json_content(questions)
+
+    return await finish_questions(run, questions_json)
+
+
+async def stream_completion(messages, model=C.OPENAI_MODEL):
+    stream = await openai_client.achat_completion(model=model, messages=messages, stream=True)
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def _stream_and_store(messages, store):
+    # Same events as get_from_llm._stream_and_store
+    parts = []
+    async for token in stream_completion(messages):
+        parts.append(token)
+        yield "token", token
+    yield "done", await store("".join(parts))
+
+
+async def stream_key_notes(request):
+    """
+    Streaming variant of generate_key_notes, see get_from_llm.stream_key_notes.
+    Returns:
+        async generator: ("token", text) events, then ("done", keynotes).
+    """
+    messages, last_transcript_id = await _prepare_key_notes(request)
+    return _stream_and_store(
+        messages, lambda content: store_key_notes(request["_id"], messages, content, last_transcript_id))
+
+
+async def stream_questions(request):
+    """
+    Streaming variant of generate_questions, see get_from_llm.stream_questions.
+    Returns:
+        async generator: ("token", text) events, then ("done", questions).
+    """
+    run = await _prepare_questions(request)
+    return _stream_and_store(run.messages, lambda content: store_questions(run, content))
+
+
+async def get_question_answer(questions, interview_id, transcript=None, interview_details=None):
+    if interview_details is None:
+        interview_details = await ADU.get_interview_details(interview_id)
+    if transcript is None:
+        transcript = await asyncio.to_thread(context_builder.build_transcript_context, interview_id, interview_details)
+    messages = llm.build_answered_questions_messages(interview_id, interview_details, questions, transcript)
+
+    completion = await openai_client.achat_completion(
+        model=C.OPENAI_MODEL,
+        messages=messages
+    )
+
+    questions_answers = llm.strip_code_fences(completion.choices[0].message.content)
+    prompt_capture.capture('answered_questions', messages, questions_answers)
+    return llm.parse_json_content(questions_answers)
+
+
+async def detect_answers(interview_id, interview_details, transcript, unanswered_questions):
+    """
+    Async equivalent of question_pipeline.detect_answers.
+    Returns:
+        int: Number of questions updated.
+    """
+    if not unanswered_questions:
+        return 0
+    try:
+        answered_questions = await get_question_answer(unanswered_questions, interview_id, transcript, interview_details)
+        async with ADU.get_pool().acquire() as conn:
+            return await ADU.update_answered_questions(conn, answered_questions)
+    except Exception as e:
+        logger.error(f"An error occurred while detecting answered questions: {e}", exc_info=True)
+        return 0
+
+
+async def finish_questions(run, questions_json):
+    """
+    Async equivalent of question_pipeline.finish. No connection is held while waiting on OpenAI.
+    Returns:
+        list: All questions of the interview.
+    """
+    inserted = None
+    try:
+        logger.info("Writing unique questions")
+        new_questions = list(questions_json.values())
+        embeddings = await get_embeddings(new_questions)
+
+        async with ADU.get_pool().acquire() as conn:
+            async with conn.transaction():
+                inserted = await ADU.write_unique_questions(conn, run.interview_id, list(zip(new_questions, embeddings)))
+    except Exception as e:
+        logger.error(f"An error occurred while writing questions: {e}", exc_info=True)
+
+    updated = await run.answers
+    logger.info(f"Questions stored, {inserted} inserted, {updated} newly answered")
+    # The list read by _prepare_questions is still current when nothing was inserted or answered
+    if inserted == 0 and not updated:
+        return run.questions
+    return await ADU.get_all_questions(run.interview_id)
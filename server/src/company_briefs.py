@@ -0,0 +1,202 @@
+import hashlib
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src import config as C
+from src import utils as U
+from src import db_pool
+from src import corpus as rag_corpus
+from src import completion_cache
+from src import openai_client
+from src import prompt_registry as prompts
+from src import rag
+
+logger = U.get_logger()
+
+# Company briefs shown on the interview screen (/interview/clientinfo). A brief is generated
+# once per company through the RAG query engine and stored in companyBrief with an expiry and
+# the corpus version it was generated from; until it expires, the corpus changes or the prompt
+# is edited, requests read it from there. Adding an interview starts generating the brief of
+# its company in the background, so it is usually ready when the interview screen opens.
+#
+# Within a process, concurrent requests for a brief that is not stored yet share one
+# generation (including a prefetch that is already running) instead of each querying the index.
+
+PROMPT_KEY = 'get_client_details'
+
+executor = ThreadPoolExecutor(max_workers=C.COMPANY_BRIEF_WORKERS, thread_name_prefix="company-brief")
+
+_lock = threading.Lock()
+_inflight = {}  # company key -> Future of the brief being generated
+_stats = {"hits": 0, "misses": 0, "joined": 0, "prefetches": 0, "errors": 0}
+
+
+def _count(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+class MissingPromptError(Exception):
+    """Raised when prompts.json has no template for the company brief."""
+
+
+def company_key(company_name):
+    # Briefs are shared by spellings that differ only in case and spacing
+    return re.sub(r"\s+", " ", company_name).strip().lower()
+
+
+def build_prompt(company_name):
+    '''
+    Returns:
+        tuple: (prompt, prompt_hash); the hash changes whenever the template is edited.
+    Raises:
+        MissingPromptError: When the template is not in prompts.json.
+    '''
+    try:
+        template = prompts.get_template(PROMPT_KEY)
+        raw_prompt = prompts.get_raw_prompt(PROMPT_KEY)
+    except KeyError:
+        raise MissingPromptError(f"'{PROMPT_KEY}' key not found") from None
+    prompt = template.render({"companyname": company_name})
+    prompt_hash = hashlib.sha256(raw_prompt.encode("utf-8")).hexdigest()
+    return prompt, prompt_hash
+
+
+def fetch(key, prompt_hash, corpus):
+    '''
+    Read a stored brief that is still valid.
+    A database error is logged and treated as a miss.
+    Returns:
+        tuple: (brief, version). brief is None when absent, expired, generated from another
+        prompt or from an older corpus version; version is the current corpus version.
+    '''
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        version = rag_corpus.get_corpus_version(cur, corpus)
+        cur.execute("""
+            SELECT brief FROM companyBrief
+            WHERE company_key = %s AND prompt_hash = %s AND corpus = %s AND corpus_version = %s
+              AND expires_at > NOW()
+        """, (key, prompt_hash, corpus, version))
+        row = cur.fetchone()
+        return (row[0] if row else None), version
+    except Exception as e:
+        _count("errors")
+        logger.error(f"An error occurred in company_briefs.fetch: {e}", exc_info=True)
+        return None, None
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def save(key, company_name, brief, prompt_hash, corpus, version, ttl):
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO companyBrief (company_key, company_name, brief, prompt_hash, corpus, corpus_version, expires_at)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW() + make_interval(secs => %s))
+            ON CONFLICT (company_key) DO UPDATE
+            SET company_name = EXCLUDED.company_name, brief = EXCLUDED.brief, prompt_hash = EXCLUDED.prompt_hash,
+                corpus = EXCLUDED.corpus, corpus_version = EXCLUDED.corpus_version,
+                created_at = NOW(), expires_at = EXCLUDED.expires_at
+        """, (key, company_name, brief, prompt_hash, corpus, version, ttl))
+        conn.commit()
+    except Exception as e:
+        _count("errors")
+        logger.error(f"An error occurred in company_briefs.save: {e}", exc_info=True)
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def _generate(key, company_name, prompt, prompt_hash, corpus, version, ttl, priority):
+    # Run the RAG query once per key at a time; later callers wait for the running one
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+    if not owner:
+        _count("joined")
+        return future.result()
+
+    try:
+        brief = str(rag.query_response(prompt, priority=priority))
+        if brief and ttl and version is not None:
+            save(key, company_name, brief, prompt_hash, corpus, version, ttl)
+        future.set_result(brief)
+        return brief
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def get_brief(company_name, ttl=C.CLIENT_DETAILS_CACHE_TTL, priority=openai_client.INTERACTIVE):
+    """
+    Return the brief of a company, generating and storing it when no valid one is stored.
+    Args:
+        company_name (str): Company name as entered for the interview.
+        ttl (float): Seconds a generated brief is served for; 0 always generates a new one.
+        priority (int): Rate limiter priority class of the RAG query.
+    Returns:
+        tuple: (brief, status) with status 'hit' or 'miss'.
+    """
+    key = company_key(company_name)
+    prompt, prompt_hash = build_prompt(company_name)
+    corpus = rag_corpus.current_corpus()
+
+    version = None
+    if ttl:
+        brief, version = fetch(key, prompt_hash, corpus)
+        if brief is not None:
+            _count("hits")
+            return brief, completion_cache.HIT
+
+    _count("misses")
+    return _generate(key, company_name, prompt, prompt_hash, corpus, version, ttl, priority), completion_cache.MISS
+
+
+def _prefetch(company_name):
+    try:
+        _, status = get_brief(company_name, priority=openai_client.LIVE)
+        logger.info(f"Company brief of '{company_name}' prefetched ({status})")
+    except Exception as e:
+        logger.error(f"An error occurred while prefetching the brief of '{company_name}': {e}", exc_info=True)
+
+
+def prefetch(company_name):
+    '''
+    Generate the brief of a company in the background if it is not stored yet.
+    '''
+    if not company_name or not C.CLIENT_DETAILS_CACHE_TTL:
+        return
+    _count("prefetches")
+    executor.submit(_prefetch, company_name)
+
+
+def stats():
+    '''
+    Returns:
+        dict: Hit/miss counters, briefs being generated and hit rate.
+    '''
+    with _lock:
+        result = dict(_stats)
+        result["in_flight"] = len(_inflight)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    return result
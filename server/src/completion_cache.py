@@ -0,0 +1,205 @@
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import threading
+
+from src import config as C
+from src import utils as U
+from src import db_pool
+from src import cache
+
+logger = U.get_logger()
+
+# Cache of LLM completions keyed by a fingerprint of (model, messages, parameters). Call sites
+# opt in by passing a cache_ttl to get_from_llm.create_completion, or by calling get_or_compute;
+# identical prompts within the TTL are then answered without calling OpenAI. The backend is
+# chosen by COMPLETION_CACHE_BACKEND: 'memory' (per process) or 'postgres' (shared by every
+# worker, survives restarts).
+
+HIT = "hit"
+MISS = "miss"
+
+memory_cache = cache.get_cache("completions", maxsize=C.COMPLETION_CACHE_MAX_SIZE, ttl=C.COMPLETION_CACHE_TTL)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+_writes_since_prune = 0
+
+# Statuses of the lookups made while handling the current request, see tracking()
+_request_statuses = contextvars.ContextVar("completion_cache_statuses", default=None)
+
+
+def fingerprint(model, messages, params=None):
+    '''
+    Returns:
+        str: SHA-256 hex digest of the model, the message list and the request parameters.
+    '''
+    payload = json.dumps({"model": model, "messages": messages, "params": params or {}},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def tracking():
+    '''
+    Collect the cache status of every completion looked up inside the block, e.g. to report it
+    in an API response.
+    Yields:
+        dict: Call site name -> 'hit' or 'miss', filled as lookups happen.
+    '''
+    statuses = {}
+    token = _request_statuses.set(statuses)
+    try:
+        yield statuses
+    finally:
+        _request_statuses.reset(token)
+
+
+def record(name, status):
+    with _stats_lock:
+        _stats["hits" if status == HIT else "misses"] += 1
+    statuses = _request_statuses.get()
+    if statuses is not None:
+        statuses[name] = status
+    logger.info(f"Completion cache {status} for {name}")
+
+
+def lookup(key):
+    '''
+    Returns:
+        str: The cached completion, or None when absent or expired.
+    '''
+    if C.COMPLETION_CACHE_BACKEND != "postgres":
+        return memory_cache.get(key)
+
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT response FROM completionCache
+            WHERE fingerprint = %s AND expires_at > NOW()
+        """, (key,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        with _stats_lock:
+            _stats["errors"] += 1
+        logger.error(f"An error occurred in completion_cache.lookup: {e}", exc_info=True)
+        return None
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def store(key, response, ttl=C.COMPLETION_CACHE_TTL, model=None):
+    if C.COMPLETION_CACHE_BACKEND != "postgres":
+        memory_cache.set(key, response, ttl)
+        return
+
+    global _writes_since_prune
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO completionCache (fingerprint, model, response, expires_at)
+            VALUES (%s, %s, %s, NOW() + make_interval(secs => %s))
+            ON CONFLICT (fingerprint) DO UPDATE
+            SET response = EXCLUDED.response, created_at = NOW(), expires_at = EXCLUDED.expires_at
+        """, (key, model, response, ttl))
+
+        with _stats_lock:
+            _writes_since_prune += 1
+            prune = _writes_since_prune >= C.COMPLETION_CACHE_PRUNE_EVERY
+            if prune:
+                _writes_since_prune = 0
+        if prune:
+            _prune(cur)
+        conn.commit()
+    except Exception as e:
+        with _stats_lock:
+            _stats["errors"] += 1
+        logger.error(f"An error occurred in completion_cache.store: {e}", exc_info=True)
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def _prune(cur):
+    # Drop expired entries, then the oldest ones beyond the size bound
+    cur.execute("DELETE FROM completionCache WHERE expires_at <= NOW()")
+    cur.execute("""
+        DELETE FROM completionCache WHERE fingerprint IN (
+            SELECT fingerprint FROM completionCache ORDER BY created_at DESC OFFSET %s
+        )
+    """, (C.COMPLETION_CACHE_MAX_SIZE,))
+
+
+def stats():
+    '''
+    Returns:
+        dict: Backend, hit/miss counters and hit rate.
+    '''
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    result["backend"] = C.COMPLETION_CACHE_BACKEND
+    return result
+
+
+def get_or_compute(name, key, compute, ttl, model=None):
+    '''
+    Return the cached completion stored under key, calling compute() and caching its result
+    on a miss. The outcome is logged and recorded for tracking() under name.
+    Args:
+        name (str): Call site, e.g. 'questions'.
+        key (str): Fingerprint of the request, see fingerprint().
+        compute (callable): Returns the completion text.
+        ttl (float): Seconds the completion stays valid.
+        model (str): Model of the completion, stored alongside it in Postgres.
+    Returns:
+        str: The completion.
+    '''
+    response = lookup(key)
+    if response is not None:
+        record(name, HIT)
+        return response
+
+    record(name, MISS)
+    response = compute()
+    if response:
+        store(key, response, ttl, model)
+    return response
+
+
+async def aget_or_compute(name, key, compute, ttl, model=None):
+    '''
+    Async variant of get_or_compute; compute() returns an awaitable. Postgres lookups run in
+    a worker thread so they do not block the event loop.
+    '''
+    if C.COMPLETION_CACHE_BACKEND == "postgres":
+        response = await asyncio.to_thread(lookup, key)
+    else:
+        response = lookup(key)
+    if response is not None:
+        record(name, HIT)
+        return response
+
+    record(name, MISS)
+    response = await compute()
+    if response:
+        if C.COMPLETION_CACHE_BACKEND == "postgres":
+            await asyncio.to_thread(store, key, response, ttl, model)
+        else:
+            store(key, response, ttl, model)
+    return response
@@ -1,10 +1,16 @@
 
 import os
+from dotenv import load_dotenv
+
+load_dotenv() # Load the environment variables from the .env file
 
 OPENAI_MODEL = "gpt-3.5-turbo-1106"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIMENSION = 1536
 
 QUESTION_SIMILARITY_THRESHOLD = 0.92
 IS_ANSWERED_THRESHOLD = 0.85
+SIMILAR_QUESTIONS_LIMIT = 5
 
 # Check a directory in src/promps exists if not create it
 if not os.path.exists('src/prompts'):
@@ -12,16 +18,107 @@ if not os.path.exists('src/prompts'):
 
 PROMPTS_JSON_PATH = 'src/prompts/prompts.json'
 COMPLETION_JSON_PATH = 'src/prompts/completion.json'
-KEYNOTES_PROMPT_JSON_PATH = 'src/prompts/generated_keynotes_prompt.json'
-QUESTIONS_PROMPT_JSON_PATH = 'src/prompts/generated_questions_prompt.json'
-ANS_QUESTIONS_PROMPT_JSON_PATH = 'src/prompts/answered_questions_prompt.json'
-SUMMARY_PROMPT_JSON_PATH = 'src/prompts/meeting_summary_prompt.json'
 KEYNOTES_PROMPT_PATH = 'src/prompts/keynotes.txt'
 QUESTIONS_PROMPT_PATH = 'src/prompts/keynotes.txt'
-KEYNOTES_PATH = 'src/prompts/keynotes_generated.txt'
-QUESTIONS_PATH = 'src/prompts/questions_generated.txt'
-ANSWERED_QUESTIONS_PATH = 'src/prompts/answered_questions_generated.txt'
+
+# Seconds between two mtime checks of the prompt files
+PROMPT_RELOAD_CHECK_INTERVAL = float(os.getenv('PROMPT_RELOAD_CHECK_INTERVAL', 2))
+
+# Optional capture of prompts and responses, written in the background as JSON lines
+PROMPT_CAPTURE_ENABLED = os.getenv('PROMPT_CAPTURE', 'false').lower() in ('1', 'true', 'yes')
+PROMPT_CAPTURE_PATH = os.getenv('PROMPT_CAPTURE_PATH', 'logs/prompt_capture.jsonl')
+PROMPT_CAPTURE_QUEUE_SIZE = int(os.getenv('PROMPT_CAPTURE_QUEUE_SIZE', 1000))
 
 PHRASE_TO_REMOVE = 'key points discussed:'
 
+# In-process cache of interview details and the general prompt rendered from them
+INTERVIEW_CACHE_MAX_SIZE = int(os.getenv('INTERVIEW_CACHE_MAX_SIZE', 256))
+INTERVIEW_CACHE_TTL = float(os.getenv('INTERVIEW_CACHE_TTL', 300))
+
+# Maximum number of transcript segments accepted by one /interview/update_batch call
+TRANSCRIPTION_BATCH_MAX_SIZE = int(os.getenv('TRANSCRIPTION_BATCH_MAX_SIZE', 500))
+# Rows fetched per round trip when streaming a transcript through a server-side cursor
+TRANSCRIPT_STREAM_BATCH_SIZE = 500
+
+# Postgres connection pool
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv('POSTGRES_CONNECT_TIMEOUT', 5))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10))
+POSTGRES_POOL_CHECKOUT_TIMEOUT = float(os.getenv('POSTGRES_POOL_CHECKOUT_TIMEOUT', 10))
+POSTGRES_POOL_MAX_IDLE = float(os.getenv('POSTGRES_POOL_MAX_IDLE', 300))
+POSTGRES_POOL_MAX_LIFETIME = float(os.getenv('POSTGRES_POOL_MAX_LIFETIME', 3600))
+POSTGRES_POOL_VALIDATE_AFTER = float(os.getenv('POSTGRES_POOL_VALIDATE_AFTER', 30))
+
+# Transcript archival: finished interviews older than this move to the archive partition
+TRANSCRIPT_ARCHIVE_AFTER_DAYS = int(os.getenv('TRANSCRIPT_ARCHIVE_AFTER_DAYS', 7))
+# Interviews moved per transaction by the archival job
+TRANSCRIPT_ARCHIVE_BATCH_SIZE = int(os.getenv('TRANSCRIPT_ARCHIVE_BATCH_SIZE', 20))
+# Hash partitions of the archive, fixed when the table is first partitioned
+TRANSCRIPT_ARCHIVE_PARTITIONS = 8
+
+# In-memory tier of the embedding cache (entries, about 12 KB each for 1536 dimensions)
+EMBEDDING_CACHE_MAX_SIZE = int(os.getenv('EMBEDDING_CACHE_MAX_SIZE', 4096))
+
+# Embeddings API request limits: inputs per request and total tokens per request
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv('EMBEDDING_BATCH_MAX_INPUTS', 2048))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', 300000))
+
+# Question embedding matrices kept in memory for dedupe (interviews, seconds)
+DEDUPE_CACHE_MAX_INTERVIEWS = int(os.getenv('DEDUPE_CACHE_MAX_INTERVIEWS', 64))
+DEDUPE_CACHE_TTL = float(os.getenv('DEDUPE_CACHE_TTL', 3600))
+
+# Completion cache: 'memory' or 'postgres', total entries, default TTL (seconds)
+COMPLETION_CACHE_BACKEND = os.getenv('COMPLETION_CACHE_BACKEND', 'memory').lower()
+COMPLETION_CACHE_MAX_SIZE = int(os.getenv('COMPLETION_CACHE_MAX_SIZE', 1024))
+COMPLETION_CACHE_TTL = float(os.getenv('COMPLETION_CACHE_TTL', 3600))
+# The Postgres table is pruned of expired and surplus entries every this many writes
+COMPLETION_CACHE_PRUNE_EVERY = int(os.getenv('COMPLETION_CACHE_PRUNE_EVERY', 100))
+# Per call site TTLs (seconds) of the completion cache, 0 disables caching for that call site
+QUESTIONS_CACHE_TTL = float(os.getenv('QUESTIONS_CACHE_TTL', 600))
+
+# Transcript context of question prompts (tokens): the latest utterances are sent verbatim up to
+# TRANSCRIPT_CONTEXT_RAW_TOKENS, older ones are folded into a rolling summary once the verbatim part
+# exceeds that budget by TRANSCRIPT_SUMMARY_STEP_TOKENS, at most TRANSCRIPT_SUMMARY_CHUNK_TOKENS per call
+TRANSCRIPT_CONTEXT_RAW_TOKENS = int(os.getenv('TRANSCRIPT_CONTEXT_RAW_TOKENS', 3000))
+TRANSCRIPT_SUMMARY_STEP_TOKENS = int(os.getenv('TRANSCRIPT_SUMMARY_STEP_TOKENS', 1500))
+TRANSCRIPT_SUMMARY_CHUNK_TOKENS = int(os.getenv('TRANSCRIPT_SUMMARY_CHUNK_TOKENS', 6000))
+TRANSCRIPT_SUMMARY_MAX_TOKENS = int(os.getenv('TRANSCRIPT_SUMMARY_MAX_TOKENS', 600))
+
+# Worker threads shared by the question pipelines of all requests (see src/question_pipeline.py)
+QUESTION_PIPELINE_WORKERS = int(os.getenv('QUESTION_PIPELINE_WORKERS', 8))
+
+# OpenAI rate limiting (see src/openai_client.py): account limits, completion tokens assumed when
+# a request sets no max_tokens, retries of 429/5xx/timeouts with backoff (seconds)
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 3500))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 90000))
+OPENAI_COMPLETION_TOKENS_ESTIMATE = int(os.getenv('OPENAI_COMPLETION_TOKENS_ESTIMATE', 500))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 5))
+OPENAI_BACKOFF_BASE = float(os.getenv('OPENAI_BACKOFF_BASE', 0.5))
+OPENAI_BACKOFF_MAX = float(os.getenv('OPENAI_BACKOFF_MAX', 20))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+OPENAI_LIMITER_POLL_INTERVAL = 0.05
+# Retrieved context and answer of a RAG query, counted against OPENAI_TOKENS_PER_MINUTE
+RAG_PROMPT_TOKENS_ESTIMATE = int(os.getenv('RAG_PROMPT_TOKENS_ESTIMATE', 2500))
+
+# SQLAlchemy pool of the shared RAG vector store (kept connections, extra ones under load)
+RAG_DB_POOL_SIZE = int(os.getenv('RAG_DB_POOL_SIZE', 5))
+RAG_DB_POOL_OVERFLOW = int(os.getenv('RAG_DB_POOL_OVERFLOW', 5))
+# Build the RAG index when the server starts instead of on the first query
+RAG_WARM_UP = os.getenv('RAG_WARM_UP', 'true').lower() in ('1', 'true', 'yes')
+# Retrieval: nodes passed to the LLM, hybrid vector + full-text search, candidates taken from
+# each of the two searches before fusion, reciprocal rank fusion constant
+RAG_TOP_K = int(os.getenv('RAG_TOP_K', 2))
+RAG_HYBRID_SEARCH = os.getenv('RAG_HYBRID_SEARCH', 'true').lower() in ('1', 'true', 'yes')
+RAG_HYBRID_CANDIDATES = int(os.getenv('RAG_HYBRID_CANDIDATES', 10))
+RAG_RRF_K = 60
+
+# Semantic cache of bot answers: TTL (seconds, 0 disables it), cosine similarity from which a
+# stored query counts as the same question, entries kept per corpus, writes between prunes
+BOT_RESPONSE_CACHE_TTL = float(os.getenv('BOT_RESPONSE_CACHE_TTL', 3600))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.97))
+SEMANTIC_CACHE_MAX_SIZE = int(os.getenv('SEMANTIC_CACHE_MAX_SIZE', 5000))
+SEMANTIC_CACHE_PRUNE_EVERY = int(os.getenv('SEMANTIC_CACHE_PRUNE_EVERY', 50))
 
+# Company briefs of /interview/clientinfo: seconds a brief is served for (0 disables storing
+# them) and threads generating briefs in the background when an interview is added
+CLIENT_DETAILS_CACHE_TTL = float(os.getenv('CLIENT_DETAILS_CACHE_TTL', 86400))
+COMPANY_BRIEF_WORKERS = int(os.getenv('COMPANY_BRIEF_WORKERS', 2))
@@ -0,0 +1,100 @@
+from src import config as C
+from src import utils as U
+from src import db_utils as DU
+from src import get_from_llm as llm
+from src import prompt_registry as prompts
+
+logger = U.get_logger()
+
+# Token-budgeted transcript for the question prompts. The latest utterances are sent verbatim
+# and everything before them is represented by a rolling summary stored in transcriptSummary,
+# which is extended only with the utterances that left the verbatim window since the last call.
+# Prompt size therefore stays bounded however long the meeting runs.
+
+
+def _chunk_rows(rows, max_tokens):
+    chunk, chunk_tokens = [], 0
+    for row in rows:
+        if chunk and chunk_tokens + row["tokens"] > max_tokens:
+            yield chunk
+            chunk, chunk_tokens = [], 0
+        chunk.append(row)
+        chunk_tokens += row["tokens"]
+    if chunk:
+        yield chunk
+
+
+def _join(rows):
+    return "\n".join(row["transcript"] for row in rows)
+
+
+def summarize(interview_id, interview_details, summary, rows):
+    """
+    Extend a rolling summary with the next utterances of the meeting.
+    Args:
+        interview_id (int): The ID of the interview.
+        interview_details (dict): Details used to fill the prompt placeholders.
+        summary (str): Summary of the meeting so far, may be empty.
+        rows (list): Utterances following the summarized part.
+    Returns:
+        str: The updated summary.
+    """
+    general_prompt = llm.get_general_prompt(interview_id, interview_details)
+    values = dict(interview_details, summary_words=C.TRANSCRIPT_SUMMARY_MAX_TOKENS * 2 // 3)
+    summary_prompt = prompts.render(["rolling_summary_prompt"], values)
+    summary_prompt += "\nSummary so far:\n" + (summary or "(none)") + "\n\nNext part of the transcript:\n" + _join(rows)
+
+    messages = prompts.build_messages('rolling_summary_prompt', general_prompt, summary_prompt)
+    return llm.create_completion(messages, max_tokens=C.TRANSCRIPT_SUMMARY_MAX_TOKENS).strip()
+
+
+def keynotes_digest(interview_id, max_tokens=C.TRANSCRIPT_SUMMARY_MAX_TOKENS):
+    # The latest stored keynotes that fit in max_tokens, oldest first
+    selected, tokens = [], 0
+    for keynotes in reversed(DU.get_all_keynotes(interview_id)):
+        tokens += U.count_tokens(keynotes)
+        if selected and tokens > max_tokens:
+            break
+        selected.append(keynotes)
+    return "\n".join(reversed(selected))
+
+
+def build_transcript_context(interview_id, interview_details=None):
+    """
+    Build the transcript section of a prompt within the configured token budget.
+    Args:
+        interview_id (int): The ID of the interview.
+        interview_details (dict): Details of the interview, loaded when a summary must be extended.
+    Returns:
+        str: The whole transcript while it fits the budget, otherwise the summary of the earlier
+        part of the meeting followed by its latest utterances.
+    """
+    summary, summarized_id = DU.get_transcript_summary(interview_id)
+    rows = [dict(row, tokens=U.count_tokens(row["transcript"]))
+            for row in DU.iter_transcript_rows(interview_id, after_id=summarized_id) if row["transcript"]]
+
+    if sum(row["tokens"] for row in rows) > C.TRANSCRIPT_CONTEXT_RAW_TOKENS + C.TRANSCRIPT_SUMMARY_STEP_TOKENS:
+        # Keep the latest utterances that fit the verbatim budget, fold the rest into the summary
+        split, raw_tokens = len(rows), 0
+        while split > 1 and (not raw_tokens or raw_tokens + rows[split - 1]["tokens"] <= C.TRANSCRIPT_CONTEXT_RAW_TOKENS):
+            split -= 1
+            raw_tokens += rows[split]["tokens"]
+        older, rows = rows[:split], rows[split:]
+
+        try:
+            if interview_details is None:
+                interview_details = DU.get_interview_details(interview_id)
+            for chunk in _chunk_rows(older, C.TRANSCRIPT_SUMMARY_CHUNK_TOKENS):
+                summary = summarize(interview_id, interview_details, summary, chunk)
+                # Another request may have extended the summary meanwhile; this one stays valid for this call
+                DU.save_transcript_summary(interview_id, summary, chunk[-1]["id"], summarized_id)
+                summarized_id = chunk[-1]["id"]
+            logger.info(f"Extended the transcript summary of interview {interview_id} by {len(older)} utterances")
+        except Exception as e:
+            logger.error(f"An error occurred while summarizing the transcript, using keynotes instead: {e}", exc_info=True)
+            summary = keynotes_digest(interview_id)
+
+    if not summary:
+        return _join(rows)
+    return ("Summary of the earlier part of the meeting:\n" + summary +
+            "\n\nTranscript of the latest part of the meeting:\n" + _join(rows))
@@ -0,0 +1,57 @@
+import os
+
+from src import utils as U
+from src import db_pool
+
+logger = U.get_logger()
+
+# Versions of the vector tables the bot answers from, kept in ragCorpus. Vectorizing documents
+# or an interview into a table bumps its version; answers and company briefs cached from an
+# earlier version are no longer served (see semantic_cache.py and company_briefs.py).
+
+
+def current_corpus():
+    return os.environ["POSTGRES_VECTOR_TABLE"]
+
+
+def get_corpus_version(cur, corpus):
+    cur.execute("SELECT version FROM ragCorpus WHERE name = %s", (corpus,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def bump_corpus_version(corpus=None):
+    '''
+    Record that the corpus changed: answers cached for earlier versions are no longer served
+    and are deleted.
+    Args:
+        corpus (str): Vector table name, defaults to POSTGRES_VECTOR_TABLE.
+    Returns:
+        int: The new version.
+    '''
+    corpus = corpus or current_corpus()
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO ragCorpus (name) VALUES (%s)
+            ON CONFLICT (name) DO UPDATE SET version = ragCorpus.version + 1, updated_at = NOW()
+            RETURNING version
+        """, (corpus,))
+        version = cur.fetchone()[0]
+        cur.execute("DELETE FROM ragAnswerCache WHERE corpus = %s AND corpus_version < %s", (corpus, version))
+        conn.commit()
+        logger.info(f"Corpus {corpus} is now at version {version}, {cur.rowcount} cached answers dropped")
+        return version
+    except Exception as e:
+        logger.error(f"An error occurred in bump_corpus_version: {e}", exc_info=True)
+        if conn is not None:
+            conn.rollback()
+        raise
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
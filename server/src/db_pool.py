@@ -0,0 +1,371 @@
+import time
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from dotenv import load_dotenv
+import os
+
+from src import config as C
+from src import utils as U
+
+load_dotenv() # Load the environment variables from the .env file
+logger = U.get_logger()
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class PooledConnection:
+    """
+    Proxy around a psycopg2 connection checked out from a ConnectionPool.
+    Behaves like the underlying connection, except that close() hands the
+    connection back to the pool instead of closing the socket.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def _checked_out(self):
+        # After close() the connection may already be checked out by another thread
+        if self._released:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._checked_out(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._checked_out(), name, value)
+
+    def __enter__(self):
+        self._checked_out().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self):
+        # Reads as closed once returned, like a closed psycopg2 connection
+        return 1 if self._released else self._conn.closed
+
+    @property
+    def raw(self):
+        return self._checked_out()
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._conn)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+    Args:
+        connect (callable): Returns a new psycopg2 connection.
+        max_size (int): Maximum number of open connections.
+        checkout_timeout (float): Seconds to wait for a free connection before failing.
+        max_idle (float): Idle connections older than this many seconds are closed.
+        max_lifetime (float): Connections older than this many seconds are recycled.
+        validate_after (float): Idle time in seconds after which a connection is pinged on checkout.
+        configure (callable): Optional hook run once on every new connection.
+    """
+
+    def __init__(self, connect, max_size=10, checkout_timeout=10.0, max_idle=300.0,
+                 max_lifetime=3600.0, validate_after=30.0, configure=None):
+        self._connect = connect
+        self._configure = configure
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, last_used), most recently used on the right
+        self._created_at = {}  # id(conn) -> creation time
+        self._size = 0
+        self._waiting = 0
+        self._last_prune = time.monotonic()
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "validation_failures": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    ## Checkout / release
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, opening a new one if the pool is not full.
+        Returns:
+            connection: A live psycopg2 connection.
+        Raises:
+            PoolTimeoutError: If no connection is available within checkout_timeout.
+        """
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+
+        while True:
+            conn, idle_for = self._reserve(deadline)
+            if conn is None:
+                conn = self._open()
+            elif idle_for >= self.validate_after and not self._is_alive(conn):
+                with self._cond:
+                    self._stats["validation_failures"] += 1
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["total_wait_seconds"] += waited
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            return conn
+
+    def release(self, conn):
+        """
+        Return a connection to the pool. Open transactions are rolled back and
+        broken or expired connections are closed instead of being reused.
+        """
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+
+        if self._expired(conn, time.monotonic()):
+            self._discard(conn)
+            return
+
+        with self._cond:
+            now = time.monotonic()
+            self._idle.append((conn, now))
+            self._cond.notify()
+            prune_due = now - self._last_prune >= self.max_idle / 2
+            if prune_due:
+                self._last_prune = now
+
+        if prune_due:
+            self.prune()
+
+    def connection(self):
+        """Check out a connection wrapped so that close() returns it to the pool."""
+        return PooledConnection(self, self.acquire())
+
+    ## Maintenance
+
+    def prune(self):
+        """Close idle connections that exceeded max_idle or max_lifetime."""
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            keep = deque()
+            for conn, last_used in self._idle:
+                if now - last_used >= self.max_idle or self._expired(conn, now):
+                    stale.append(conn)
+                else:
+                    keep.append((conn, last_used))
+            self._idle = keep
+        for conn in stale:
+            self._discard(conn)
+
+    def close_all(self):
+        """Close every idle connection. Checked-out connections are closed on release."""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """
+        Snapshot of the pool metrics.
+        Returns:
+            dict: Sizes, counters and wait times of the pool.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+            })
+        checkouts = stats["checkouts"]
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / checkouts if checkouts else 0.0
+        return stats
+
+    ## Internals
+
+    def _reserve(self, deadline):
+        """
+        Take an idle connection, or a slot to open a new one, waiting until deadline.
+        Returns:
+            tuple: (connection, idle seconds) or (None, 0) when a new slot was reserved.
+        """
+        stale = []
+        try:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        conn, last_used = self._idle.pop()
+                        if now - last_used >= self.max_idle or self._expired(conn, now):
+                            self._forget_locked(conn)
+                            stale.append(conn)
+                            continue
+                        return conn, now - last_used
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, 0
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.checkout_timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+        finally:
+            for conn in stale:
+                self._close_quietly(conn)
+
+    def _open(self):
+        conn = None
+        try:
+            conn = self._connect()
+            if self._configure is not None:
+                self._configure(conn)
+        except Exception:
+            if conn is not None:
+                self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._forget_locked(conn)
+
+    def _forget_locked(self, conn):
+        if self._created_at.pop(id(conn), None) is not None:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+        self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, now):
+        created_at = self._created_at.get(id(conn), now)
+        return now - created_at >= self.max_lifetime
+
+    @staticmethod
+    def _is_alive(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+def _connect():
+    return psycopg2.connect(
+        host=os.getenv('POSTGRES_HOST'),
+        database=os.getenv('POSTGRES_DB'),
+        user=os.getenv('POSTGRES_USER'),
+        password=os.getenv('POSTGRES_PASSWORD'),
+        port=os.getenv('POSTGRES_PORT'),
+        connect_timeout=C.POSTGRES_CONNECT_TIMEOUT
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    '''
+    Return the process-wide connection pool, creating it on first use.
+    Returns:
+        ConnectionPool: The shared pool.
+    '''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    max_size=C.POSTGRES_POOL_MAX_SIZE,
+                    checkout_timeout=C.POSTGRES_POOL_CHECKOUT_TIMEOUT,
+                    max_idle=C.POSTGRES_POOL_MAX_IDLE,
+                    max_lifetime=C.POSTGRES_POOL_MAX_LIFETIME,
+                    validate_after=C.POSTGRES_POOL_VALIDATE_AFTER,
+                )
+                logger.info(f"Postgres connection pool created (max_size={C.POSTGRES_POOL_MAX_SIZE})")
+    return _pool
+
+
+def get_db_connection():
+    '''
+    Check out a connection from the process-wide pool.
+    Calling close() on the returned connection hands it back to the pool.
+    Returns:
+        PooledConnection: The pooled connection object
+    '''
+    return get_pool().connection()
+
+
+def pool_stats():
+    '''
+    Returns:
+        dict: Metrics of the process-wide connection pool.
+    '''
+    return get_pool().stats()
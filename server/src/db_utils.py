@@ -1,31 +1,45 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 
 from src import get_from_llm as llm
 from src import config as C
 from src import utils as U
+from src import db_pool
+from src import cache
+from src import dedupe
 
 load_dotenv() # Load the environment variables from the .env file
 logger = U.get_logger()
 
+# Interview metadata and the general prompt rendered from it barely change during a meeting
+interview_details_cache = cache.get_cache("interview_details", maxsize=C.INTERVIEW_CACHE_MAX_SIZE,
+                                          ttl=C.INTERVIEW_CACHE_TTL)
+general_prompt_cache = cache.get_cache("general_prompt", maxsize=C.INTERVIEW_CACHE_MAX_SIZE,
+                                       ttl=C.INTERVIEW_CACHE_TTL)
+
 def get_db_connection():
     '''
-    This function is used to connect to the PostGresDB
+    This function is used to get a connection to the PostGresDB from the shared pool.
+    Closing the connection returns it to the pool.
     Returns:
         connection: Returns the connection object
     '''
-    conn = psycopg2.connect(
-        host=os.getenv('POSTGRES_HOST'),
-        database=os.getenv('POSTGRES_DB'),
-        user=os.getenv('POSTGRES_USER'),
-        password=os.getenv('POSTGRES_PASSWORD'),
-        port=os.getenv('POSTGRES_PORT')
-    )
-    return conn
+    return db_pool.get_db_connection()
+
+
+def invalidate_interview_cache(interview_id):
+    '''
+    Drop the cached details and general prompt of an interview after it changes.
+    Args:
+        interview_id (int): The ID of the interview.
+    '''
+    interview_details_cache.invalidate(str(interview_id))
+    general_prompt_cache.invalidate(str(interview_id))
 
 
 def insert_data_to_postgres(data, table_name='interviewboard'):
@@ -53,6 +67,9 @@ def insert_data_to_postgres(data, table_name='interviewboard'):
 
     cur.close()
     conn.close()
+
+    if table_name.lower() == 'interviewboard':
+        invalidate_interview_cache(insert_id)
     return insert_id
 
 
@@ -71,22 +88,16 @@ def get_summary_and_finish_interview(data, table_name='interviewboard'):
     conn = None
     cur = None
     try:
-        # Connect to your postgres DB
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Fetch all transcript data
-        cur.execute("""
-            SELECT transcript FROM interviewtranscription
-            WHERE interview_id = %s
-        """, (data['_id'],))
-        
-        transcripts = cur.fetchall()
-        all_transcript = '\n'.join([t[0] for t in transcripts if t[0]])
+        # Fetch the whole transcript, assembled by Postgres
+        all_transcript = read_transcript(data['_id'])
 
         # Get meeting summary using a hypothetical llm.get_meeting_summary function
         meeting_summary = llm.get_meeting_summary(data, all_transcript)
 
+        # Connect to your postgres DB once the summary is ready
+        conn = get_db_connection()
+        cur = conn.cursor()
+
         # Prepare the update query for interviewboard to also update latest_meeting_summary
         update_query = f"""
             UPDATE {table_name}
@@ -99,6 +110,7 @@ def get_summary_and_finish_interview(data, table_name='interviewboard'):
         # Execute the update query
         cur.execute(update_query, (finish_time, meeting_summary, meeting_summary, interview_id))
         conn.commit()
+        invalidate_interview_cache(interview_id)
 
         logger.info(f"Interview with ID {interview_id} marked as finished and summary updated.")
     
@@ -116,6 +128,44 @@ def get_summary_and_finish_interview(data, table_name='interviewboard'):
         return interview_id
 
 
+def _transcription_row(transcription_data, interview_id):
+    # Raised as ValueError so the batch routes answer 400 rather than 500
+    if not isinstance(transcription_data, dict):
+        raise ValueError("Each transcription segment must be an object.")
+    return (
+        transcription_data.get("start", 0.0),
+        transcription_data.get("duration", 0.0),
+        transcription_data.get("transcript", ""),
+        transcription_data.get("confidence", 0.0),
+        transcription_data.get("speaker", -1),
+        transcription_data.get("channel", -1),
+        interview_id
+    )
+
+
+def _insert_transcription_rows(cur, interview_id, rows):
+    """
+    Insert transcription rows of one interview with a single multi-row INSERT.
+    Args:
+        cur: Cursor of an open connection.
+        interview_id (int): The ID of the interview the rows belong to.
+        rows (list): Tuples built by _transcription_row.
+    Returns:
+        list: IDs of the inserted records, in input order.
+    """
+    # Taken before the ids are drawn, so a notes cursor read (FOR UPDATE on the same row)
+    # never sees a higher id committed while a lower one is still in flight
+    cur.execute("SELECT 1 FROM interviewBoard WHERE id = %s FOR KEY SHARE", (interview_id,))
+
+    inserted = execute_values(cur, """
+        INSERT INTO interviewTranscription 
+        (start, duration, transcript, confidence, speaker, channel, interview_id) 
+        VALUES %s
+        RETURNING id
+    """, rows, page_size=len(rows), fetch=True)
+    return [row[0] for row in inserted]
+
+
 def add_transcription_to_table(data):
     """
     Add transcription data to 'interviewTranscription' table in PostgreSQL database.
@@ -129,12 +179,6 @@ def add_transcription_to_table(data):
     conn = None
     cur = None
     try:
-        # Connect to your postgres DB
-        conn = get_db_connection()
-
-        # Open a cursor to perform database operations
-        cur = conn.cursor()
-
         # Extract relevant data from input
         interview_id = data.get("_id", None)
         transcription_data = data.get("transcription", {})
@@ -142,28 +186,18 @@ def add_transcription_to_table(data):
         if not interview_id:
             raise ValueError("Input data must contain an '_id' field.")
 
+        # Connect to your postgres DB
+        conn = get_db_connection()
+
+        # Open a cursor to perform database operations
+        cur = conn.cursor()
+
         # Insert data into 'interviewTranscription' table
-        cur.execute("""
-            INSERT INTO interviewTranscription 
-            (start, duration, transcript, confidence, speaker, channel, interview_id) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            transcription_data.get("start", 0.0),
-            transcription_data.get("duration", 0.0),
-            transcription_data.get("transcript", ""),
-            transcription_data.get("confidence", 0.0),
-            transcription_data.get("speaker", -1),
-            transcription_data.get("channel", -1),
-            interview_id
-        ))
+        insert_id = _insert_transcription_rows(cur, interview_id, [_transcription_row(transcription_data, interview_id)])[0]
 
         # Commit changes
         conn.commit()
 
-        # Retrieve the last inserted id
-        cur.execute('SELECT LASTVAL()')
-        insert_id = cur.fetchone()[0]
-
         # logger.info(f"Transcription data added successfully. Inserted record ID: {insert_id}")
 
     except Exception as e:
@@ -180,6 +214,52 @@ def add_transcription_to_table(data):
     return insert_id
 
 
+def add_transcriptions_batch_to_table(data):
+    """
+    Add a batch of transcription segments for one interview to the 'interviewTranscription'
+    table in a single transaction and a single multi-row INSERT.
+
+    Args:
+        data (dict): Dictionary with the interview '_id' and a 'transcriptions' list.
+
+    Returns:
+        list: IDs of the inserted records, in the order the segments were sent.
+    """
+    conn = None
+    cur = None
+    try:
+        interview_id = data.get("_id", None)
+        transcriptions = data.get("transcriptions", [])
+
+        if not interview_id:
+            raise ValueError("Input data must contain an '_id' field.")
+        if not isinstance(transcriptions, list):
+            raise ValueError("'transcriptions' must be a list of transcription segments.")
+        if len(transcriptions) > C.TRANSCRIPTION_BATCH_MAX_SIZE:
+            raise ValueError(f"A batch can contain at most {C.TRANSCRIPTION_BATCH_MAX_SIZE} transcription segments.")
+        if not transcriptions:
+            return []
+
+        rows = [_transcription_row(transcription_data, interview_id) for transcription_data in transcriptions]
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        insert_ids = _insert_transcription_rows(cur, interview_id, rows)
+        conn.commit()
+
+    except Exception as e:
+        logger.error(f"An error occurred in add_transcriptions_batch_to_table: {e}", exc_info=True)
+        raise e
+
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+    return insert_ids
+
+
 def get_last_10_finished_interviews():
     """
     Retrieve the last 10 finished interviews from the database.
@@ -231,36 +311,146 @@ def get_last_10_finished_interviews():
     return result
 
 
-def generatetranscript_given_id(interview_id):
+def read_transcript(interview_id, start_from=None, end_at=None, last_seconds=None, conn=None):
     """
-    Retrieve interview transcripts from the database ,
-    concatenate them, and then mark them as added to notes.
+    Assemble the transcript of an interview inside Postgres, in utterance order.
     Args:
         interview_id (int): The ID of the interview.
+        start_from (float): Only include utterances starting at or after this offset, in seconds.
+        end_at (float): Only include utterances starting before this offset, in seconds.
+        last_seconds (float): Only include the utterances of the last N seconds of the meeting.
+        conn: Connection to the PostgreSQL database. A pooled one is used when omitted.
+    Returns:
+        str: The utterances joined by newlines, empty when there are none.
+    """
+    cur = None
+    owns_conn = conn is None
+    try:
+        if owns_conn:
+            conn = get_db_connection()
+        cur = conn.cursor()
+
+        filters = [sql.SQL("interview_id = %(interview_id)s")]
+        if start_from is not None:
+            filters.append(sql.SQL("start >= %(start_from)s"))
+        if end_at is not None:
+            filters.append(sql.SQL("start < %(end_at)s"))
+        if last_seconds is not None:
+            filters.append(sql.SQL("""start >= (
+                SELECT MAX(start) FROM interviewTranscription WHERE interview_id = %(interview_id)s
+            ) - %(last_seconds)s"""))
+
+        cur.execute(sql.SQL("""
+            SELECT COALESCE(string_agg(NULLIF(transcript, ''), E'\\n' ORDER BY id), '')
+            FROM interviewTranscription
+            WHERE {filters}
+        """).format(filters=sql.SQL(" AND ").join(filters)), {
+            "interview_id": interview_id,
+            "start_from": start_from,
+            "end_at": end_at,
+            "last_seconds": last_seconds,
+        })
+        return cur.fetchone()[0]
+    finally:
+        if cur is not None:
+            cur.close()
+        if owns_conn and conn is not None:
+            conn.close()
+
+
+def iter_transcript_rows(interview_id, after_id=0, batch_size=C.TRANSCRIPT_STREAM_BATCH_SIZE):
+    """
+    Stream the utterances of an interview through a named server-side cursor,
+    so only batch_size rows are held in memory at a time.
+    Args:
+        interview_id (int): The ID of the interview.
+        after_id (int): Only yield utterances with a larger transcript id.
+        batch_size (int): Rows fetched from the server per round trip.
+    Yields:
+        dict: 'id', 'start', 'duration', 'speaker' and 'transcript' of each utterance, in order.
+    """
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(name=f"transcript_stream_{interview_id}")
+        cur.itersize = batch_size
+        cur.execute("""
+            SELECT id, start, duration, speaker, transcript FROM interviewTranscription
+            WHERE interview_id = %s AND id > %s
+            ORDER BY id
+        """, (interview_id, after_id))
+
+        for row in cur:
+            yield {"id": row[0], "start": row[1], "duration": row[2], "speaker": row[3], "transcript": row[4]}
+
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def generatetranscript_given_id(interview_id, last_seconds=None):
+    """
+    Retrieve the interview transcript from the database, concatenated by Postgres.
+    Args:
+        interview_id (int): The ID of the interview.
+        last_seconds (float): Only return the last N seconds of the meeting.
     Returns:
         str: Concatenated transcripts.
     """
+    try:
+        return read_transcript(interview_id, last_seconds=last_seconds)
+
+    except Exception as e:
+        logger.error(f"An error occurred in generatetranscript_given_id: {e}", exc_info=True)
+        return ""
+
+
+def generate_latest_transcript_given_id(interview_id):
+    """
+    Retrieve the interview transcripts added after the interview's notes cursor and
+    concatenate them. The cursor is left as is: write_key_notes_to_postgres advances it
+    once the keynotes built from these transcripts are stored.
+    Args:
+        interview_id (int): The ID of the interview.
+    Returns:
+        tuple: Concatenated transcripts, and the ID of the last one (None when there are none).
+    """
     conn = None
     cur = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
 
-        # Query to retrieve transcripts for the given interview_id where added_to_notes is False
-        cur.execute("SELECT transcript FROM interviewTranscription WHERE interview_id = %s", (interview_id,))
+        # FOR UPDATE waits for in-flight transcript inserts, so no id is read past a lower one still uncommitted
+        cur.execute("SELECT notes_transcript_cursor FROM interviewBoard WHERE id = %s FOR UPDATE", (interview_id,))
+        row = cur.fetchone()
+        if row is None:
+            return "", None
+        notes_cursor = row[0]
+
+        # Range scan over the transcripts after the cursor
+        cur.execute("""
+            SELECT id, transcript FROM interviewTranscription
+            WHERE interview_id = %s AND id > %s
+            ORDER BY id
+        """, (interview_id, notes_cursor))
 
         # Fetch all matching rows
         transcripts = cur.fetchall()
 
         # Concatenate the transcripts
-        concatenated_transcripts = "\n".join([transcript[0] for transcript in transcripts])
+        concatenated_transcripts = "\n".join([transcript[1] for transcript in transcripts])
+
+        conn.commit()
 
-        return concatenated_transcripts
+        return concatenated_transcripts, (transcripts[-1][0] if transcripts else None)
 
     except Exception as e:
-        logger.error(f"An error occurred in generatetranscript_given_id: {e}", exc_info=True)
-        return ""
-    
+        logger.error(f"An error occurred in generate_latest_transcript_given_id: {e}", exc_info=True)
+        return "", None
     finally:
         # Close the cursor and connection
         if cur is not None:
@@ -269,40 +459,55 @@ def generatetranscript_given_id(interview_id):
             conn.close()
 
 
-def generate_latest_transcript_given_id(interview_id):
+def archive_finished_transcripts(older_than_days=C.TRANSCRIPT_ARCHIVE_AFTER_DAYS, batch_size=C.TRANSCRIPT_ARCHIVE_BATCH_SIZE):
     """
-    Retrieve interview transcripts from the database where added_to_notes is False,
-    concatenate them, and then mark them as added to notes.
+    Move the transcripts of interviews finished more than older_than_days ago from the hot
+    partition of interviewTranscription to the archive partition. Archived transcripts are
+    still returned by every transcript read; the hot partition only keeps live interviews.
+    Each batch of interviews is moved in its own transaction, so the job can be stopped at any time.
     Args:
-        interview_id (int): The ID of the interview.
+        older_than_days (int): Grace period after an interview finishes.
+        batch_size (int): Number of interviews moved per transaction.
     Returns:
-        str: Concatenated transcripts.
+        int: Number of transcript rows archived.
     """
+    # finish_time is stored as '%Y-%m-%d %H:%M:%S' text, which sorts chronologically
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+
     conn = None
     cur = None
+    archived = 0
     try:
         conn = get_db_connection()
         cur = conn.cursor()
 
-        # Query to retrieve transcripts for the given interview_id where added_to_notes is False
-        cur.execute("SELECT transcript FROM interviewTranscription WHERE interview_id = %s AND added_to_notes = False", (interview_id,))
-
-        # Fetch all matching rows
-        transcripts = cur.fetchall()
-
-        # Concatenate the transcripts
-        concatenated_transcripts = "\n".join([transcript[0] for transcript in transcripts])
+        while True:
+            cur.execute("""
+                SELECT b.id FROM interviewBoard b
+                WHERE b.finished = TRUE AND b.finish_time < %s
+                  AND EXISTS (SELECT 1 FROM interviewTranscription t
+                              WHERE t.interview_id = b.id AND t.archived = FALSE)
+                ORDER BY b.id
+                LIMIT %s
+            """, (cutoff, batch_size))
+            interview_ids = [row[0] for row in cur.fetchall()]
+            if not interview_ids:
+                break
 
-        if transcripts:
-            # Update the added_to_notes column to True for all fetched transcripts
-            cur.execute("UPDATE interviewTranscription SET added_to_notes = True WHERE interview_id = %s AND added_to_notes = False", (interview_id,))
+            # Updating the partition key moves the rows to the archive partition
+            cur.execute("""
+                UPDATE interviewTranscription SET archived = TRUE
+                WHERE archived = FALSE AND interview_id = ANY(%s)
+            """, (interview_ids,))
+            archived += cur.rowcount
             conn.commit()
+            logger.info(f"Archived {cur.rowcount} transcript rows of interviews {interview_ids}.")
 
-        return concatenated_transcripts
+        return archived
 
     except Exception as e:
-        logger.error(f"An error occurred in generate_latest_transcript_given_id: {e}", exc_info=True)
-        return ""
+        logger.error(f"An error occurred in archive_finished_transcripts: {e}", exc_info=True)
+        raise e
     finally:
         # Close the cursor and connection
         if cur is not None:
@@ -313,12 +518,52 @@ def generate_latest_transcript_given_id(interview_id):
 
 def get_interview_details(_id):
     """
-    Retrieve interview details from the database for a given interview ID, including the meeting summary.
+    Retrieve interview details for a given interview ID, including the meeting summary.
+    Served from the in-process cache when possible; see invalidate_interview_cache.
     Args:
         _id (int): The ID of the interview.
     Returns:
         dict: Interview details in JSON format, including the meeting summary.
     """
+    details = interview_details_cache.get_or_load(str(_id), lambda: _fetch_interview_details(_id))
+    # Hand out a copy so callers cannot modify the cached entry
+    return dict(details)
+
+
+INTERVIEW_DETAILS_QUERY = """
+    SELECT name, title, company_name, company_website, job_description, 
+           company_description, interview_description, date, start_time, finish_time, meeting_summary, latest_meeting_summary
+    FROM interviewBoard
+"""
+
+
+def interview_details_from_row(result):
+    """
+    Build the interview details dictionary from a row of INTERVIEW_DETAILS_QUERY.
+    """
+    # Construct the JSON object with the added meeting_summary
+    return {
+        "nameofclient": result[2],  # Assuming company_name is the name of the client
+        "clientwebsite": result[3],
+        "company_description": result[5],
+        "name": result[0],
+        "title": result[1],
+        "date": result[7].isoformat() if result[7] else None,  # Converting date to string
+        "jobdescription": result[4],
+        "interview_description": result[6],
+        "meeting_summary": result[10],
+        "latest_meeting_summary": result[11]
+    }
+
+
+def _fetch_interview_details(_id):
+    """
+    Read interview details from the database for a given interview ID.
+    Args:
+        _id (int): The ID of the interview.
+    Returns:
+        dict: Interview details, or an empty dict if the interview does not exist.
+    """
     conn = None
     cur = None
     try:
@@ -327,37 +572,19 @@ def get_interview_details(_id):
         cur = conn.cursor()
 
         # Updated query to retrieve interview details along with meeting_summary
-        cur.execute("""
-            SELECT name, title, company_name, company_website, job_description, 
-                   company_description, interview_description, date, start_time, finish_time, meeting_summary, latest_meeting_summary
-            FROM interviewBoard
-            WHERE id = %s
-        """, (_id,))
+        cur.execute(INTERVIEW_DETAILS_QUERY + "WHERE id = %s", (_id,))
 
         # Fetch the interview details
         result = cur.fetchone()
 
         if result:
-            # Construct the JSON object with the added meeting_summary
-            details = {
-                "nameofclient": result[2],  # Assuming company_name is the name of the client
-                "clientwebsite": result[3],
-                "company_description": result[5],
-                "name": result[0],
-                "title": result[1],
-                "date": result[7].isoformat() if result[7] else None,  # Converting date to string
-                "jobdescription": result[4],
-                "interview_description": result[6],
-                "meeting_summary": result[10],
-                "latest_meeting_summary": result[11]
-            }
-            return details
+            return interview_details_from_row(result)
         else:
             logger.info("No details found for the given interview ID.")
             return {}
 
     except Exception as e:
-        logger.error(f"An error occurred in get_interview_details: {e}", exc_info=True)
+        logger.error(f"An error occurred in _fetch_interview_details: {e}", exc_info=True)
         return {}
     finally:
         # Close the cursor and connection to free resources
@@ -383,6 +610,7 @@ def update_meeting_summary(meeting_id, new_summary):
 
         # Commit the changes to the database
         conn.commit()
+        invalidate_interview_cache(meeting_id)
 
         return "Meeting summary updated successfully"
     except Exception as e:
@@ -416,7 +644,12 @@ def add_interview_question(meeting_id, question):
     except Exception as e:
         logger.error(f"An error occurred while adding interview question: {e}", exc_info=True)
         return f"Error: {str(e)}"
-    
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
 
 def dislike_interview_question_logic(meeting_id, question_id):
     conn = None
@@ -449,12 +682,65 @@ def dislike_interview_question_logic(meeting_id, question_id):
             conn.close()
 
 
-def write_key_notes_to_postgres(interview_id, keynotes):
+def get_transcript_summary(interview_id):
+    """
+    Returns:
+        tuple: (summary, last_transcript_id) of the interview's rolling summary, ("", 0) when none.
     """
-    Write keynotes and their embedding vector to the 'interviewKeynotes' table in the PostgreSQL database.
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT summary, last_transcript_id FROM transcriptSummary WHERE interview_id = %s
+        """, (interview_id,))
+        row = cur.fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def save_transcript_summary(interview_id, summary, last_transcript_id, previous_transcript_id):
+    """
+    Store a rolling summary unless another request already advanced it past previous_transcript_id.
+    Returns:
+        bool: True when the summary was stored.
+    """
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO transcriptSummary (interview_id, summary, last_transcript_id)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (interview_id) DO UPDATE
+            SET summary = EXCLUDED.summary, last_transcript_id = EXCLUDED.last_transcript_id, updated_at = NOW()
+            WHERE transcriptSummary.last_transcript_id = %s
+        """, (interview_id, summary, last_transcript_id, previous_transcript_id))
+        stored = cur.rowcount == 1
+        conn.commit()
+        return stored
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def write_key_notes_to_postgres(interview_id, keynotes, last_transcript_id=None):
+    """
+    Write keynotes and their embedding vector to the 'interviewKeynotes' table in the PostgreSQL database,
+    and advance the interview's notes cursor past the transcripts they were built from.
     Args:
         interview_id (int): The ID of the interview.
         keynotes (str): Keynotes text to be written to the database.
+        last_transcript_id (int): ID of the last transcript covered by the keynotes, as returned
+            by generate_latest_transcript_given_id.
     """
     conn = None
     cur = None
@@ -471,9 +757,16 @@ def write_key_notes_to_postgres(interview_id, keynotes):
         # Insert keynotes and their embedding into the 'interviewKeynotes' table
         cur.execute("""
             INSERT INTO interviewKeynotes (interview_id, keynotes, embedding_vector)
-            VALUES (%s, %s, %s)
+            VALUES (%s, %s, %s::vector)
         """, (interview_id, keynotes, embedding_vector))
 
+        # Same transaction as the insert, so the transcripts are skipped only once their keynotes exist
+        if last_transcript_id is not None:
+            cur.execute("""
+                UPDATE interviewBoard SET notes_transcript_cursor = GREATEST(notes_transcript_cursor, %s)
+                WHERE id = %s
+            """, (last_transcript_id, interview_id))
+
         # Commit changes
         conn.commit()
         logger.info("Keynotes and their embedding vector successfully written to the database.")
@@ -491,89 +784,181 @@ def write_key_notes_to_postgres(interview_id, keynotes):
 
 ### Function for question generation ------------------------------------------------------------------------
 
-def write_unique_questions(interview_id, questions_json, conn):
-    cur = conn.cursor()
-
-    # Retrieve existing questions and their embeddings
-    cur.execute("SELECT id, embedding_vector FROM interviewQuestions WHERE interview_id = %s", (interview_id,))
-    existing_questions = cur.fetchall()
+def get_similar_questions(interview_id, question_id, limit=C.SIMILAR_QUESTIONS_LIMIT):
+    """
+    Retrieve the questions of an interview most similar to one of its stored questions.
+    Args:
+        interview_id (int): The ID of the interview.
+        question_id (int): The ID of the reference question.
+        limit (int): Maximum number of questions to return.
+    Returns:
+        list: Dictionaries with 'id', 'question' and 'similarity', most similar first.
+    """
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            WITH target AS (
+                SELECT embedding_vector AS embedding FROM interviewQuestions
+                WHERE id = %s AND interview_id = %s
+            )
+            SELECT q.id, q.question, 1 - (q.embedding_vector <=> target.embedding) AS similarity
+            FROM interviewQuestions q, target
+            WHERE q.interview_id = %s AND q.id <> %s AND q.embedding_vector IS NOT NULL
+            ORDER BY q.embedding_vector <=> target.embedding
+            LIMIT %s
+        """, (question_id, interview_id, interview_id, question_id, limit))
+        return [{"id": row[0], "question": row[1], "similarity": row[2]} for row in cur.fetchall()]
 
-    # Iterate over each new question
-    for _, new_question in questions_json.items():
-        new_embedding = llm.get_embedding(new_question)
+    except Exception as e:
+        logger.error(f"An error occurred in get_similar_questions: {e}", exc_info=True)
+        return []
 
-        # Check similarity with existing questions
-        is_unique = True
-        for _, existing_embedding in existing_questions:
-            if llm.get_similarity(new_embedding, existing_embedding) >= C.QUESTION_SIMILARITY_THRESHOLD:
-                is_unique = False
-                break
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
 
-        # If the new question is unique, add it to the database
-        if is_unique:
-            cur.execute("""
-                INSERT INTO interviewQuestions (interview_id, question, embedding_vector)
-                VALUES (%s, %s, %s)
-                RETURNING id
-            """, (interview_id, new_question, new_embedding))
-            new_q_id = cur.fetchone()[0]
 
-    conn.commit()
-    return None
+def lock_question_writers(interview_id, conn):
+    """
+    Lock the interview row until the end of the transaction, so the questions of an interview
+    are written one batch at a time. Ids are then committed in increasing order and the
+    id > last_id refresh of load_question_matrix cannot miss a row committed late.
+    FOR NO KEY UPDATE does not block the FOR KEY SHARE of transcript inserts.
+    Args:
+        interview_id (int): The ID of the interview.
+        conn: Connection to the PostgreSQL database, committed by the caller.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM interviewBoard WHERE id = %s FOR NO KEY UPDATE", (interview_id,))
+    finally:
+        cur.close()
 
 
-def get_answered_questions(interview_id, conn):
+def load_question_matrix(interview_id, conn):
+    """
+    Bring the dedupe matrix of an interview up to date with the questions stored since its last refresh.
+    Args:
+        interview_id (int): The ID of the interview.
+        conn: Connection to the PostgreSQL database.
+    Returns:
+        np.ndarray: Normalised embeddings of the stored questions of the interview.
+    """
+    question_matrix = dedupe.get_question_matrix(interview_id)
     cur = conn.cursor()
-    cur.execute("""
-        SELECT id, question, answered FROM interviewQuestions
-        WHERE interview_id = %s and answered = false
-        ORDER BY id DESC
-    """, (interview_id,))
+    try:
+        cur.execute("""
+            SELECT id, embedding_vector::real[] FROM interviewQuestions
+            WHERE interview_id = %s AND id > %s AND embedding_vector IS NOT NULL
+            ORDER BY id
+        """, (interview_id, question_matrix.last_id))
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    question_matrix.extend([row[0] for row in rows], [row[1] for row in rows])
+    return question_matrix.matrix
+
+
+def write_unique_questions(interview_id, questions_json, conn):
+    """
+    Insert the generated questions that are not near-duplicates of a stored question of the
+    interview or of another question of the same batch.
+    Args:
+        interview_id (int): The ID of the interview.
+        questions_json (dict): Generated questions, keyed by their position.
+        conn: Connection to the PostgreSQL database.
+    Returns:
+        int: Number of questions inserted.
+    """
+    new_questions = list(questions_json.values())
+    if not new_questions:
+        return 0
+
+    # Embed every generated question in one batch and score it against all stored ones at once
+    new_embeddings = llm.get_embeddings(new_questions)
+    lock_question_writers(interview_id, conn)
+    keep = dedupe.select_unique(load_question_matrix(interview_id, conn), dedupe.normalize_rows(new_embeddings))
+
+    unique_questions = [(interview_id, question, embedding)
+                        for question, embedding, is_unique in zip(new_questions, new_embeddings, keep) if is_unique]
+    if unique_questions:
+        cur = conn.cursor()
+        try:
+            execute_values(cur, """
+                INSERT INTO interviewQuestions (interview_id, question, embedding_vector)
+                VALUES %s
+            """, unique_questions, template="(%s, %s, %s::vector)")
+        finally:
+            cur.close()
 
-    questions = [{"id": row[0], "question": row[1], "answered": row[2]} for row in cur.fetchall()]
-    questions_with_answers = llm.get_question_answer(questions, interview_id)
-    return questions_with_answers
+    conn.commit()
+    return len(unique_questions)
 
 
 def update_answered_questions(answered_questions, conn):
     """
-    Update the 'answered' and 'answer' columns in the 'interviewQuestions' table based on the provided data.
+    Update the 'answered' and 'answer' columns in the 'interviewQuestions' table based on the provided data,
+    with a single UPDATE ... FROM (VALUES ...) statement. Rows that already hold the same values are skipped.
     Args:
         answered_questions (list): List of dictionaries with question details.
         conn: Connection to the PostgreSQL database.
+    Returns:
+        int: Number of rows actually modified.
     """
     cur = None
+    updated = 0
     try:
+        rows = [(question["id"], question["is_answered"], question["answer"]) for question in answered_questions]
+        if not rows:
+            return 0
+
         # Open a cursor to perform database operations
         cur = conn.cursor()
 
-        # Update each question in the database
-        for question in answered_questions:
-            update_query = """
-                UPDATE interviewQuestions
-                SET answered = %s, answer = %s
-                WHERE id = %s
-            """
-            # Extract the values from the question dictionary
-            q_id = question["id"]
-            is_answered = question["is_answered"]
-            answer = question["answer"]
-
-            # Execute the update query
-            cur.execute(update_query, (is_answered, answer, q_id))
+        # Apply every answer in one round trip
+        execute_values(cur, """
+            UPDATE interviewQuestions AS q
+            SET answered = v.answered, answer = v.answer
+            FROM (VALUES %s) AS v(id, answered, answer)
+            WHERE q.id = v.id
+              AND (q.answered IS DISTINCT FROM v.answered OR q.answer IS DISTINCT FROM v.answer)
+        """, rows, template="(%s::integer, %s::boolean, %s::text)", page_size=len(rows))
+        updated = cur.rowcount
 
         # Commit the changes
         conn.commit()
-        logger.info("Questions successfully updated in the database.")
+        logger.info(f"{updated} questions successfully updated in the database.")
 
     except Exception as e:
         logger.error(f"An error occurred in update_answered_questions: {e}", exc_info=True)
+        conn.rollback()
+        updated = 0
 
     finally:
         # Close the cursor
         if cur is not None:
             cur.close()
 
+    return updated
+
+def question_from_row(row):
+    """
+    Build a question dictionary from an (id, question, answered, answer, valid) row.
+    """
+    return {
+        "id": row[0],
+        "question": row[1],
+        "answered": row[2],
+        "answer": row[3],
+        "valid" : row[4]
+    }
+
+
 def get_all_questions(interview_id, conn=None):
     """
     Retrieve all questions for a given interview ID from the 'interviewQuestions' table,
@@ -586,9 +971,10 @@ def get_all_questions(interview_id, conn=None):
     """
     questions = []
     cur = None
+    owns_conn = conn is None
 
     try:
-        if conn is None:
+        if owns_conn:
             conn = get_db_connection()
         # Open a cursor to perform database operations
         cur = conn.cursor()
@@ -605,52 +991,24 @@ def get_all_questions(interview_id, conn=None):
         rows = cur.fetchall()
 
         # Format each row into a dictionary
-        for row in rows:
-            question_dict = {
-                "id": row[0],
-                "question": row[1],
-                "answered": row[2],
-                "answer": row[3],
-                "valid" : row[4]
-            }
-            questions.append(question_dict)
+        questions = [question_from_row(row) for row in rows]
 
     except Exception as e:
         logger.error(f"An error occurred in get_all_questions: {e}", exc_info=True)
 
     finally:
-        # Close the cursor
+        # Close the cursor, and the connection if it was opened here
         if cur is not None:
             cur.close()
-
-    return questions
-
-def processing_questions_to_postgres(interview_id, questions_json):
-    conn = None
-    cur = None
-    try:
-        conn = get_db_connection()
-        logger.info("Writing unique questions")
-        write_unique_questions(interview_id, questions_json, conn)
-        logger.info("Get the answer of questions")
-        answered_questions = get_answered_questions(interview_id, conn)
-        logger.info("Update answered questions")
-        update_answered_questions(answered_questions, conn)
-        logger.info("All Questions successfully updated in the database.")
-        all_questions = get_all_questions(interview_id, conn)
-    except Exception as e:
-        logger.error(f"An error occurred processing_questions_to_postgres: {e}", exc_info=True)
-        all_questions = get_all_questions(interview_id, conn)
-        return all_questions
-    finally:
-        if conn is not None:
+        if owns_conn and conn is not None:
             conn.close()
-    return all_questions
 
+    return questions
 
 def get_all_keynotes(interview_id):
     conn = None
     cur = None
+    keynotes = []
     try:
         # Connect to your postgres DB
         conn = get_db_connection()
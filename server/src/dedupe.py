@@ -0,0 +1,100 @@
+import threading
+
+import numpy as np
+
+from src import config as C
+from src import cache
+
+# Near-duplicate detection for generated questions. The stored question embeddings of an
+# interview are kept as a matrix of unit rows, so the cosine similarity of a whole batch of
+# new questions against all of them is one matrix product.
+
+
+def normalize_rows(embeddings):
+    '''
+    Returns:
+        np.ndarray: float32 matrix with one L2-normalised row per embedding (zero rows stay zero).
+    '''
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def select_unique(existing, candidates, threshold=C.QUESTION_SIMILARITY_THRESHOLD):
+    '''
+    Decide which candidates are not near-duplicates of a stored question or of an earlier
+    candidate of the same batch.
+    Args:
+        existing (np.ndarray): Normalised embeddings already stored, shape (n, d); n may be 0.
+        candidates (np.ndarray): Normalised embeddings of the new questions, shape (m, d).
+        threshold (float): Cosine similarity from which two questions count as duplicates.
+    Returns:
+        np.ndarray: Boolean mask of the candidates to keep, shape (m,).
+    '''
+    m = candidates.shape[0]
+    if m == 0:
+        return np.zeros(0, dtype=bool)
+
+    if existing.shape[0]:
+        keep = (candidates @ existing.T).max(axis=1) < threshold
+    else:
+        keep = np.ones(m, dtype=bool)
+
+    # Within the batch, a candidate is dropped when it duplicates an earlier kept candidate
+    duplicates = np.triu(candidates @ candidates.T >= threshold, k=1)
+    for i in range(m):
+        if keep[i]:
+            keep[i + 1:] &= ~duplicates[i, i + 1:]
+    return keep
+
+
+class QuestionMatrix:
+    """
+    Normalised embeddings of the stored questions of one interview. The matrix is refreshed
+    incrementally: last_id is the highest question id loaded, only newer rows are read again.
+    This holds because question writers of an interview are serialized by a row lock
+    (db_utils.lock_question_writers), so no lower id is committed after a higher one.
+    """
+
+    def __init__(self, dimension=C.EMBEDDING_DIMENSION):
+        self.lock = threading.Lock()
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+        self.last_id = 0
+
+    def extend(self, ids, embeddings):
+        """
+        Append stored questions read with id > last_id, in id order. Rows another
+        caller already appended are skipped.
+        """
+        with self.lock:
+            rows = [(i, embedding) for i, embedding in zip(ids, embeddings) if i > self.last_id]
+            if not rows:
+                return
+            self.matrix = np.vstack([self.matrix, normalize_rows([embedding for _, embedding in rows])])
+            self.last_id = rows[-1][0]
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+
+# Matrices of the interviews questions were generated for recently
+question_matrices = cache.get_cache("question_matrices", maxsize=C.DEDUPE_CACHE_MAX_INTERVIEWS,
+                                    ttl=C.DEDUPE_CACHE_TTL)
+_matrices_lock = threading.Lock()
+
+
+def get_question_matrix(interview_id):
+    '''
+    Returns:
+        QuestionMatrix: The cached matrix of the interview, empty when first requested.
+    '''
+    key = str(interview_id)
+    with _matrices_lock:
+        matrix = question_matrices.get(key)
+        if matrix is None:
+            matrix = QuestionMatrix()
+            question_matrices.set(key, matrix)
+        return matrix
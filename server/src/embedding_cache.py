@@ -0,0 +1,244 @@
+import hashlib
+import threading
+
+from psycopg2.extras import execute_values
+
+from src import config as C
+from src import utils as U
+from src import db_pool
+from src import cache
+
+logger = U.get_logger()
+
+# Two tiers, both keyed by (model, hash of the normalized text): a bounded in-process LRU in
+# front of the embeddingCache table, which survives restarts and is shared by every worker.
+# Embeddings are deterministic for a given model, so entries never expire; see invalidate_all.
+memory_cache = cache.get_cache("embeddings", maxsize=C.EMBEDDING_CACHE_MAX_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {"db_hits": 0, "db_misses": 0, "db_errors": 0, "computed": 0}
+
+
+def normalize_text(text):
+    '''
+    Text actually sent to the embeddings API: newlines and runs of whitespace collapsed to one space.
+    '''
+    return " ".join(text.split())
+
+
+def text_hash(text):
+    '''
+    Returns:
+        str: SHA-256 hex digest of the normalized text.
+    '''
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _count(**increments):
+    with _stats_lock:
+        for name, value in increments.items():
+            _stats[name] += value
+
+
+def lookup_memory(texts, model=C.EMBEDDING_MODEL):
+    '''
+    Look the texts up in the in-memory tier.
+    Returns:
+        dict: text hash -> embedding, for the texts that were found.
+    '''
+    found = {}
+    for digest in {text_hash(text) for text in texts}:
+        embedding = memory_cache.get((model, digest))
+        if embedding is not None:
+            found[digest] = embedding
+    return found
+
+
+def remember(embeddings_by_hash, model=C.EMBEDDING_MODEL):
+    for digest, embedding in embeddings_by_hash.items():
+        memory_cache.set((model, digest), embedding)
+
+
+def fetch_persisted(digests, model=C.EMBEDDING_MODEL):
+    '''
+    Read persisted embeddings from the embeddingCache table in one query.
+    A database error is logged and treated as a miss, the cache never fails a request.
+    Returns:
+        dict: text hash -> embedding, for the hashes that were found.
+    '''
+    if not digests:
+        return {}
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT text_hash, embedding::real[] FROM embeddingCache
+            WHERE model = %s AND text_hash = ANY(%s)
+        """, (model, list(digests)))
+        found = {row[0]: row[1] for row in cur.fetchall()}
+        _count(db_hits=len(found), db_misses=len(digests) - len(found))
+        return found
+    except Exception as e:
+        _count(db_errors=1)
+        logger.error(f"An error occurred in fetch_persisted: {e}", exc_info=True)
+        return {}
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def persist(embeddings_by_hash, model=C.EMBEDDING_MODEL):
+    '''
+    Store computed embeddings in the embeddingCache table; concurrent writers of the same text are fine.
+    '''
+    if not embeddings_by_hash:
+        return
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO embeddingCache (model, text_hash, embedding)
+            VALUES %s
+            ON CONFLICT (model, text_hash) DO NOTHING
+        """, [(model, digest, embedding) for digest, embedding in embeddings_by_hash.items()],
+            template="(%s, %s, %s::vector)")
+        conn.commit()
+    except Exception as e:
+        _count(db_errors=1)
+        logger.error(f"An error occurred in persist: {e}", exc_info=True)
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def get_or_compute(texts, compute, model=C.EMBEDDING_MODEL):
+    '''
+    Return the embedding of every text, computing only the ones neither tier has.
+    Args:
+        texts (list): Texts to embed; duplicates are computed once.
+        compute (callable): Takes a list of normalized texts, returns their embeddings in order.
+        model (str): Embedding model, part of the cache key.
+    Returns:
+        list: One embedding per input text, in input order.
+    '''
+    digests = [text_hash(text) for text in texts]
+    found = lookup_memory(texts, model)
+
+    missing = [digest for digest in dict.fromkeys(digests) if digest not in found]
+    persisted = fetch_persisted(missing, model)
+    remember(persisted, model)
+    found.update(persisted)
+
+    # One text per missing hash, in first-seen order
+    to_compute = {}
+    for text, digest in zip(texts, digests):
+        if digest not in found and digest not in to_compute:
+            to_compute[digest] = normalize_text(text)
+    if to_compute:
+        computed = dict(zip(to_compute, compute(list(to_compute.values()))))
+        _count(computed=len(computed))
+        remember(computed, model)
+        persist(computed, model)
+        found.update(computed)
+
+    return [found[digest] for digest in digests]
+
+
+def invalidate_all(model=None):
+    '''
+    Drop cached embeddings, e.g. after the embedding model changes.
+    Args:
+        model (str): Only drop the embeddings of this model; all models when None.
+    Returns:
+        int: Number of persisted embeddings deleted.
+    '''
+    memory_cache.clear()
+
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        if model is None:
+            cur.execute("DELETE FROM embeddingCache")
+        else:
+            cur.execute("DELETE FROM embeddingCache WHERE model = %s", (model,))
+        deleted = cur.rowcount
+        conn.commit()
+        logger.info(f"Embedding cache invalidated, {deleted} persisted embeddings deleted.")
+        return deleted
+    except Exception as e:
+        logger.error(f"An error occurred in invalidate_all: {e}", exc_info=True)
+        raise e
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def stats():
+    '''
+    Returns:
+        dict: Counters of both tiers and the overall hit rate (memory or database).
+    '''
+    memory = memory_cache.stats()
+    with _stats_lock:
+        result = dict(_stats)
+    result.update({"memory_hits": memory["hits"], "memory_size": memory["size"], "memory_maxsize": memory["maxsize"]})
+    lookups = result["memory_hits"] + result["db_hits"] + result["computed"]
+    result["hit_rate"] = (result["memory_hits"] + result["db_hits"]) / lookups if lookups else 0.0
+    return result
+
+
+async def aget_or_compute(texts, compute, fetch, store, model=C.EMBEDDING_MODEL):
+    '''
+    Async counterpart of get_or_compute for the async serving path.
+    Args:
+        texts (list): Texts to embed.
+        compute (coroutine function): Takes a list of normalized texts, returns their embeddings in order.
+        fetch (coroutine function): fetch(digests, model) -> dict of persisted embeddings by hash.
+        store (coroutine function): store(embeddings_by_hash, model) persists computed embeddings.
+        model (str): Embedding model, part of the cache key.
+    Returns:
+        list: One embedding per input text, in input order.
+    '''
+    digests = [text_hash(text) for text in texts]
+    found = lookup_memory(texts, model)
+
+    missing = [digest for digest in dict.fromkeys(digests) if digest not in found]
+    if missing:
+        try:
+            persisted = await fetch(missing, model)
+            _count(db_hits=len(persisted), db_misses=len(missing) - len(persisted))
+        except Exception as e:
+            _count(db_errors=1)
+            logger.error(f"An error occurred while reading persisted embeddings: {e}", exc_info=True)
+            persisted = {}
+        remember(persisted, model)
+        found.update(persisted)
+
+    to_compute = {}
+    for text, digest in zip(texts, digests):
+        if digest not in found and digest not in to_compute:
+            to_compute[digest] = normalize_text(text)
+    if to_compute:
+        computed = dict(zip(to_compute, await compute(list(to_compute.values()))))
+        _count(computed=len(computed))
+        remember(computed, model)
+        try:
+            await store(computed, model)
+        except Exception as e:
+            _count(db_errors=1)
+            logger.error(f"An error occurred while persisting embeddings: {e}", exc_info=True)
+        found.update(computed)
+
+    return [found[digest] for digest in digests]
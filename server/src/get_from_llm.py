@@ -1,246 +1,344 @@
-from openai import OpenAI
-
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 import json
-import threading
-import os
 
 from src import utils as U
 from src import db_utils as DU
 from src import config as C
+from src import embedding_cache
+from src import prompt_registry as prompts
+from src import prompt_capture
+from src import completion_cache
+from src import context_builder
+from src import question_pipeline
+from src import openai_client
 
 logger = U.get_logger()
 
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
+def get_general_prompt(interview_id, interview_details):
+    """
+    Render the general system prompt of an interview, cached per interview id.
+    Args:
+        interview_id (int): The ID of the interview.
+        interview_details (dict): Details used to fill the prompt placeholders.
+    Returns:
+        str: The rendered general prompt.
+    """
+    prompts.check_for_updates()
+    return DU.general_prompt_cache.get_or_load(
+        str(interview_id),
+        lambda: prompts.render(["farpoint_general", "client_general", "meeting_general"], interview_details)
+    )
 
-def generate_key_notes(request):
-    # Generate transcript and interview details
-    transcript = DU.generate_latest_transcript_given_id(request["_id"])
-    # transcript = DU.generatetranscript_given_id(request["_id"])
-
-    if not transcript:
-        raise Exception("No new transcript found")
-    
-    interview_details = DU.get_interview_details(request["_id"])
 
+# Rendered general prompts are stale once prompts.json changes
+prompts.on_prompts_reload(lambda: DU.general_prompt_cache.clear())
+
+
+def create_completion(messages, model=C.OPENAI_MODEL, cache_name=None, cache_ttl=None,
+                      priority=openai_client.LIVE, **params):
+    """
+    Run a chat completion and return its text.
+    Args:
+        messages (list): Messages for the chat completions API.
+        model (str): Chat model.
+        cache_name (str): Call site name used in cache logs and statuses.
+        cache_ttl (float): Opt in to the completion cache: identical (model, messages, params)
+            requests within this many seconds are served from it. None or 0 bypasses it.
+        priority (int): Rate limiter priority class, see openai_client.
+        params: Extra parameters of the chat completions API, e.g. temperature.
+    Returns:
+        str: The content of the first choice.
+    """
+    def compute():
+        completion = openai_client.chat_completion(priority, model=model, messages=messages, **params)
+        return completion.choices[0].message.content
+
+    if not cache_ttl:
+        return compute()
+    key = completion_cache.fingerprint(model, messages, params)
+    return completion_cache.get_or_compute(cache_name or "completion", key, compute, cache_ttl, model)
+
+
+def build_key_notes_messages(interview_id, interview_details, transcript):
     # Generate general and keynotes prompts
-    general_prompt = U.generate_prompt(["farpoint_general", "client_general", "meeting_general"], 
-                                       interview_details)
-    keynotes_prompt = U.generate_prompt(["key_notes_prompt"], 
-                                       interview_details)
+    general_prompt = get_general_prompt(interview_id, interview_details)
+    keynotes_prompt = prompts.render(["key_notes_prompt"], interview_details)
     
     # Append the transcript to the keynotes prompt
     keynotes_prompt += "\n" + str(transcript)
 
-    # Read and update completion.json file
-    with open(C.COMPLETION_JSON_PATH, "r") as file:
-        final_keynotes_prompt = json.load(file)
+    return prompts.build_messages('key_notes_prompt', general_prompt, keynotes_prompt)
+
+
+def build_summary_messages(interview_id, interview_details, transcript):
+    # Generate general and summary prompts
+    general_prompt = get_general_prompt(interview_id, interview_details)
+    summary_prompt = prompts.render(["transcript_summary_prompt"], interview_details)
     
-    # Update the content based on the role
-    for prompt in final_keynotes_prompt['key_notes_prompt']:
-        if prompt['role'] == 'system':
-            prompt['content'] = general_prompt
-        elif prompt['role'] == 'user':
-            prompt['content'] = keynotes_prompt
+    # Append the transcript to the summary prompt
+    summary_prompt += "\n" + str(transcript)
 
+    return prompts.build_messages('transcript_summary_prompt', general_prompt, summary_prompt)
 
-    # Write the updated completion_json to a file
-    with open(C.KEYNOTES_PROMPT_JSON_PATH, "w") as file:
-        json.dump(final_keynotes_prompt, file, indent=4)
 
-    # Generate completion using the updated prompts
-    completion = client.chat.completions.create(
-        model=C.OPENAI_MODEL,
-        messages=final_keynotes_prompt['key_notes_prompt']
-    )
+def build_questions_messages(interview_id, interview_details, transcript):
+    # Generate general and questions prompts
+    general_prompt = get_general_prompt(interview_id, interview_details)
+    questions_prompt = prompts.render(["recommended_questions_prompt"], interview_details)
+    
+    # Append the transcript to the questions prompt
+    questions_prompt += "\n" + transcript
 
-    # Extract keynotes from the completion
-    keynotes = completion.choices[0].message.content
+    return prompts.build_messages('recommended_questions_prompt', general_prompt, questions_prompt)
 
-    # Remove the phrase if it exists at the start of the string and strip whitespace
-    if keynotes.startswith(C.PHRASE_TO_REMOVE):
-        keynotes = keynotes[len(C.PHRASE_TO_REMOVE):].strip()
 
-    # Write/append the questions to the text file
-    with open(C.KEYNOTES_PATH, 'a') as file:
-        file.write(keynotes + "\n\n")  # Adding an extra newline for separation between entries
+def build_answered_questions_messages(interview_id, interview_details, questions, transcript):
+    general_prompt = get_general_prompt(interview_id, interview_details)
+    
+    # Used verbatim: the prompt contains a JSON example whose braces are not placeholders
+    answered_questions_prompt = prompts.get_raw_prompt("answered_questions_prompt")
+    
+    # Format each question as '<id>: <question>' and join them with a newline
+    formatted_questions = "\n".join(f"{item['id']}: {item['question']}" for item in questions)
 
-    # Write keynotes to the PostgreSQL database
-    res = DU.write_key_notes_to_postgres(request["_id"], keynotes)
+    # Append the formatted questions to the prompt
+    answered_questions_prompt += "\n" + formatted_questions
 
+    # Append the transcript to the prompt
+    answered_questions_prompt += "\n Please find the transcripts of the meeting below:\n" +  transcript
+
+    return prompts.build_messages('answered_questions_prompt', general_prompt, answered_questions_prompt)
+
+
+def clean_key_notes(keynotes):
+    # Remove the phrase if it exists at the start of the string and strip whitespace
+    if keynotes.startswith(C.PHRASE_TO_REMOVE):
+        keynotes = keynotes[len(C.PHRASE_TO_REMOVE):].strip()
     return keynotes
 
 
-def get_meeting_summary(data, transcript):
+def strip_code_fences(content):
+    return '\n'.join(line for line in content.split('\n') if not line.strip().startswith('```'))
 
-    
-    interview_details = DU.get_interview_details(data["_id"])
 
-    # Generate general and keynotes prompts
-    general_prompt = U.generate_prompt(["farpoint_general", "client_general", "meeting_general"], 
-                                       interview_details)
-    summary_prompt = U.generate_prompt(["transcript_summary_prompt"], 
-                                       interview_details)
-    
-    # Append the transcript to the keynotes prompt
-    summary_prompt += "\n" + str(transcript)
+def parse_json_content(content):
+    """
+    Parse a JSON completion, logging the error before re-raising it when it is malformed.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        logger.error(f"Error decoding the JSON format:: {e}", exc_info=True)
+        raise e
 
-    # Read and update completion.json file
-    with open(C.COMPLETION_JSON_PATH, "r") as file:
-        final_summary_prompt = json.load(file)
-    
-    # Update the content based on the role
-    for prompt in final_summary_prompt['transcript_summary_prompt']:
-        if prompt['role'] == 'system':
-            prompt['content'] = general_prompt
-        elif prompt['role'] == 'user':
-            prompt['content'] = summary_prompt
 
+def generate_key_notes(request):
+    # Generate transcript and interview details
+    transcript, last_transcript_id = DU.generate_latest_transcript_given_id(request["_id"])
+    # transcript = DU.generatetranscript_given_id(request["_id"])
 
-    # Write the updated completion_json to a file
-    with open(C.SUMMARY_PROMPT_JSON_PATH, "w") as file:
-        json.dump(final_summary_prompt, file, indent=4)
+    if not transcript:
+        raise Exception("No new transcript found")
+    
+    interview_details = DU.get_interview_details(request["_id"])
+    messages = build_key_notes_messages(request["_id"], interview_details, transcript)
 
     # Generate completion using the updated prompts
-    completion = client.chat.completions.create(
+    completion = openai_client.chat_completion(
         model=C.OPENAI_MODEL,
-        messages=final_summary_prompt['transcript_summary_prompt']
+        messages=messages
     )
 
-    # Extract keynotes from the completion
-    meeting_summary = completion.choices[0].message.content
-
-    return meeting_summary
+    return store_key_notes(request["_id"], messages, completion.choices[0].message.content, last_transcript_id)
 
 
+def store_key_notes(interview_id, messages, content, last_transcript_id=None):
+    # Extract keynotes from the completion
+    keynotes = clean_key_notes(content)
+    prompt_capture.capture('keynotes', messages, keynotes)
 
-def generate_questions(request):
-
-    # Generate transcript and interview details
-    transcript = DU.generatetranscript_given_id(request["_id"])    
-    interview_details = DU.get_interview_details(request["_id"])
-
-    # Generate general and keynotes prompts
-    general_prompt = U.generate_prompt(["farpoint_general", "client_general", "meeting_general"], 
-                                       interview_details)
-    questions_prompt = U.generate_prompt(["recommended_questions_prompt"], 
-                                       interview_details)
-    
-    # Append the transcript to the keynotes prompt
-    questions_prompt += "\n" + transcript
+    # Write keynotes to the PostgreSQL database
+    DU.write_key_notes_to_postgres(interview_id, keynotes, last_transcript_id)
 
-    # Read and update completion.json file
-    with open(C.COMPLETION_JSON_PATH, "r") as file:
-        final_questions_prompt = json.load(file)
+    return keynotes
 
-    # Update the content based on the role
-    for prompt in final_questions_prompt['recommended_questions_prompt']:
-        if prompt['role'] == 'system':
-            prompt['content'] = general_prompt
-        elif prompt['role'] == 'user':
-            prompt['content'] = questions_prompt
 
-    # Write the updated completion_json to a file
-    with open(C.QUESTIONS_PROMPT_JSON_PATH, "w") as file:   
-        json.dump(final_questions_prompt, file, indent=4)
+def get_meeting_summary(data, transcript):
+    interview_details = DU.get_interview_details(data["_id"])
+    messages = build_summary_messages(data["_id"], interview_details, transcript)
 
-    # Generate completion using the updated prompts
-    completion = client.chat.completions.create(
+    # Generate completion using the updated prompts; the meeting is over, so nobody waits on it live
+    completion = openai_client.chat_completion(
+        openai_client.BACKGROUND,
         model=C.OPENAI_MODEL,
-        messages=final_questions_prompt['recommended_questions_prompt']
+        messages=messages
     )
 
-    # Extract questions from the completion
-    questions = completion.choices[0].message.content
-    questions = '\n'.join(line for line in questions.split('\n') if not line.strip().startswith('```'))
+    # Extract the summary from the completion
+    meeting_summary = completion.choices[0].message.content
+    prompt_capture.capture('meeting_summary', messages, meeting_summary)
 
-    # Write/append the questions to the text file
-    with open(C.QUESTIONS_PATH, 'a') as file:
-        file.write(questions + "\n\n")  # Adding an extra newline for separation between entries
+    return meeting_summary
 
-    try:
-        questions_json = json.loads(questions)
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding the JSON format:: {e}", exc_info=True)
-        
-    # print(f"Similarity Checked questions: {questions_json}")
-    all_questions = DU.processing_questions_to_postgres(request["_id"], questions_json)
-    return all_questions
 
+def generate_questions(request):
 
-def get_question_answer(questions, interview_id):
-    # Generate transcript and interview details
-    transcript = DU.generatetranscript_given_id(interview_id)    
-    interview_details = DU.get_interview_details(interview_id)
+    # Load the shared inputs once; answered questions are detected while new ones are generated
+    run = question_pipeline.start(request["_id"])
 
-    # Generate general and keynotes prompts
-    general_prompt = U.generate_prompt(["farpoint_general", "client_general", "meeting_general"], 
-                                       interview_details)
-    
-    answered_questions_prompt = U.load_json_file(C.PROMPTS_JSON_PATH)["answered_questions_prompt"]
-    # answered_questions_prompt = U.generate_prompt(["answered_questions_prompt"], 
-    #                                    interview_details)
-    
-    # Format each question as '<id>: <question>' and join them with a newline
-    formatted_questions = "\n".join(f"{item['id']}: {item['question']}" for item in questions)
+    # Generate completion using the updated prompts; without new transcript the prompt is
+    # unchanged and the cached completion is reused
+    content = create_completion(run.messages, cache_name="questions", cache_ttl=C.QUESTIONS_CACHE_TTL)
 
-    # Append the formatted questions to the prompt
-    answered_questions_prompt += "\n" + formatted_questions
+    return store_questions(run, content)
 
-    # Append the transcript to the prompt
-    answered_questions_prompt += "\n Please find the transcripts of the meeting below:\n" +  transcript
-    # Read and update completion.json file
-    with open(C.COMPLETION_JSON_PATH, "r") as file:
-        final_answered_questions_prompt = json.load(file)
 
-    # Update the content based on the role
-    for prompt in final_answered_questions_prompt['answered_questions_prompt']:
-        if prompt['role'] == 'system':
-            prompt['content'] = general_prompt
-        elif prompt['role'] == 'user':
-            prompt['content'] = answered_questions_prompt
+def store_questions(run, content):
+    # Extract questions from the completion
+    questions = strip_code_fences(content)
+    prompt_capture.capture('questions', run.messages, questions)
+    questions_json = parse_json_content(questions)
+        
+    # print(f"Similarity Checked questions: {questions_json}")
+    all_questions = question_pipeline.finish(run, questions_json)
+    return all_questions
+
 
+def stream_completion(messages, model=C.OPENAI_MODEL):
+    """
+    Yield the text of a chat completion piece by piece, as the OpenAI streaming API sends it.
+    """
+    stream = openai_client.chat_completion(model=model, messages=messages, stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _stream_and_store(messages, store):
+    """
+    Forward a streamed completion as ("token", text) events, then store the full text and
+    yield ("done", result). When the consumer stops early (the browser went away), the
+    rest of the completion is still read and stored.
+    """
+    tokens = stream_completion(messages)
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield "token", token
+    except GeneratorExit:
+        parts.extend(tokens)
+        store("".join(parts))
+        raise
+    yield "done", store("".join(parts))
+
+
+def stream_key_notes(request):
+    """
+    Streaming variant of generate_key_notes.
+    Yields:
+        tuple: ("token", text) for each piece of the completion, then ("done", keynotes) once stored.
+    """
+    transcript, last_transcript_id = DU.generate_latest_transcript_given_id(request["_id"])
+    if not transcript:
+        raise Exception("No new transcript found")
 
-    # Write the updated completion_json to a file
-    with open(C.ANS_QUESTIONS_PROMPT_JSON_PATH, "w") as file:
-        json.dump(final_answered_questions_prompt, file, indent=4)
+    interview_details = DU.get_interview_details(request["_id"])
+    messages = build_key_notes_messages(request["_id"], interview_details, transcript)
+    return _stream_and_store(
+        messages, lambda content: store_key_notes(request["_id"], messages, content, last_transcript_id))
+
+
+def stream_questions(request):
+    """
+    Streaming variant of generate_questions.
+    Yields:
+        tuple: ("token", text) for each piece of the completion, then ("done", questions) with
+        all the questions of the interview once the new ones are stored.
+    """
+    run = question_pipeline.start(request["_id"])
+    return _stream_and_store(run.messages, lambda content: store_questions(run, content))
+
+
+def get_question_answer(questions, interview_id, transcript=None, interview_details=None):
+    # Generate interview details and the token-budgeted transcript unless the caller already has them
+    if interview_details is None:
+        interview_details = DU.get_interview_details(interview_id)
+    if transcript is None:
+        transcript = context_builder.build_transcript_context(interview_id, interview_details)
+    messages = build_answered_questions_messages(interview_id, interview_details, questions, transcript)
 
     # Generate completion using the updated prompts
-    completion = client.chat.completions.create(
+    completion = openai_client.chat_completion(
         model=C.OPENAI_MODEL,
-        messages=final_answered_questions_prompt['answered_questions_prompt']
+        messages=messages
     )
 
-    questions_answers = completion.choices[0].message.content
-    questions_answers = '\n'.join(line for line in questions_answers.split('\n') if not line.strip().startswith('```'))
-
-    # Write/append the questions to the text file
-    with open(C.ANSWERED_QUESTIONS_PATH, 'a') as file:
-        file.write(questions_answers + "\n\n")  # Adding an extra newline for separation between entries
-
-    try:
-        questions_answers_json = json.loads(questions_answers)
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding the JSON format:: {e}", exc_info=True)
+    questions_answers = strip_code_fences(completion.choices[0].message.content)
+    prompt_capture.capture('answered_questions', messages, questions_answers)
+    questions_answers_json = parse_json_content(questions_answers)
 
     return questions_answers_json
 
 
+def prepare_embedding_text(text):
+    return embedding_cache.normalize_text(text)
+
+
+def chunk_embedding_inputs(texts, model=C.EMBEDDING_MODEL, max_inputs=C.EMBEDDING_BATCH_MAX_INPUTS,
+                           max_tokens=C.EMBEDDING_BATCH_MAX_TOKENS):
+    """
+    Split texts into consecutive chunks that each fit in one embeddings request.
+    Args:
+        texts (list): Texts to embed.
+        max_inputs (int): Maximum number of inputs per request.
+        max_tokens (int): Maximum number of tokens per request, summed over its inputs.
+    Returns:
+        list: Lists of texts, in input order.
+    """
+    chunks = []
+    chunk, chunk_tokens = [], 0
+    for text in texts:
+        tokens = U.count_tokens(text, model)
+        if chunk and (len(chunk) >= max_inputs or chunk_tokens + tokens > max_tokens):
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(text)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def request_embeddings(texts, model=C.EMBEDDING_MODEL, priority=openai_client.LIVE):
+    """
+    Embed texts with one embeddings request per chunk, bypassing the cache.
+    Returns:
+        list: One embedding per text, in input order.
+    """
+    embeddings = []
+    for chunk in chunk_embedding_inputs(texts, model):
+        response = openai_client.embeddings(priority, input=chunk, model=model)
+        embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return embeddings
+
+
+def get_embeddings(texts, model=C.EMBEDDING_MODEL, priority=openai_client.LIVE):
+    """
+    Embed a list of texts. Cached texts are served from the embedding cache and the rest
+    are sent in as few embeddings requests as the provider limits allow.
+    Args:
+        texts (list): Texts to embed.
+        model (str): Embedding model.
+        priority (int): Rate limiter priority class of the embeddings requests.
+    Returns:
+        list: One embedding per text, in input order.
+    """
+    if not texts:
+        return []
+    return embedding_cache.get_or_compute(texts, lambda missing: request_embeddings(missing, model, priority), model)
+
+
+def get_embedding(text, model=C.EMBEDDING_MODEL):
+    return get_embeddings([text], model)[0]
 
-
-def get_embedding(text, model="text-embedding-ada-002"):
-   text = text.replace("\n", " ")
-   return client.embeddings.create(input = [text], model=model).data[0].embedding
-
-
-def get_similarity(embedding1, embedding2, model="text-embedding-ada-002"):
-
-    # Reshaping the embeddings to 2D arrays for sklearn compatibility
-    embedding1 = np.array(embedding1).reshape(1, -1)
-    embedding2 = np.array(embedding2).reshape(1, -1)
-
-    # Calculating cosine similarity
-    similarity_score = cosine_similarity(embedding1, embedding2)[0][0]
-    return similarity_score
@@ -0,0 +1,545 @@
+import os
+
+from psycopg2 import sql
+
+from src import config as C
+from src import utils as U
+from src import db_pool
+
+logger = U.get_logger()
+
+# Key of the advisory lock that keeps two processes from migrating at the same time
+MIGRATION_LOCK_KEY = 764419031
+
+MIGRATIONS = []
+
+
+def migration(version, name, transactional=True):
+    '''
+    Register a schema migration.
+    Args:
+        version (int): Schema version reached once the migration is applied. Versions only ever grow.
+        name (str): Short description stored in schema_migrations.
+        transactional (bool): Run inside one transaction. Migrations that build indexes
+            CONCURRENTLY must set this to False and be safe to re-run.
+    '''
+    def register(func):
+        MIGRATIONS.append({"version": version, "name": name, "transactional": transactional, "apply": func})
+        MIGRATIONS.sort(key=lambda m: m["version"])
+        return func
+    return register
+
+
+def create_index_concurrently(cur, index_name, definition):
+    '''
+    Build an index without blocking writes on the table.
+    An invalid leftover of an interrupted build is dropped and rebuilt.
+    Args:
+        cur: Cursor of a connection in autocommit mode.
+        index_name (str): Name of the index.
+        definition (str): Everything after the index name, e.g. "ON t (a, b) WHERE c".
+    '''
+    cur.execute("""
+        SELECT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = %s
+    """, (index_name,))
+    existing = cur.fetchone()
+    if existing and existing[0]:
+        return
+    if existing:
+        cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(index_name)))
+
+    cur.execute(sql.SQL("CREATE INDEX CONCURRENTLY {} ").format(sql.Identifier(index_name)) + sql.SQL(definition))
+    logger.info(f"Index '{index_name}' created.")
+
+
+# Vector tables of the bot (data_<POSTGRES_VECTOR_TABLE>, the layout of llama_index's
+# PGVectorStore) get generated columns copying the metadata the bot filters on, plus the
+# tsvector column of hybrid search, each with an index; see src/rag.py.
+# filter key -> (column, type, expression over the metadata_ JSON)
+VECTOR_FILTER_COLUMNS = {
+    # Ids that are not a number are stored as NULL instead of failing the insert of the node
+    "interview_id": ("interview_id", "integer",
+                     "CASE WHEN metadata_->>'interview_id' ~ '^[0-9]{1,9}$' "
+                     "THEN (metadata_->>'interview_id')::integer END"),
+    "company": ("company", "text", "lower(metadata_->>'company')"),
+    "file_path": ("file_path", "text", "metadata_->>'file_path'"),
+    "file_type": ("file_type", "text", "lower(metadata_->>'file_type')"),
+    "date": ("doc_date", "text", "left(metadata_->>'date', 10)"),
+}
+VECTOR_TEXT_SEARCH_CONFIG = "english"  # llama_index's default
+
+
+def vector_table_columns():
+    '''
+    Returns:
+        dict: Generated column name -> definition, for every column prepare_vector_table adds.
+    '''
+    columns = {column: f"{sql_type} GENERATED ALWAYS AS ({expression}) STORED"
+               for column, sql_type, expression in VECTOR_FILTER_COLUMNS.values()}
+    columns["text_search_tsv"] = (f"tsvector GENERATED ALWAYS AS "
+                                  f"(to_tsvector('{VECTOR_TEXT_SEARCH_CONFIG}', text)) STORED")
+    return columns
+
+
+def prepare_vector_table(cur, table_name):
+    '''
+    Create the vector table of table_name when missing (the vectorization scripts may create
+    it first through llama_index) and add the generated columns and their indexes.
+    Safe to re-run; callers hold MIGRATION_LOCK_KEY.
+    Args:
+        cur: Cursor of an open connection.
+        table_name (str): Vector table name as given to PGVectorStore, e.g. POSTGRES_VECTOR_TABLE.
+    '''
+    table_name = table_name.lower()  # As PGVectorStore does
+    table = sql.Identifier(f"data_{table_name}")
+    cur.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} (
+            id BIGSERIAL PRIMARY KEY,
+            text VARCHAR NOT NULL,
+            metadata_ JSON,
+            node_id VARCHAR,
+            embedding vector({})
+        );
+    """).format(table, sql.Literal(C.EMBEDDING_DIMENSION)))
+    for column, definition in vector_table_columns().items():
+        cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} ").format(table, sql.Identifier(column))
+                    + sql.SQL(definition))
+    for column, _, _ in VECTOR_FILTER_COLUMNS.values():
+        cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} ({})").format(
+            sql.Identifier(f"{table_name}_{column}_idx"), table, sql.Identifier(column)))
+    # Name llama_index gives the full-text index of a hybrid table
+    cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING gin (text_search_tsv)").format(
+        sql.Identifier(f"{table_name}_idx"), table))
+
+
+## -------------------- Migrations -------------------------------------
+
+@migration(1, "baseline tables")
+def create_baseline_tables(cur):
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS interviewBoard (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100),
+            title VARCHAR(100),
+            company_name VARCHAR(100),
+            company_website VARCHAR(255),
+            job_description TEXT,
+            company_description TEXT,
+            interview_description TEXT,
+            date DATE,
+            start_time TEXT,
+            finish_time TEXT,
+            finished BOOLEAN,
+            meeting_summary TEXT,
+            latest_meeting_summary TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS interviewTranscription (
+            id SERIAL PRIMARY KEY,
+            interview_id INTEGER REFERENCES interviewBoard(id),
+            start NUMERIC,
+            duration NUMERIC,
+            transcript TEXT,
+            confidence NUMERIC,
+            speaker INTEGER,
+            channel INTEGER,
+            added_to_notes BOOLEAN DEFAULT FALSE
+        );
+
+        CREATE TABLE IF NOT EXISTS interviewKeynotes (
+            id SERIAL PRIMARY KEY,
+            interview_id INTEGER REFERENCES interviewBoard(id),
+            keynotes TEXT,
+            embedding_vector vector(%(dim)s)
+        );
+
+        CREATE TABLE IF NOT EXISTS interviewQuestions (
+            id SERIAL PRIMARY KEY,
+            interview_id INTEGER REFERENCES interviewBoard(id),
+            question TEXT,
+            answered BOOLEAN DEFAULT FALSE,
+            answer TEXT DEFAULT '',
+            embedding_vector vector(%(dim)s),
+            valid INTEGER DEFAULT 1
+        );
+
+        CREATE TABLE IF NOT EXISTS oiusers (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) DEFAULT NULL,
+            emailid VARCHAR(100) UNIQUE NOT NULL,
+            role VARCHAR(100) DEFAULT NULL,
+            team VARCHAR(100) DEFAULT NULL,
+            access_token TEXT DEFAULT NULL
+        );
+    """, {"dim": C.EMBEDDING_DIMENSION})
+
+
+@migration(2, "pgvector embedding columns")
+def convert_embeddings_to_pgvector(cur):
+    # Databases created before pgvector still hold FLOAT[] embeddings
+    for table_name in ('interviewkeynotes', 'interviewquestions'):
+        cur.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s AND column_name = 'embedding_vector'
+        """, (table_name,))
+        column = cur.fetchone()
+
+        if column and column[0] == 'ARRAY':
+            cur.execute(sql.SQL("""
+                ALTER TABLE {table} ALTER COLUMN embedding_vector DROP DEFAULT;
+                ALTER TABLE {table} ALTER COLUMN embedding_vector TYPE vector({dim})
+                    USING CASE WHEN cardinality(embedding_vector) = {dim}
+                               THEN embedding_vector::vector({dim}) END;
+            """).format(table=sql.Identifier(table_name), dim=sql.Literal(C.EMBEDDING_DIMENSION)))
+            logger.info(f"Column '{table_name}.embedding_vector' migrated to vector({C.EMBEDDING_DIMENSION}).")
+
+
+@migration(3, "hot path indexes", transactional=False)
+def create_hot_path_indexes(cur):
+    # Transcript reads: all rows of an interview in order, and the rows not yet turned into notes
+    create_index_concurrently(cur, "interviewtranscription_interview_id_idx",
+                              "ON interviewTranscription (interview_id, id)")
+    create_index_concurrently(cur, "interviewtranscription_pending_notes_idx",
+                              "ON interviewTranscription (interview_id, id) WHERE added_to_notes = FALSE")
+
+    # Question listing (ORDER BY answered, id DESC) and the unanswered questions sent for answer detection
+    create_index_concurrently(cur, "interviewquestions_interview_answered_idx",
+                              "ON interviewQuestions (interview_id, answered, id DESC)")
+    create_index_concurrently(cur, "interviewquestions_unanswered_idx",
+                              "ON interviewQuestions (interview_id, id DESC) WHERE answered = FALSE")
+
+    create_index_concurrently(cur, "interviewkeynotes_interview_id_idx",
+                              "ON interviewKeynotes (interview_id, id)")
+
+    # Previous interviews board: finished interviews by most recent finish time
+    create_index_concurrently(cur, "interviewboard_finished_finish_time_idx",
+                              "ON interviewBoard (finish_time DESC) WHERE finished = TRUE")
+
+    # Nearest-question lookups (oiusers.emailid is already covered by its UNIQUE constraint)
+    create_index_concurrently(cur, "interviewquestions_embedding_hnsw_idx",
+                              "ON interviewQuestions USING hnsw (embedding_vector vector_cosine_ops)")
+    create_index_concurrently(cur, "interviewkeynotes_embedding_hnsw_idx",
+                              "ON interviewKeynotes USING hnsw (embedding_vector vector_cosine_ops)")
+
+
+@migration(4, "transcript notes cursor")
+def add_transcript_notes_cursor(cur):
+    # Last transcript id already turned into keynotes, replacing the per-row added_to_notes flag
+    cur.execute("""
+        ALTER TABLE interviewBoard ADD COLUMN IF NOT EXISTS notes_transcript_cursor INTEGER NOT NULL DEFAULT 0;
+
+        UPDATE interviewBoard b
+        SET notes_transcript_cursor = t.last_id
+        FROM (
+            SELECT interview_id, MAX(id) AS last_id FROM interviewTranscription
+            WHERE added_to_notes = TRUE
+            GROUP BY interview_id
+        ) t
+        WHERE b.id = t.interview_id;
+    """)
+
+
+@migration(5, "drop added_to_notes index", transactional=False)
+def drop_pending_notes_index(cur):
+    # Cursor reads are range scans on (interview_id, id)
+    cur.execute("DROP INDEX CONCURRENTLY IF EXISTS interviewtranscription_pending_notes_idx")
+
+
+@migration(6, "transcript time index", transactional=False)
+def create_transcript_time_index(cur):
+    # Time-range and last-N-seconds transcript reads
+    create_index_concurrently(cur, "interviewtranscription_interview_start_idx",
+                              "ON interviewTranscription (interview_id, start)")
+
+
+@migration(7, "partition transcripts into hot and archive")
+def partition_transcripts(cur):
+    # interviewTranscription becomes LIST-partitioned on an archived flag: live interviews write
+    # to the small hot partition, finished ones are moved by db_utils.archive_finished_transcripts
+    # into the archive, itself HASH-partitioned on interview_id so a lookup prunes to one leaf.
+    #
+    # Needs a maintenance window: the rename, the full copy into the new table and the drop run
+    # in one transaction that holds ACCESS EXCLUSIVE on interviewTranscription until it commits.
+    # Every transcript read and insert waits for the whole copy, so stop the servers (no live
+    # interviews) and apply it with a single instance before rolling out the new version.
+    cur.execute("""
+        SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = 'interviewtranscription'
+    """)
+    if cur.fetchone()[0] == 'p':
+        return
+
+    # Keep the id sequence: ids are the notes cursor, they must keep growing across the switch
+    cur.execute("""
+        ALTER SEQUENCE interviewtranscription_id_seq OWNED BY NONE;
+        ALTER TABLE interviewTranscription RENAME TO interviewTranscription_unpartitioned;
+
+        CREATE TABLE interviewTranscription (
+            id INTEGER NOT NULL DEFAULT nextval('interviewtranscription_id_seq'),
+            interview_id INTEGER REFERENCES interviewBoard(id),
+            start NUMERIC,
+            duration NUMERIC,
+            transcript TEXT,
+            confidence NUMERIC,
+            speaker INTEGER,
+            channel INTEGER,
+            added_to_notes BOOLEAN DEFAULT FALSE,
+            archived BOOLEAN NOT NULL DEFAULT FALSE
+        ) PARTITION BY LIST (archived);
+
+        -- A primary key of the parent would have to include the partition keys; the sequence
+        -- keeps ids unique across partitions and each leaf enforces it for its own rows
+        CREATE TABLE interviewTranscription_hot PARTITION OF interviewTranscription
+            (PRIMARY KEY (id)) FOR VALUES IN (FALSE);
+        CREATE TABLE interviewTranscription_archive PARTITION OF interviewTranscription
+            FOR VALUES IN (TRUE) PARTITION BY HASH (interview_id);
+    """)
+
+    for remainder in range(C.TRANSCRIPT_ARCHIVE_PARTITIONS):
+        # Archived rows are never updated again: pack pages full
+        cur.execute(sql.SQL("""
+            CREATE TABLE {partition} PARTITION OF interviewTranscription_archive
+                (PRIMARY KEY (id)) FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})
+                WITH (fillfactor = 100)
+        """).format(partition=sql.Identifier(f"interviewtranscription_archive_{remainder}"),
+                    modulus=sql.Literal(C.TRANSCRIPT_ARCHIVE_PARTITIONS),
+                    remainder=sql.Literal(remainder)))
+
+    # lz4 compresses long utterances better and faster than pglz, when the server is built with it
+    cur.execute("""
+        SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'
+    """)
+    lz4 = cur.fetchone()
+    if lz4 and lz4[0]:
+        cur.execute("ALTER TABLE interviewTranscription_archive ALTER COLUMN transcript SET COMPRESSION lz4")
+
+    cur.execute("""
+        INSERT INTO interviewTranscription
+            (id, interview_id, start, duration, transcript, confidence, speaker, channel, added_to_notes)
+        SELECT id, interview_id, start, duration, transcript, confidence, speaker, channel, added_to_notes
+        FROM interviewTranscription_unpartitioned;
+
+        DROP TABLE interviewTranscription_unpartitioned;
+        ALTER SEQUENCE interviewtranscription_id_seq OWNED BY interviewTranscription.id;
+
+        CREATE INDEX interviewtranscription_interview_id_idx ON interviewTranscription (interview_id, id);
+        CREATE INDEX interviewtranscription_interview_start_idx ON interviewTranscription (interview_id, start);
+    """)
+    logger.info("Table 'interviewTranscription' partitioned into hot and archive partitions.")
+
+
+@migration(8, "embedding cache")
+def create_embedding_cache(cur):
+    # Persisted tier of src/embedding_cache.py; the dimension is left open so models can change
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embeddingCache (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding vector NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (model, text_hash)
+        );
+    """)
+
+
+@migration(9, "completion cache")
+def create_completion_cache(cur):
+    # Postgres backend of src/completion_cache.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS completionCache (
+            fingerprint TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            expires_at TIMESTAMP NOT NULL
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS completioncache_expires_at_idx ON completionCache (expires_at);")
+
+
+@migration(10, "transcript summaries")
+def create_transcript_summary(cur):
+    # Rolling summary of an interview's transcript up to last_transcript_id, see src/context_builder.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS transcriptSummary (
+            interview_id INT PRIMARY KEY REFERENCES interviewBoard(id) ON DELETE CASCADE,
+            summary TEXT NOT NULL,
+            last_transcript_id BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """)
+
+
+@migration(11, "bot answer cache")
+def create_answer_cache(cur):
+    # Version of each RAG corpus (vector table), bumped whenever documents are vectorized into it
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ragCorpus (
+            name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """)
+    # Semantic cache of bot answers, see src/semantic_cache.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ragAnswerCache (
+            id BIGSERIAL PRIMARY KEY,
+            corpus TEXT NOT NULL,
+            corpus_version BIGINT NOT NULL,
+            -- Canonical JSON of the retrieval filters the answer was computed with, '' for the whole corpus
+            scope TEXT NOT NULL DEFAULT '',
+            query TEXT NOT NULL,
+            embedding vector(%(dim)s) NOT NULL,
+            answer TEXT NOT NULL,
+            sources JSONB NOT NULL DEFAULT '[]',
+            hits INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            last_hit_at TIMESTAMP
+        );
+    """, {"dim": C.EMBEDDING_DIMENSION})
+    # Lookups compute exact distances over one corpus version and scope (see semantic_cache.lookup)
+    cur.execute("CREATE INDEX IF NOT EXISTS raganswercache_scope_idx ON ragAnswerCache (corpus, corpus_version, scope);")
+    cur.execute("CREATE INDEX IF NOT EXISTS raganswercache_created_at_idx ON ragAnswerCache (created_at);")
+
+
+@migration(12, "company briefs")
+def create_company_briefs(cur):
+    # Generated company briefs, see src/company_briefs.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS companyBrief (
+            company_key TEXT PRIMARY KEY,
+            company_name TEXT NOT NULL,
+            brief TEXT NOT NULL,
+            prompt_hash TEXT NOT NULL,
+            corpus TEXT NOT NULL,
+            corpus_version BIGINT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            expires_at TIMESTAMP NOT NULL
+        );
+    """)
+
+
+@migration(13, "vector table search columns")
+def add_vector_table_search_columns(cur):
+    # Added by the RAG warm-up until now, outside the migration lock
+    prepare_vector_table(cur, os.environ["POSTGRES_VECTOR_TABLE"])
+
+
+## -------------------- Runner -------------------------------------
+
+def get_schema_version(cur):
+    '''
+    Returns:
+        int: Highest applied migration version, 0 for an empty database.
+    '''
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cur.fetchone()[0]
+
+
+def run_migrations():
+    '''
+    Apply every registered migration newer than the recorded schema version, in order.
+    Returns:
+        int: The schema version after the run.
+    '''
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+            """)
+            version = get_schema_version(cur)
+
+            for pending in MIGRATIONS:
+                if pending["version"] <= version:
+                    continue
+
+                logger.info(f"Applying migration {pending['version']}: {pending['name']}")
+                if pending["transactional"]:
+                    # Schema change and version bump commit together
+                    conn.autocommit = False
+                    try:
+                        with conn:
+                            pending["apply"](cur)
+                            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                        (pending["version"], pending["name"]))
+                    finally:
+                        conn.autocommit = True
+                else:
+                    pending["apply"](cur)
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                (pending["version"], pending["name"]))
+
+                version = pending["version"]
+                print(f"Applied migration {version}: {pending['name']}")
+
+            print(f"Database schema is at version {version}.")
+            return version
+
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+    except Exception as e:
+        logger.error(f"An error occurred in run_migrations: {e}", exc_info=True)
+        raise e
+
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.autocommit = False
+            conn.close()
+
+
+def ensure_vector_table(table_name):
+    '''
+    Make sure a vector table is prepared, including one named by POSTGRES_VECTOR_TABLE after
+    migration 13 ran. Nothing is locked when the table is ready already.
+    Args:
+        table_name (str): Vector table name as given to PGVectorStore.
+    '''
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+        """, (f"data_{table_name.lower()}",))
+        existing = {row[0] for row in cur.fetchall()}
+        if existing and set(vector_table_columns()) <= existing:
+            conn.rollback()
+            return
+
+        # Same lock as run_migrations, released at commit
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        prepare_vector_table(cur, table_name)
+        conn.commit()
+        logger.info(f"Vector table data_{table_name.lower()} prepared.")
+
+    except Exception as e:
+        logger.error(f"An error occurred in ensure_vector_table: {e}", exc_info=True)
+        if conn is not None:
+            conn.rollback()
+        raise e
+
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
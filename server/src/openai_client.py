@@ -0,0 +1,298 @@
+from openai import OpenAI, AsyncOpenAI
+import openai
+
+import asyncio
+import collections
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+from src import config as C
+from src import utils as U
+
+logger = U.get_logger()
+
+# Shared OpenAI clients behind a rate limiter. Every request first takes its share of two token
+# buckets, requests per minute and tokens per minute, so bursts from several interviews queue
+# here instead of coming back as 429s. Waiting requests are admitted by priority class, then in
+# arrival order. Rate limits, timeouts and 5xx errors that still happen are retried with
+# exponential backoff and full jitter (the SDK's own retries are disabled).
+
+# Priority classes, lower goes first
+INTERACTIVE = 0  # A user waits on the answer: bot queries, company lookups
+LIVE = 1         # Live interview features: keynotes, questions and their embeddings
+BACKGROUND = 2   # Meeting summaries and vectorization
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", LIVE: "live", BACKGROUND: "background"}
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                    openai.InternalServerError)
+
+client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0, timeout=C.OPENAI_TIMEOUT)
+async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0, timeout=C.OPENAI_TIMEOUT)
+
+
+class TokenBucket:
+    """
+    Holds up to capacity units, refilled continuously at capacity per minute.
+    Not thread-safe on its own; the RateLimiter lock guards it.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # Seconds until amount is available; a request larger than the bucket waits for a full one
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Admits requests when both buckets allow it, highest priority first.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.waits = collections.deque(maxlen=1000)
+        self.counters = {"admitted": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+
+    def _enqueue(self, priority):
+        entry = (priority, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiting, entry)
+        return entry
+
+    def _try_admit_locked(self, entry, tokens):
+        '''
+        Admit entry if it is at the head of the queue and the buckets allow it. The caller holds
+        self.condition.
+        Returns:
+            float: 0 when admitted, otherwise seconds to wait before trying again (None: until notified).
+        '''
+        if self.waiting[0] != entry:
+            return None
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        heapq.heappop(self.waiting)
+        self.counters["admitted"] += 1
+        # The next waiter may be admissible right away
+        self.condition.notify_all()
+        return 0
+
+    def _try_admit(self, entry, tokens):
+        with self.condition:
+            return self._try_admit_locked(entry, tokens)
+
+    def _record_wait(self, priority, started):
+        waited = time.monotonic() - started
+        with self.condition:
+            self.waits.append((priority, waited))
+        if waited > 1:
+            logger.info(f"OpenAI request ({PRIORITY_NAMES[priority]}) waited {waited:.2f}s for the rate limiter")
+
+    def acquire(self, priority, tokens):
+        '''
+        Block until a request of the given priority and estimated token count may be sent.
+        '''
+        started = time.monotonic()
+        entry = self._enqueue(priority)
+        # Checking and waiting under one hold of the lock, so a notify_all() from the waiter
+        # admitted before us cannot fall between the two and be missed
+        with self.condition:
+            while True:
+                wait = self._try_admit_locked(entry, tokens)
+                if wait == 0:
+                    break
+                self.condition.wait(wait)
+        self._record_wait(priority, started)
+
+    async def aacquire(self, priority, tokens):
+        '''
+        Async variant of acquire, polling instead of blocking the event loop.
+        '''
+        started = time.monotonic()
+        entry = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._try_admit(entry, tokens)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, C.OPENAI_LIMITER_POLL_INTERVAL) if wait else C.OPENAI_LIMITER_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            with self.condition:
+                if entry in self.waiting:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                    self.condition.notify_all()
+            raise
+        self._record_wait(priority, started)
+
+    def count(self, counter):
+        with self.condition:
+            self.counters[counter] += 1
+
+    def stats(self):
+        '''
+        Returns:
+            dict: Queue depth per priority, wait times of recent requests and retry counters.
+        '''
+        with self.condition:
+            waiting = [priority for priority, _ in self.waiting]
+            waits = list(self.waits)
+            result = dict(self.counters)
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            result["requests_available"] = round(self.requests.level, 1)
+            result["tokens_available"] = round(self.tokens.level)
+
+        result["queue_depth"] = {name: waiting.count(priority) for priority, name in PRIORITY_NAMES.items()}
+        result["wait_seconds"] = {}
+        for priority, name in PRIORITY_NAMES.items():
+            samples = sorted(waited for p, waited in waits if p == priority)
+            if samples:
+                result["wait_seconds"][name] = {
+                    "count": len(samples),
+                    "avg": round(sum(samples) / len(samples), 4),
+                    "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+                    "max": round(samples[-1], 4),
+                }
+        return result
+
+
+limiter = RateLimiter(C.OPENAI_REQUESTS_PER_MINUTE, C.OPENAI_TOKENS_PER_MINUTE)
+
+
+def estimate_chat_tokens(kwargs):
+    # Prompt tokens plus the completion budget, as OpenAI counts them against the limit
+    model = kwargs.get("model", C.OPENAI_MODEL)
+    prompt = sum(U.count_tokens(message.get("content") or "", model) for message in kwargs.get("messages", []))
+    return prompt + (kwargs.get("max_tokens") or C.OPENAI_COMPLETION_TOKENS_ESTIMATE)
+
+
+def estimate_embedding_tokens(kwargs):
+    inputs = kwargs.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    model = kwargs.get("model", C.EMBEDDING_MODEL)
+    return sum(U.count_tokens(text, model) for text in inputs)
+
+
+def backoff_delay(attempt, error=None):
+    '''
+    Returns:
+        float: Seconds to sleep before retry number attempt (0-based), honouring Retry-After.
+    '''
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), C.OPENAI_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(C.OPENAI_BACKOFF_MAX, C.OPENAI_BACKOFF_BASE * 2 ** attempt))
+
+
+def _should_retry(error, attempt):
+    if isinstance(error, openai.RateLimitError):
+        limiter.count("rate_limited")
+    if attempt >= C.OPENAI_MAX_RETRIES:
+        limiter.count("failures")
+        return False
+    limiter.count("retries")
+    logger.warning(f"OpenAI request failed ({type(error).__name__}), retry {attempt + 1}/{C.OPENAI_MAX_RETRIES}: {error}")
+    return True
+
+
+def call(create, tokens, priority=LIVE, **kwargs):
+    """
+    Send an OpenAI request through the rate limiter, retrying transient errors.
+    Args:
+        create (callable): SDK method, e.g. client.chat.completions.create.
+        tokens (int): Estimated tokens of the request.
+        priority (int): INTERACTIVE, LIVE or BACKGROUND.
+        kwargs: Arguments of the SDK method.
+    Returns:
+        The SDK response.
+    """
+    attempt = 0
+    while True:
+        limiter.acquire(priority, tokens)
+        try:
+            return create(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            if not _should_retry(e, attempt):
+                raise
+            time.sleep(backoff_delay(attempt, e))
+            attempt += 1
+
+
+async def acall(create, tokens, priority=LIVE, **kwargs):
+    '''
+    Async variant of call.
+    '''
+    attempt = 0
+    while True:
+        await limiter.aacquire(priority, tokens)
+        try:
+            return await create(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            if not _should_retry(e, attempt):
+                raise
+            await asyncio.sleep(backoff_delay(attempt, e))
+            attempt += 1
+
+
+def chat_completion(priority=LIVE, **kwargs):
+    '''
+    client.chat.completions.create through the rate limiter. With stream=True, only opening
+    the stream is retried.
+    '''
+    return call(client.chat.completions.create, estimate_chat_tokens(kwargs), priority, **kwargs)
+
+
+def embeddings(priority=LIVE, **kwargs):
+    return call(client.embeddings.create, estimate_embedding_tokens(kwargs), priority, **kwargs)
+
+
+async def achat_completion(priority=LIVE, **kwargs):
+    return await acall(async_client.chat.completions.create, estimate_chat_tokens(kwargs), priority, **kwargs)
+
+
+async def aembeddings(priority=LIVE, **kwargs):
+    return await acall(async_client.embeddings.create, estimate_embedding_tokens(kwargs), priority, **kwargs)
+
+
+def reserve(priority, tokens):
+    '''
+    Wait for the rate limiter before a request sent by another library (llama_index), so it is
+    counted against the same limits and ordered by priority.
+    '''
+    limiter.acquire(priority, tokens)
+
+
+def stats():
+    return limiter.stats()
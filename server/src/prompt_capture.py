@@ -0,0 +1,68 @@
+import json
+import queue
+import threading
+from datetime import datetime
+
+from src import config as C
+from src import utils as U
+
+logger = U.get_logger()
+
+# Optional capture of the prompts sent to the LLM and of its responses, for prompt debugging.
+# capture() only enqueues; a background thread appends the records to C.PROMPT_CAPTURE_PATH
+# as JSON lines. When the queue is full, records are dropped rather than slowing a request.
+
+_queue = queue.Queue(maxsize=C.PROMPT_CAPTURE_QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+_stats = {"captured": 0, "dropped": 0, "written": 0, "errors": 0}
+
+
+def _write_records():
+    while True:
+        record = _queue.get()
+        try:
+            with open(C.PROMPT_CAPTURE_PATH, "a") as file:
+                file.write(json.dumps(record) + "\n")
+            _stats["written"] += 1
+        except Exception as e:
+            _stats["errors"] += 1
+            logger.error(f"An error occurred while writing a prompt capture: {e}", exc_info=True)
+        finally:
+            _queue.task_done()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_records, name="prompt-capture", daemon=True)
+                _writer.start()
+
+
+def capture(kind, messages=None, response=None):
+    '''
+    Record a prompt and/or response without blocking. Does nothing unless PROMPT_CAPTURE is enabled.
+    Args:
+        kind (str): What was generated, e.g. 'keynotes' or 'questions'.
+        messages (list): Messages sent to the chat completions API.
+        response (str): Text returned by the model.
+    '''
+    if not C.PROMPT_CAPTURE_ENABLED:
+        return
+    _ensure_writer()
+    record = {"time": datetime.now().isoformat(), "kind": kind, "messages": messages, "response": response}
+    try:
+        _queue.put_nowait(record)
+        _stats["captured"] += 1
+    except queue.Full:
+        _stats["dropped"] += 1
+
+
+def stats():
+    '''
+    Returns:
+        dict: Capture counters and the current queue length.
+    '''
+    return dict(_stats, enabled=C.PROMPT_CAPTURE_ENABLED, queued=_queue.qsize())
@@ -0,0 +1,151 @@
+import copy
+import json
+import os
+import string
+import threading
+import time
+
+from src import config as C
+from src import utils as U
+
+logger = U.get_logger()
+
+# prompts.json and completion.json are parsed once and re-read only when their mtime changes,
+# so prompts can still be edited on a running server without re-reading them on every request.
+
+
+class CompiledTemplate:
+    """
+    A prompt template of prompts.json, split once into literal text and placeholders.
+    Rendering fills the placeholders without parsing the template again.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._parts = []
+        self.fields = set()
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                # Anything beyond a plain {name} is left to str.format
+                self._parts = None
+                break
+            self._parts.append((literal, field))
+            if field is not None:
+                self.fields.add(field)
+
+    def render(self, values):
+        '''
+        Same result as text.format(**values), raising KeyError for a missing placeholder.
+        '''
+        if self._parts is None:
+            return self.text.format(**values)
+        return "".join(literal + (str(values[field]) if field is not None else "")
+                       for literal, field in self._parts)
+
+
+class WatchedFile:
+    """
+    JSON file parsed on first use and re-parsed when its mtime changes. The mtime is checked
+    at most every C.PROMPT_RELOAD_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, path, compile_data=None):
+        self.path = path
+        self.compile_data = compile_data or (lambda data: data)
+        self.lock = threading.Lock()
+        self.data = None
+        self.mtime = None
+        self.checked_at = 0.0
+        self.listeners = []
+
+    def get(self):
+        now = time.monotonic()
+        if self.data is not None and now - self.checked_at < C.PROMPT_RELOAD_CHECK_INTERVAL:
+            return self.data
+
+        with self.lock:
+            if self.data is not None and now - self.checked_at < C.PROMPT_RELOAD_CHECK_INTERVAL:
+                return self.data
+            mtime = os.stat(self.path).st_mtime_ns
+            self.checked_at = now
+            if mtime != self.mtime:
+                reloaded = self.data is not None
+                with open(self.path, "r") as file:
+                    self.data = self.compile_data(json.load(file))
+                self.mtime = mtime
+                if reloaded:
+                    logger.info(f"Reloaded {self.path}")
+                    for listener in self.listeners:
+                        listener()
+            return self.data
+
+
+def _compile_prompts(data):
+    return {key: CompiledTemplate(text) for key, text in data.items()}
+
+
+prompts_file = WatchedFile(C.PROMPTS_JSON_PATH, _compile_prompts)
+completions_file = WatchedFile(C.COMPLETION_JSON_PATH)
+
+
+def on_prompts_reload(callback):
+    '''
+    Register a function called after prompts.json is reloaded, e.g. to drop rendered prompts.
+    '''
+    prompts_file.listeners.append(callback)
+
+
+def check_for_updates():
+    '''
+    Reload prompts.json if it changed, so on_prompts_reload callbacks run before a cached
+    rendering of it is used.
+    '''
+    prompts_file.get()
+
+
+def get_template(key):
+    '''
+    Returns:
+        CompiledTemplate: The template of prompts.json stored under key (KeyError when missing).
+    '''
+    return prompts_file.get()[key]
+
+
+def get_raw_prompt(key):
+    '''
+    Returns:
+        str: The prompt of prompts.json stored under key, without placeholder substitution.
+    '''
+    return get_template(key).text
+
+
+def render(prompt_keys, values):
+    """
+    Render the prompts of prompts.json stored under prompt_keys and join them.
+    Args:
+        prompt_keys (list): Keys of the prompts to render; unknown keys are skipped.
+        values (dict): Values of the placeholders.
+    Returns:
+        str: The rendered prompts separated by blank lines.
+    """
+    templates = prompts_file.get()
+    return "\n\n".join(templates[key].render(values) for key in prompt_keys if key in templates).strip()
+
+
+def build_messages(completion_key, system_prompt, user_prompt):
+    """
+    Fill the system and user messages of a completion template of completion.json.
+    Args:
+        completion_key (str): Key of the message list in completion.json.
+        system_prompt (str): Content of the system message.
+        user_prompt (str): Content of the user message.
+    Returns:
+        list: Messages ready for the chat completions API.
+    """
+    messages = copy.deepcopy(completions_file.get()[completion_key])
+    for message in messages:
+        if message['role'] == 'system':
+            message['content'] = system_prompt
+        elif message['role'] == 'user':
+            message['content'] = user_prompt
+    return messages
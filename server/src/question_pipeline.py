@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src import config as C
+from src import utils as U
+from src import db_utils as DU
+from src import db_pool
+from src import context_builder
+from src import get_from_llm as llm
+
+logger = U.get_logger()
+
+# Question generation as a pipeline rather than a sequence of steps. The inputs of a request
+# (interview details, transcript context, stored questions) are loaded once and shared by
+# both LLM calls: checking which stored questions the transcript now answers runs on the
+# executor while the new questions are generated, embedded and deduplicated.
+#
+#   details -> transcript context --+--> generate questions -> embed + dedupe + insert --+--> all questions
+#   stored questions ---------------+--> detect answers -> update answered questions ----+
+#
+# Freshly generated questions are not checked for answers in the same request: they come from
+# the same transcript as things still to ask, and are checked on the next call.
+# When no question was inserted and no answer changed, the questions read at the start are
+# returned instead of reading them again.
+
+executor = ThreadPoolExecutor(max_workers=C.QUESTION_PIPELINE_WORKERS, thread_name_prefix="question-pipeline")
+
+
+class QuestionRun:
+    """
+    Shared inputs of one question generation request and the answer detection running for it.
+    """
+
+    def __init__(self, interview_id, interview_details, transcript, messages, answers, questions):
+        self.interview_id = interview_id
+        self.interview_details = interview_details
+        self.transcript = transcript
+        self.messages = messages
+        self.answers = answers
+        self.questions = questions
+
+
+def unanswered_of(questions):
+    '''
+    Returns:
+        list: The unanswered questions, as sent for answer detection.
+    '''
+    return [{"id": q["id"], "question": q["question"], "answered": q["answered"]}
+            for q in questions if q["answered"] is False]
+
+
+def detect_answers(interview_id, interview_details, transcript, unanswered_questions):
+    """
+    Ask the LLM which of the unanswered questions the transcript answers and store the verdicts.
+    Returns:
+        int: Number of questions updated.
+    """
+    # Nothing to check, so skip the LLM round trip
+    if not unanswered_questions:
+        return 0
+
+    conn = None
+    try:
+        answered_questions = llm.get_question_answer(unanswered_questions, interview_id, transcript, interview_details)
+        conn = db_pool.get_db_connection()
+        return DU.update_answered_questions(answered_questions, conn)
+    except Exception as e:
+        logger.error(f"An error occurred while detecting answered questions: {e}", exc_info=True)
+        return 0
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def start(interview_id):
+    """
+    Load the inputs of a question generation request and start detecting answered questions.
+    Args:
+        interview_id (int): The ID of the interview.
+    Returns:
+        QuestionRun: The loaded inputs, the messages asking for new questions and the pending
+        answer detection.
+    """
+    questions = executor.submit(DU.get_all_questions, interview_id)
+    interview_details = DU.get_interview_details(interview_id)
+    transcript = context_builder.build_transcript_context(interview_id, interview_details)
+
+    questions = questions.result()
+    answers = executor.submit(detect_answers, interview_id, interview_details, transcript, unanswered_of(questions))
+    messages = llm.build_questions_messages(interview_id, interview_details, transcript)
+    return QuestionRun(interview_id, interview_details, transcript, messages, answers, questions)
+
+
+def finish(run, questions_json):
+    """
+    Store the unique new questions, wait for the answer detection and return every question.
+    Args:
+        run (QuestionRun): Returned by start().
+        questions_json (dict): Generated questions, keyed by their position.
+    Returns:
+        list: All questions of the interview.
+    """
+    conn = None
+    inserted = None
+    try:
+        conn = db_pool.get_db_connection()
+        logger.info("Writing unique questions")
+        inserted = DU.write_unique_questions(run.interview_id, questions_json, conn)
+    except Exception as e:
+        logger.error(f"An error occurred while writing questions: {e}", exc_info=True)
+        if conn is not None:
+            conn.rollback()
+    finally:
+        if conn is not None:
+            conn.close()
+
+    updated = run.answers.result()
+    logger.info(f"Questions stored, {inserted} inserted, {updated} newly answered")
+    # The list read by start() is still current when nothing was inserted or answered
+    if inserted == 0 and not updated:
+        return run.questions
+    return DU.get_all_questions(run.interview_id)
@@ -1,26 +1,371 @@
+import operator
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 
+from sqlalchemy import and_, create_engine, func, literal_column, or_, select, text, Text
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.orm import sessionmaker
 from llama_index.vector_stores import PGVectorStore
 from llama_index.indices.vector_store import VectorStoreIndex
+from llama_index.schema import QueryBundle
+from llama_index.query_engine import RetrieverQueryEngine
+from llama_index.response_synthesizers import get_response_synthesizer
+from llama_index.vector_stores.types import FilterCondition, FilterOperator, MetadataFilter, MetadataFilters
 
+from src import config as C
+from src import utils as U
+from src import openai_client
+from src import migrations
 
-def query_response(query):
+logger = U.get_logger()
 
-    ## Step - 1: Setup the vector store and storage context
-    encoded_password = quote_plus(os.environ["POSTGRES_PASSWORD"])
-    vector_store = PGVectorStore.from_params(
-        database=os.environ["POSTGRES_DB"],
-        host=os.environ["POSTGRES_HOST"],
-        password=encoded_password,
-        port=os.environ["POSTGRES_PORT"],
-        user=os.environ["POSTGRES_USER"],
-        table_name=os.environ["POSTGRES_VECTOR_TABLE"],
-        embed_dim=1536,  # openai embedding dimension
-    )
+# The vector store, index and query engines are built once per process and shared by every
+# request. Building them opens a SQLAlchemy engine and sets up the OpenAI LLM and embedding
+# objects, which is too slow to repeat per query. They are rebuilt only when the settings they
+# were built from change, e.g. after the environment is reloaded with another vector table.
+#
+# Retrieval is hybrid by default: the nodes closest to the query embedding and the nodes whose
+# text best matches the query words (Postgres full-text search on a GIN-indexed tsvector column)
+# are fused by reciprocal rank. Exact names, part numbers and acronyms that embeddings blur are
+# found by the full-text side, so a small RAG_TOP_K is enough.
 
-    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-    query_engine = index.as_query_engine()
-    response = query_engine.query(f"{query}")
+EMBED_DIM = 1536  # openai embedding dimension
+
+# Metadata attached at ingestion (see vectorization/) and copied into indexed columns of the
+# vector table by migrations.prepare_vector_table, so filters are applied by Postgres before ranking:
+# filter key -> (column, type, expression over the metadata_ JSON)
+FILTER_COLUMNS = migrations.VECTOR_FILTER_COLUMNS
+
+FILTER_OPERATORS = {
+    FilterOperator.EQ: operator.eq,
+    FilterOperator.NE: operator.ne,
+    FilterOperator.GT: operator.gt,
+    FilterOperator.GTE: operator.ge,
+    FilterOperator.LT: operator.lt,
+    FilterOperator.LTE: operator.le,
+}
+
+
+class PooledPGVectorStore(PGVectorStore):
+    """
+    PGVectorStore whose synchronous engine keeps a bounded pool of validated connections, and
+    whose hybrid queries fuse the vector and full-text rankings by reciprocal rank.
+    """
+
+    def _connect(self):
+        super()._connect()
+        # Replace the default engine before it has opened any connection
+        self._engine = create_engine(
+            self.connection_string,
+            pool_size=C.RAG_DB_POOL_SIZE,
+            max_overflow=C.RAG_DB_POOL_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=C.POSTGRES_POOL_MAX_LIFETIME,
+            connect_args={"connect_timeout": C.POSTGRES_CONNECT_TIMEOUT},
+        )
+        self._session = sessionmaker(self._engine)
+
+    def _initialize(self):
+        if self._is_initialized:
+            return
+        # The table and its filter and full-text columns come from migrations.prepare_vector_table,
+        # under the migration lock; llama_index then finds the table in place
+        migrations.ensure_vector_table(self.table_name)
+        super()._initialize()
+
+    def _apply_filters_and_limit(self, stmt, limit, metadata_filters=None):
+        # Unlike llama_index, compare the indexed filter columns and bind the values as parameters
+        if metadata_filters:
+            combine = or_ if metadata_filters.condition == FilterCondition.OR else and_
+            stmt = stmt.where(combine(*(self._filter_condition(filter_) for filter_ in metadata_filters.filters)))
+        return stmt.limit(limit)
+
+    def _filter_condition(self, filter_):
+        compare = FILTER_OPERATORS.get(filter_.operator)
+        if compare is None:
+            raise ValueError(f"Unsupported filter operator: {filter_.operator}")
+        if filter_.key in FILTER_COLUMNS:
+            column, _, expression = FILTER_COLUMNS[filter_.key]
+            value = filter_.value
+            if isinstance(value, str) and expression.startswith("lower("):
+                value = value.lower()
+            return compare(literal_column(column), value)
+        return compare(self._table_class.metadata_[filter_.key].astext, str(filter_.value))
+
+    def _build_sparse_query(self, query_str, limit, metadata_filters=None):
+        # llama_index ANDs every word of the query, so a question rarely matches anything as a
+        # whole; OR the words instead and let ts_rank favour nodes matching more of them
+        if query_str is None:
+            raise ValueError("query_str must be specified for a sparse vector query.")
+        ts_query = func.replace(
+            func.plainto_tsquery(literal_column(f"'{self.text_search_config}'::regconfig"), query_str).cast(Text),
+            "&", "|",
+        ).cast(TSQUERY)
+        stmt = (
+            select(
+                self._table_class.id,
+                self._table_class.node_id,
+                self._table_class.text,
+                self._table_class.metadata_,
+                func.ts_rank(self._table_class.text_search_tsv, ts_query).label("rank"),
+            )
+            .where(self._table_class.text_search_tsv.op("@@")(ts_query))
+            .order_by(text("rank desc"))
+        )
+        return self._apply_filters_and_limit(stmt, limit, metadata_filters)
+
+    def _hybrid_query(self, query, **kwargs):
+        depth = max(query.sparse_top_k or 0, query.similarity_top_k)
+        dense = self._query_with_score(query.query_embedding, depth, query.filters, **kwargs)
+        sparse = self._sparse_query_with_rank(query.query_str, depth, query.filters)
+        return fuse_rankings([dense, sparse], query.similarity_top_k)
+
+    async def _async_hybrid_query(self, query, **kwargs):
+        depth = max(query.sparse_top_k or 0, query.similarity_top_k)
+        dense = await self._aquery_with_score(query.query_embedding, depth, query.filters, **kwargs)
+        sparse = await self._async_sparse_query_with_rank(query.query_str, depth, query.filters)
+        return fuse_rankings([dense, sparse], query.similarity_top_k)
+
+
+def fuse_rankings(rankings, top_k, k=C.RAG_RRF_K):
+    '''
+    Reciprocal rank fusion: each row scores sum(1 / (k + rank)) over the rankings it appears in,
+    so rows found by both searches come first without comparing cosine and ts_rank scores.
+    Args:
+        rankings (list): Lists of DBEmbeddingRow, best first.
+        top_k (int): Number of rows to keep.
+        k (int): Damping constant; larger values flatten the difference between ranks.
+    Returns:
+        list: The top_k rows, best first, with the fused score as similarity.
+    '''
+    scores = {}
+    rows = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row.node_id] = scores.get(row.node_id, 0.0) + 1.0 / (k + rank)
+            rows.setdefault(row.node_id, row)
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [rows[node_id]._replace(similarity=scores[node_id]) for node_id in best]
+
+
+class RetrievalService:
+    """
+    Vector store, index and query engines built from one set of settings.
+    Query engines hold no per-query state, so one instance serves concurrent requests.
+    """
+
+    def __init__(self, settings):
+        started = time.monotonic()
+        self.settings = settings
+        self.vector_store = PooledPGVectorStore.from_params(
+            database=settings["database"],
+            host=settings["host"],
+            password=quote_plus(settings["password"]),
+            port=settings["port"],
+            user=settings["user"],
+            table_name=settings["table_name"],
+            embed_dim=settings["embed_dim"],
+            hybrid_search=settings["hybrid_search"],
+        )
+        # Connect and create the table now rather than racing on the first queries
+        self.vector_store._initialize()
+        self.index = VectorStoreIndex.from_vector_store(vector_store=self.vector_store)
+        self.retrieval = {"similarity_top_k": C.RAG_TOP_K}
+        if settings["hybrid_search"]:
+            self.retrieval.update(vector_store_query_mode="hybrid", sparse_top_k=C.RAG_HYBRID_CANDIDATES)
+        self.synthesizer = get_response_synthesizer(service_context=self.index.service_context)
+        self.streaming_synthesizer = get_response_synthesizer(service_context=self.index.service_context,
+                                                              streaming=True)
+        self.query_engine = self.build_query_engine()
+        self.streaming_query_engine = self.build_query_engine(streaming=True)
+        self.built_at = time.time()
+        self.build_seconds = time.monotonic() - started
+
+    def build_query_engine(self, filters=None, streaming=False):
+        '''
+        Returns:
+            RetrieverQueryEngine: Retrieving with the given MetadataFilters and sharing the
+            service's response synthesizer.
+        '''
+        retriever = self.index.as_retriever(filters=filters, **self.retrieval)
+        return RetrieverQueryEngine(retriever, self.streaming_synthesizer if streaming else self.synthesizer)
+
+    def get_query_engine(self, filters=None, streaming=False):
+        # Unfiltered queries use the shared engines; a retriever is cheap to build per filter
+        if filters is None:
+            return self.streaming_query_engine if streaming else self.query_engine
+        return self.build_query_engine(filters, streaming)
+
+    def close(self):
+        self.vector_store._engine.dispose()
+
+    def stats(self):
+        return {
+            "table_name": self.settings["table_name"],
+            "hybrid_search": self.settings["hybrid_search"],
+            "built_at": self.built_at,
+            "build_seconds": round(self.build_seconds, 3),
+            "db_pool": self.vector_store._engine.pool.status(),
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+_builds = 0
+
+
+def current_settings():
+    '''
+    Returns:
+        dict: The settings the retrieval service is built from, read from the environment.
+    '''
+    return {
+        "database": os.environ["POSTGRES_DB"],
+        "host": os.environ["POSTGRES_HOST"],
+        "password": os.environ["POSTGRES_PASSWORD"],
+        "port": os.environ["POSTGRES_PORT"],
+        "user": os.environ["POSTGRES_USER"],
+        "table_name": os.environ["POSTGRES_VECTOR_TABLE"],
+        "embed_dim": EMBED_DIM,
+        "hybrid_search": C.RAG_HYBRID_SEARCH,
+    }
+
+
+def get_service():
+    '''
+    Return the process-wide retrieval service, building it on first use or when the settings
+    changed since it was built.
+    Returns:
+        RetrievalService: The shared service.
+    '''
+    global _service, _builds
+    settings = current_settings()
+    service = _service
+    if service is not None and service.settings == settings:
+        return service
+
+    with _service_lock:
+        if _service is None or _service.settings != settings:
+            previous = _service
+            _service = RetrievalService(settings)
+            _builds += 1
+            logger.info(f"RAG index built for table {settings['table_name']} in {_service.build_seconds:.2f}s")
+            if previous is not None:
+                # Queries still running on the old engine finish; its idle connections are closed
+                previous.close()
+        return _service
+
+
+def warm_up():
+    '''
+    Build the retrieval service ahead of the first query. Errors are logged, not raised, so a
+    database that is not reachable yet does not stop the server; the first query retries.
+    '''
+    try:
+        get_service()
+    except Exception as e:
+        logger.error(f"An error occurred while warming up the RAG index: {e}", exc_info=True)
+
+
+def stats():
+    '''
+    Returns:
+        dict: Number of builds and, once built, the table, build time and pool status.
+    '''
+    service = _service
+    result = {"builds": _builds}
+    if service is not None:
+        result.update(service.stats())
+    return result
+
+
+def get_index():
+    return get_service().index
+
+
+def reserve_query(query, priority=openai_client.INTERACTIVE):
+    # llama_index sends the LLM request itself; queue it in the shared rate limiter
+    openai_client.reserve(priority, U.count_tokens(query) + C.RAG_PROMPT_TOKENS_ESTIMATE)
+
+
+def build_filters(filters):
+    """
+    Turn the filters of a bot request into metadata filters applied in SQL.
+    Args:
+        filters (dict): Any of interview_id, company, file_path, file_type (equality) and
+            date_from, date_to (inclusive ISO dates). Empty or None means the whole corpus.
+    Returns:
+        MetadataFilters: The filters, or None when there are none.
+    Raises:
+        ValueError: For an unknown filter or a value of the wrong type.
+    """
+    if not filters:
+        return None
+    conditions = []
+    for key, value in filters.items():
+        if value is None or value == "":
+            continue
+        if key == "date_from":
+            conditions.append(MetadataFilter(key="date", value=str(value), operator=FilterOperator.GTE))
+        elif key == "date_to":
+            conditions.append(MetadataFilter(key="date", value=str(value), operator=FilterOperator.LTE))
+        elif key == "interview_id":
+            try:
+                conditions.append(MetadataFilter(key=key, value=int(value)))
+            except (TypeError, ValueError):
+                raise ValueError(f"interview_id must be an integer, got {value!r}")
+        elif key in FILTER_COLUMNS:
+            conditions.append(MetadataFilter(key=key, value=str(value)))
+        else:
+            raise ValueError(f"Unknown filter '{key}'")
+    return MetadataFilters(filters=conditions) if conditions else None
+
+
+def query_bundle(query, embedding=None):
+    # A precomputed query embedding saves llama_index from requesting it again
+    return QueryBundle(query_str=f"{query}", embedding=embedding)
+
+
+def query_response(query, embedding=None, priority=openai_client.INTERACTIVE, filters=None):
+    """
+    Answer a query from the vector store.
+    Args:
+        query (str): The question.
+        embedding (list): Precomputed embedding of the question, if any.
+        priority (int): Rate limiter priority class of the LLM request.
+        filters (dict): Restrict retrieval to a slice of the corpus, see build_filters().
+    Returns:
+        Response: The answer; source_nodes holds the retrieved nodes.
+    """
+    query_engine = get_service().get_query_engine(build_filters(filters))
+    reserve_query(query, priority)
+    response = query_engine.query(query_bundle(query, embedding))
     return response
+
+
+def stream_query(query, embedding=None, filters=None):
+    """
+    Streaming variant of query_response.
+    Returns:
+        StreamingResponse: Its response_gen yields pieces of the answer as the LLM generates
+        them; source_nodes holds the retrieved nodes.
+    """
+    query_engine = get_service().get_query_engine(build_filters(filters), streaming=True)
+    reserve_query(query)
+    return query_engine.query(query_bundle(query, embedding))
+
+
+def stream_query_response(query, embedding=None, filters=None):
+    yield from stream_query(query, embedding, filters).response_gen
+
+
+def source_nodes(response):
+    '''
+    Returns:
+        list: The retrieved nodes of a query response as JSON-serialisable dicts.
+    '''
+    return [{"node_id": source.node.node_id, "score": source.score, "text": source.node.get_content(),
+             "metadata": source.node.metadata} for source in response.source_nodes]
@@ -0,0 +1,243 @@
+import json
+import threading
+
+from src import config as C
+from src import utils as U
+from src import db_pool
+from src import corpus as rag_corpus
+from src import completion_cache
+from src import openai_client
+from src import get_from_llm as llm
+from src import rag
+
+logger = U.get_logger()
+
+# Semantic cache in front of the bot's RAG queries. The incoming query is embedded and compared
+# with the queries answered before; when one is within SEMANTIC_CACHE_THRESHOLD cosine
+# similarity, its stored answer and source nodes are returned without retrieval or synthesis.
+# The same embedding is handed to the query engine on a miss, so it is requested only once.
+#
+# Entries belong to a corpus (the vector table) at a version, and to the retrieval filters of
+# the query: an answer computed from one interview is not served for the whole corpus.
+# Vectorizing documents or an interview into the table bumps its version (see corpus.py), which
+# retires every earlier answer.
+# Entries also expire after BOT_RESPONSE_CACHE_TTL and at most SEMANTIC_CACHE_MAX_SIZE are kept
+# per corpus, the least recently used go first.
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+_writes_since_prune = 0
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def scope_of(filters):
+    # Canonical form of the filters, so equal filters share cached answers
+    filters = {key: value for key, value in (filters or {}).items() if value is not None and value != ""}
+    return json.dumps(filters, sort_keys=True, separators=(",", ":"), default=str) if filters else ""
+
+
+def lookup(embedding, corpus, ttl, scope="", threshold=C.SEMANTIC_CACHE_THRESHOLD):
+    '''
+    Find the closest cached query of the current corpus version and the same filters.
+    A database error is logged and treated as a miss, the cache never fails a request.
+    Returns:
+        tuple: (entry, version). entry is a dict with the answer, sources, matched query and
+        similarity, or None on a miss; version is the corpus version the lookup saw.
+    '''
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        version = rag_corpus.get_corpus_version(cur, corpus)
+        # Exact distance over the live entries of this corpus version and scope (at most
+        # SEMANTIC_CACHE_MAX_SIZE rows). An HNSW scan would apply these filters after the
+        # approximate search and miss close entries once other scopes fill its candidate list.
+        cur.execute("""
+            WITH candidates AS MATERIALIZED (
+                SELECT id, query, answer, sources, embedding <=> %s::vector AS distance
+                FROM ragAnswerCache
+                WHERE corpus = %s AND corpus_version = %s AND scope = %s
+                  AND created_at > NOW() - make_interval(secs => %s)
+            )
+            SELECT id, query, answer, sources, 1 - distance AS similarity
+            FROM candidates
+            ORDER BY distance
+            LIMIT 1
+        """, (embedding, corpus, version, scope, ttl))
+        row = cur.fetchone()
+        if row is None or row[4] < threshold:
+            return None, version
+
+        cur.execute("UPDATE ragAnswerCache SET hits = hits + 1, last_hit_at = NOW() WHERE id = %s", (row[0],))
+        conn.commit()
+        return {"query": row[1], "answer": row[2], "sources": row[3], "similarity": float(row[4])}, version
+    except Exception as e:
+        _count("errors")
+        logger.error(f"An error occurred in semantic_cache.lookup: {e}", exc_info=True)
+        return None, None
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def store(query, embedding, answer, sources, corpus, version, scope=""):
+    '''
+    Cache an answer under the corpus version seen before it was computed, so an answer that
+    raced with a re-vectorization is never served for the new version.
+    '''
+    global _writes_since_prune
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO ragAnswerCache (corpus, corpus_version, scope, query, embedding, answer, sources)
+            VALUES (%s, %s, %s, %s, %s::vector, %s, %s::jsonb)
+        """, (corpus, version, scope, query, embedding, answer, json.dumps(sources)))
+
+        with _stats_lock:
+            _writes_since_prune += 1
+            prune = _writes_since_prune >= C.SEMANTIC_CACHE_PRUNE_EVERY
+            if prune:
+                _writes_since_prune = 0
+        if prune:
+            _prune(cur, corpus)
+        conn.commit()
+    except Exception as e:
+        _count("errors")
+        logger.error(f"An error occurred in semantic_cache.store: {e}", exc_info=True)
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def _prune(cur, corpus):
+    # Drop expired entries, then the least recently used ones beyond the size bound
+    cur.execute("DELETE FROM ragAnswerCache WHERE created_at <= NOW() - make_interval(secs => %s)",
+                (C.BOT_RESPONSE_CACHE_TTL,))
+    cur.execute("""
+        DELETE FROM ragAnswerCache WHERE id IN (
+            SELECT id FROM ragAnswerCache WHERE corpus = %s
+            ORDER BY COALESCE(last_hit_at, created_at) DESC OFFSET %s
+        )
+    """, (corpus, C.SEMANTIC_CACHE_MAX_SIZE))
+
+
+def invalidate_all():
+    '''
+    Returns:
+        int: Number of cached answers deleted.
+    '''
+    conn = None
+    cur = None
+    try:
+        conn = db_pool.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM ragAnswerCache")
+        deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def stats():
+    '''
+    Returns:
+        dict: Hit/miss counters and hit rate.
+    '''
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    return result
+
+
+def _begin(query, ttl, scope):
+    '''
+    Embed the query and look it up.
+    Returns:
+        tuple: (embedding, corpus, version, entry); entry is None on a miss.
+    '''
+    embedding = llm.get_embeddings([query], priority=openai_client.INTERACTIVE)[0]
+    corpus = rag_corpus.current_corpus()
+    entry, version = lookup(embedding, corpus, ttl, scope)
+    if entry is not None:
+        _count("hits")
+        logger.info(f"Semantic cache hit ({entry['similarity']:.3f}) for '{query}' on '{entry['query']}'")
+    else:
+        _count("misses")
+    return embedding, corpus, version, entry
+
+
+def answer(query, ttl=C.BOT_RESPONSE_CACHE_TTL, filters=None):
+    """
+    Answer a bot query from the semantic cache or, on a miss, from the RAG query engine.
+    Args:
+        query (str): The user's question.
+        ttl (float): Seconds answers are reused for; 0 bypasses the cache.
+        filters (dict): Retrieval filters, see rag.build_filters().
+    Returns:
+        dict: 'answer', 'sources' (retrieved nodes) and 'cache' ('hit', 'miss' or None when bypassed).
+    """
+    rag.build_filters(filters)  # Reject invalid filters before embedding the query
+    if not ttl:
+        response = rag.query_response(query, filters=filters)
+        return {"answer": str(response), "sources": rag.source_nodes(response), "cache": None}
+
+    scope = scope_of(filters)
+    embedding, corpus, version, entry = _begin(query, ttl, scope)
+    if entry is not None:
+        return {"answer": entry["answer"], "sources": entry["sources"], "cache": completion_cache.HIT}
+
+    response = rag.query_response(query, embedding, filters=filters)
+    result = {"answer": str(response), "sources": rag.source_nodes(response), "cache": completion_cache.MISS}
+    if result["answer"] and version is not None:
+        store(query, embedding, result["answer"], result["sources"], corpus, version, scope)
+    return result
+
+
+def stream_answer(query, ttl=C.BOT_RESPONSE_CACHE_TTL, filters=None):
+    """
+    Streaming variant of answer: a cached answer is yielded whole, otherwise the streamed
+    answer is cached once complete.
+    Yields:
+        tuple: ('token', str) pieces of the answer, then ('sources', list) of retrieved nodes.
+    """
+    rag.build_filters(filters)
+    if not ttl:
+        response = rag.stream_query(query, filters=filters)
+        for token in response.response_gen:
+            yield "token", token
+        yield "sources", rag.source_nodes(response)
+        return
+
+    scope = scope_of(filters)
+    embedding, corpus, version, entry = _begin(query, ttl, scope)
+    if entry is not None:
+        yield "token", entry["answer"]
+        yield "sources", entry["sources"]
+        return
+
+    response = rag.stream_query(query, embedding, filters)
+    parts = []
+    for token in response.response_gen:
+        parts.append(token)
+        yield "token", token
+    sources = rag.source_nodes(response)
+    yield "sources", sources
+    if parts and version is not None:
+        store(query, embedding, "".join(parts), sources, corpus, version, scope)
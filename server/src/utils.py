@@ -1,4 +1,5 @@
 import json
+import tiktoken
 from src import config as C
 
 import os
@@ -41,29 +42,31 @@ def load_json_file(file_path):
         logger.error(f"An error occurred while loading JSON file: {e}", exc_info=True)
         return None
 
-def generate_prompt(prompt_keys, interview_details):
+
+_token_encodings = {}
+
+def count_tokens(text, model=C.OPENAI_MODEL):
     """
-    Generate a prompt by combining text values from prompts.json and replacing placeholders with values from interview_details.
+    Count the tokens of a text for a model with tiktoken.
+    Falls back to an estimate of four characters per token when the encoding cannot be loaded
+    (tiktoken downloads it on first use).
     Args:
-        prompt_keys (list): List of keys to retrieve prompts for.
-        interview_details (dict): Dictionary containing interview details for placeholder replacement.
+        text (str): Text to measure.
+        model (str): Model whose tokenizer is used.
     Returns:
-        str: Concatenated and formatted prompt.
+        int: Number of tokens.
     """
-    # Load prompts data from JSON file
-    prompts_data = load_json_file(C.PROMPTS_JSON_PATH)
-
-    if not prompts_data:
-        return "Error: Unable to load prompts data."
-
-    combined_prompt = ""
-    for key in prompt_keys:
-        if key in prompts_data:
-            # Format the prompt by replacing placeholders with interview details
-            prompt = prompts_data[key].format(**interview_details)
-            combined_prompt += prompt + "\n\n"
-
-    return combined_prompt.strip()
-
-
+    if model not in _token_encodings:
+        try:
+            try:
+                _token_encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _token_encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.error(f"Could not load the tokenizer of {model}, estimating token counts: {e}")
+            _token_encodings[model] = None
 
+    encoding = _token_encodings[model]
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,8 +1,13 @@
 import requests
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import datetime
 
+# The modules shared with the server (db_pool, corpus) live in server/src; with server/ on the
+# path they are found through the src namespace package, after the ones in vectorization/src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from src import auth
 from src import graph
 from src import utils as U
@@ -0,0 +1,12 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv() # Load the environment variables from the .env file
+
+# Postgres connection pool
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv('POSTGRES_CONNECT_TIMEOUT', 5))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv('POSTGRES_POOL_MAX_SIZE', 4))
+POSTGRES_POOL_CHECKOUT_TIMEOUT = float(os.getenv('POSTGRES_POOL_CHECKOUT_TIMEOUT', 10))
+POSTGRES_POOL_MAX_IDLE = float(os.getenv('POSTGRES_POOL_MAX_IDLE', 300))
+POSTGRES_POOL_MAX_LIFETIME = float(os.getenv('POSTGRES_POOL_MAX_LIFETIME', 3600))
+POSTGRES_POOL_VALIDATE_AFTER = float(os.getenv('POSTGRES_POOL_VALIDATE_AFTER', 30))
@@ -3,22 +3,18 @@ import psycopg2
 from psycopg2 import sql
 from dotenv import load_dotenv
 
+from src import db_pool
+
 load_dotenv() # Load the environment variables from the .env file
 
 def get_db_connection():
     '''
-    This function is used to connect to the PostGresDB
+    This function is used to get a connection to the PostGresDB from the shared pool.
+    Closing the connection returns it to the pool.
     Returns:
         connection: Returns the connection object
     '''
-    conn = psycopg2.connect(
-        host=os.getenv('POSTGRES_HOST'),
-        database=os.getenv('POSTGRES_DB'),
-        user=os.getenv('POSTGRES_USER'),
-        password=os.getenv('POSTGRES_PASSWORD'),
-        port=os.getenv('POSTGRES_PORT')
-    )
-    return conn
+    return db_pool.get_db_connection()
 
 
 def insert_file_download_details(file_type, file_name, parent_name, created_time, downloaded_time, last_modified, file_hash):
@@ -121,4 +117,4 @@ def create_file_download_details_table():
             conn.close()
 
 
-create_file_download_details_table()
\ No newline at end of file
+create_file_download_details_table()
@@ -1,9 +1,22 @@
 import base64
+import logging
 import requests
 import hashlib
 import os
 
 
+def get_logger():
+    # The server's application logger, for the modules of server/src the scripts share
+    # (db_pool, corpus); the scripts report to the console
+    app_logger = logging.getLogger('farpointoi')
+    if not app_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+        app_logger.addHandler(handler)
+        app_logger.setLevel(logging.INFO)
+    return app_logger
+
+
 ## File Handling
 
 def encode_sharing_url(sharing_url):
@@ -5,20 +5,49 @@ from urllib.parse import quote_plus
 import openai
 from dotenv import load_dotenv
 import os
+import sys
+from datetime import datetime
+
+# The modules shared with the server (db_pool, corpus) live in server/src; with server/ on the
+# path they are found through the src namespace package, after the ones in vectorization/src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src import utils as U
+from src import corpus as rag_corpus
 
 load_dotenv()
 openai.api_key = os.environ["OPENAI_API_KEY"]
 
 
+FILTER_METADATA_KEYS = ["company", "file_path", "file_type", "date"]
+
+
+def file_metadata(file_path, root="./files"):
+    """
+    Metadata of a downloaded file, copied into the filter columns of the vector table.
+    The first folder under root is taken as the company the file belongs to.
+    """
+    relative = os.path.relpath(file_path, root)
+    parts = relative.split(os.sep)
+    return {
+        "company": parts[0] if len(parts) > 1 else "",
+        "file_path": relative,
+        "file_name": os.path.basename(file_path),
+        "file_type": os.path.splitext(file_path)[1].lstrip(".").lower(),
+        "date": datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d"),
+    }
+
+
 def read_documents_from_directories(directories):
     """Read and aggregate documents from a list of directories."""
     all_documents = []
     for directory in directories:
         # Assuming SimpleDirectoryReader can be initialized with a directory path
         # and has a method load_data() that returns a list of documents
-        documents = SimpleDirectoryReader(directory).load_data()
+        documents = SimpleDirectoryReader(directory, file_metadata=file_metadata).load_data()
+        for document in documents:
+            document.excluded_embed_metadata_keys = FILTER_METADATA_KEYS
+            document.excluded_llm_metadata_keys = ["file_path", "file_type"]
         all_documents.extend(documents)
     return all_documents
 
@@ -52,6 +81,9 @@ def to_vectorize_files():
         documents, storage_context=storage_context, show_progress=True
     )
 
+    ## Step 4: Retire the bot answers cached from the previous contents of the table
+    rag_corpus.bump_corpus_version(os.environ["POSTGRES_VECTOR_TABLE"])
+
 
 if __name__ == "__main__":
     to_vectorize_files()
\ No newline at end of file
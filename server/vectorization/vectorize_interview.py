@@ -5,14 +5,29 @@ from urllib.parse import quote_plus
 import openai
 from dotenv import load_dotenv
 import os
+import sys
 
 from llama_index import download_loader
 
+# The modules shared with the server (db_pool, corpus) live in server/src; with server/ on the
+# path they are found through the src namespace package, after the ones in vectorization/src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import corpus as rag_corpus
+
 load_dotenv()
 openai.api_key = os.environ["OPENAI_API_KEY"]
 
 
-def to_vectorize_interview(interview_id, table_name='interviewboard'):
+def to_vectorize_interview(interview_id, interview_details=None, table_name='interviewboard'):
+    '''
+    Embed the meeting summary of a finished interview into the vector table.
+    Args:
+        interview_id (int): The ID of the interview.
+        interview_details (dict): Details of the interview as read by the server, for the
+            company and date metadata. Left empty when omitted.
+        table_name (str): Name of the table where the interview record is stored.
+    '''
 
     encoded_password = quote_plus(os.environ["POSTGRES_PASSWORD"])
 
@@ -36,6 +51,20 @@ def to_vectorize_interview(interview_id, table_name='interviewboard'):
 
     documents = reader.load_data(query=query)
 
+    # Metadata copied into the filter columns of the vector table (see src/rag.py), so the bot can
+    # search a single interview or company
+    interview_details = interview_details or {}
+    metadata = {
+        "interview_id": int(interview_id),
+        "company": interview_details.get("nameofclient") or "",
+        "file_type": "interview",
+        "date": interview_details.get("date") or "",
+    }
+    for document in documents:
+        document.metadata.update(metadata)
+        document.excluded_embed_metadata_keys = list(metadata)
+        document.excluded_llm_metadata_keys = ["interview_id", "file_type"]
+
     ## Step 2: Create a vector store and storage context
     vector_store = PGVectorStore.from_params(
         database=os.environ["POSTGRES_DB"],
@@ -54,6 +83,9 @@ def to_vectorize_interview(interview_id, table_name='interviewboard'):
         documents, storage_context=storage_context, show_progress=True
     )
 
+    # Answers cached from the previous contents of the table no longer hold
+    rag_corpus.bump_corpus_version(os.environ["POSTGRES_VECTOR_TABLE"])
+
     return index
 
 